@@ -1,8 +1,16 @@
 
 
 from django.contrib import admin
-from .models import CustomUser
+from .models import CustomUser, OutboundEmail
 
 
 
 admin.site.register(CustomUser)
+
+
+class OutboundEmailAdmin(admin.ModelAdmin):
+    list_display = ('recipient', 'subject', 'status', 'attempts', 'created_at', 'sent_at')
+    list_filter = ('status',)
+    search_fields = ('recipient', 'subject')
+
+admin.site.register(OutboundEmail, OutboundEmailAdmin)
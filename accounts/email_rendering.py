@@ -0,0 +1,91 @@
+"""
+Email rendering from pre-compiled templates.
+
+Every email is a pair of templates under ``accounts/emails/``: ``<name>.html``
+(styles already inline, mail clients drop ``<style>`` blocks) and
+``<name>.txt``.  Both are compiled once per process and bulk rendering
+reuses them with a single shared context.
+"""
+from functools import lru_cache
+
+from django.conf import settings
+from django.template import Context
+from django.template.loader import get_template
+
+from .models import OutboundEmail
+
+
+SHOP_NAME = 'متجر الوسام للأدوات الكهربائية'
+
+
+@lru_cache(maxsize=None)
+def get_email_templates(name):
+    """
+    Compiled (html, text) templates of email ``name``.
+    """
+    return (
+        get_template(f'accounts/emails/{name}.html').template,
+        get_template(f'accounts/emails/{name}.txt').template,
+    )
+
+
+def email_renderer(name, shared_context=None):
+    """
+    Return ``render(context) -> (html, text)`` for email ``name``.
+
+    ``shared_context`` (shop details, campaign data, ...) is built once and
+    every call only pushes its per-recipient values on top of it.
+    """
+    html_template, text_template = get_email_templates(name)
+    context = Context({'shop_name': SHOP_NAME, **(shared_context or {})})
+
+    def render(personal):
+        with context.push(personal):
+            return html_template.render(context), text_template.render(context).strip()
+
+    return render
+
+
+def render_email(name, context):
+    """
+    Render one email and return ``(html, text)``.
+    """
+    return email_renderer(name)(context)
+
+
+def render_emails(name, shared_context, contexts):
+    """
+    Yield ``(html, text)`` for every per-recipient dict in ``contexts``.
+    """
+    render = email_renderer(name, shared_context)
+    for personal in contexts:
+        yield render(personal)
+
+
+def enqueue_templated_emails(name, subject, shared_context, recipients, batch_size=500):
+    """
+    Render and queue one email per ``(email_address, context)`` pair.
+
+    Rows are inserted in batches, so thousands of recipients cost a handful
+    of INSERTs.  Returns the number of queued emails.
+    """
+    render = email_renderer(name, shared_context)
+    queued = 0
+    batch = []
+    for address, personal in recipients:
+        html, text = render(personal)
+        batch.append(OutboundEmail(
+            recipient=address,
+            from_email=settings.DEFAULT_FROM_EMAIL,
+            subject=subject,
+            body=text,
+            html_body=html,
+        ))
+        if len(batch) >= batch_size:
+            OutboundEmail.objects.bulk_create(batch)
+            queued += len(batch)
+            batch = []
+    if batch:
+        OutboundEmail.objects.bulk_create(batch)
+        queued += len(batch)
+    return queued
@@ -0,0 +1,142 @@
+"""
+Durable outbound mail queue.
+
+Views only insert ``OutboundEmail`` rows; the ``send_queued_emails``
+worker sends them in batches over a single backend connection (one SMTP
+session for the whole batch) and retries failures with exponential backoff.
+A batch is claimed (status "sending") and committed before the first email
+goes out, and every result is saved as soon as it is known.
+Which backend is used (SMTP, console, file) is set by ``EMAIL_BACKEND``.
+"""
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import connection as db_connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import OutboundEmail
+
+
+MAX_ATTEMPTS = 5
+BACKOFF_BASE = 60          # seconds before the first retry
+BACKOFF_MAX = 60 * 60 * 6  # never wait more than 6 hours
+CLAIM_TIMEOUT = timedelta(minutes=15)  # a "sending" email older than this belongs to a dead worker
+
+
+def enqueue_email(subject, message, recipient_list, html_message=None, from_email=None):
+    """
+    Queue one email per recipient; same arguments as ``send_mail``.
+    """
+    return OutboundEmail.objects.bulk_create([
+        OutboundEmail(
+            recipient=recipient,
+            from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+            subject=subject,
+            body=message,
+            html_body=html_message or '',
+        )
+        for recipient in recipient_list
+    ])
+
+
+def backoff_delay(attempts):
+    return timedelta(seconds=min(BACKOFF_BASE * 2 ** (attempts - 1), BACKOFF_MAX))
+
+
+def _claim_batch(batch_size, now):
+    """
+    Mark up to ``batch_size`` due emails "sending" for this worker and commit.
+
+    The claim is one short transaction; the conditional UPDATE only takes
+    rows still due, so two workers never claim the same email even where
+    SKIP LOCKED is unavailable (SQLite).  Emails claimed by a worker that
+    died are due again after ``CLAIM_TIMEOUT``.
+    """
+    due = Q(status=OutboundEmail.STATUS_PENDING, next_attempt_at__lte=now) | Q(
+        status=OutboundEmail.STATUS_SENDING, claimed_at__lt=now - CLAIM_TIMEOUT
+    )
+    owner = uuid.uuid4().hex
+    with transaction.atomic():
+        queryset = OutboundEmail.objects.filter(due).order_by('next_attempt_at', 'pk')
+        if db_connection.features.has_select_for_update_skip_locked:
+            queryset = queryset.select_for_update(skip_locked=True)
+        ids = list(queryset.values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            return owner, []
+        OutboundEmail.objects.filter(due, pk__in=ids).update(
+            status=OutboundEmail.STATUS_SENDING,
+            claimed_by=owner,
+            claimed_at=now,
+            attempts=F('attempts') + 1,
+        )
+    return owner, list(OutboundEmail.objects.filter(claimed_by=owner).order_by('next_attempt_at', 'pk'))
+
+
+def _build_message(email, connection):
+    message = EmailMultiAlternatives(
+        subject=email.subject,
+        body=email.body,
+        from_email=email.from_email or settings.DEFAULT_FROM_EMAIL,
+        to=[email.recipient],
+        connection=connection,
+    )
+    if email.html_body:
+        message.attach_alternative(email.html_body, 'text/html')
+    return message
+
+
+def _record(email, owner, **fields):
+    # Each result is written on its own: a crash later in the batch
+    # does not undo it, so a delivered email is never sent again.
+    OutboundEmail.objects.filter(pk=email.pk, claimed_by=owner).update(**fields)
+
+
+def _record_failure(email, owner, error, now, max_attempts):
+    fields = {'last_error': str(error)[:1000]}
+    if email.attempts >= max_attempts:
+        fields['status'] = OutboundEmail.STATUS_FAILED
+    else:
+        fields['status'] = OutboundEmail.STATUS_PENDING
+        fields['next_attempt_at'] = now + backoff_delay(email.attempts)
+    _record(email, owner, **fields)
+
+
+def send_pending(batch_size=100, max_attempts=MAX_ATTEMPTS):
+    """
+    Send one batch of due emails and return ``(sent, failed)``.
+
+    Each email is sent on its own so one bad address does not fail the batch.
+    No transaction is held while talking to the mail server.
+    """
+    now = timezone.now()
+    owner, batch = _claim_batch(batch_size, now)
+    if not batch:
+        return 0, 0
+
+    sent = failed = 0
+    done = set()
+    mail_connection = get_connection(fail_silently=False)
+    try:
+        mail_connection.open()
+        for email in batch:
+            try:
+                _build_message(email, mail_connection).send()
+            except Exception as e:
+                _record_failure(email, owner, e, now, max_attempts)
+                failed += 1
+            else:
+                _record(email, owner, status=OutboundEmail.STATUS_SENT, sent_at=timezone.now(), last_error='')
+                sent += 1
+            done.add(email.pk)
+    except Exception as e:
+        # The connection itself failed: every unsent email is retried later
+        for email in batch:
+            if email.pk not in done:
+                _record_failure(email, owner, e, now, max_attempts)
+                failed += 1
+    finally:
+        mail_connection.close()
+    return sent, failed
@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from accounts.mail_queue import MAX_ATTEMPTS, send_pending
+
+
+class Command(BaseCommand):
+    help = 'إرسال رسائل البريد الموجودة في قائمة الانتظار'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--max-attempts', type=int, default=MAX_ATTEMPTS)
+        parser.add_argument('--loop', action='store_true', help='العمل باستمرار كـ worker')
+        parser.add_argument('--interval', type=float, default=5, help='ثواني الانتظار عندما تكون القائمة فارغة')
+
+    def handle(self, *args, **options):
+        total_sent = total_failed = 0
+        while True:
+            sent, failed = send_pending(options['batch_size'], options['max_attempts'])
+            total_sent += sent
+            total_failed += failed
+            if sent or failed:
+                self.stdout.write(f'📧 تم إرسال {sent} رسالة، فشل {failed}')
+
+            # A full batch means more mail is probably waiting
+            if sent + failed >= options['batch_size']:
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+
+        self.stdout.write(self.style.SUCCESS(f'✅ تم إرسال {total_sent} رسالة، فشل {total_failed}'))
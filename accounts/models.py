@@ -79,3 +79,44 @@ class PasswordResetCode(models.Model):
     
     def __str__(self):
         return f"{self.user.email} - {self.code}"
+
+
+# ========== 3. صندوق البريد الصادر ==========
+class OutboundEmail(models.Model):
+    """
+    An email waiting to be sent by the ``send_queued_emails`` worker.
+    """
+    STATUS_PENDING = 'pending'
+    STATUS_SENDING = 'sending'
+    STATUS_SENT = 'sent'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = (
+        (STATUS_PENDING, 'في الانتظار'),
+        (STATUS_SENDING, 'قيد الإرسال'),
+        (STATUS_SENT, 'تم الإرسال'),
+        (STATUS_FAILED, 'فشل'),
+    )
+
+    recipient = models.EmailField()
+    from_email = models.CharField(max_length=255, blank=True)
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    html_body = models.TextField(blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    sent_at = models.DateTimeField(blank=True, null=True)
+    # Set when a worker claims the email (status "sending"), see accounts/mail_queue.py
+    claimed_by = models.CharField(max_length=64, blank=True)
+    claimed_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='outbox_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.recipient} - {self.subject}"
@@ -1,3 +1,99 @@
+from datetime import timedelta
+from smtplib import SMTPException
+from unittest import mock
+
+from django.core import mail
 from django.test import TestCase
+from django.utils import timezone
+
+from .email_rendering import enqueue_templated_emails, render_email, render_emails
+from .email_utils import send_verification_code_email
+from .mail_queue import CLAIM_TIMEOUT, backoff_delay, enqueue_email, send_pending
+from .models import CustomUser, OutboundEmail
+
+
+class MailQueueTests(TestCase):
+    def test_enqueued_emails_go_out_in_one_batch(self):
+        enqueue_email('كود التحقق', 'text', ['a@example.com', 'b@example.com'], html_message='<p>html</p>')
+        self.assertEqual(len(mail.outbox), 0)
+
+        self.assertEqual(send_pending(), (2, 0))
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox), ['a@example.com', 'b@example.com'])
+        self.assertEqual(mail.outbox[0].alternatives[0].mimetype, 'text/html')
+        self.assertFalse(OutboundEmail.objects.exclude(status=OutboundEmail.STATUS_SENT).exists())
+        self.assertEqual(send_pending(), (0, 0))
+
+    def test_claimed_emails_are_left_to_their_worker_until_the_claim_expires(self):
+        now = timezone.now()
+        busy, = enqueue_email('busy', 'text', ['busy@example.com'])
+        dead, = enqueue_email('dead', 'text', ['dead@example.com'])
+        OutboundEmail.objects.filter(pk=busy.pk).update(status=OutboundEmail.STATUS_SENDING, claimed_at=now)
+        OutboundEmail.objects.filter(pk=dead.pk).update(
+            status=OutboundEmail.STATUS_SENDING, claimed_at=now - CLAIM_TIMEOUT - timedelta(seconds=1)
+        )
+
+        self.assertEqual(send_pending(), (1, 0))
+        self.assertEqual([message.to for message in mail.outbox], [['dead@example.com']])
+
+    def test_a_failure_does_not_resend_the_delivered_emails(self):
+        enqueue_email('first', 'text', ['first@example.com'])
+        enqueue_email('second', 'text', ['second@example.com'])
+        send = mail.EmailMultiAlternatives.send
+
+        def fail_second(message, *args, **kwargs):
+            if message.subject == 'second':
+                raise SMTPException('mailbox unavailable')
+            return send(message, *args, **kwargs)
+
+        with mock.patch.object(mail.EmailMultiAlternatives, 'send', fail_second):
+            self.assertEqual(send_pending(), (1, 1))
+
+        failed = OutboundEmail.objects.get(subject='second')
+        self.assertEqual((failed.status, failed.attempts), (OutboundEmail.STATUS_PENDING, 1))
+        self.assertGreater(failed.next_attempt_at, timezone.now() + backoff_delay(1) - timedelta(seconds=5))
+        self.assertIn('mailbox unavailable', failed.last_error)
+        # Not due yet: nothing is sent twice
+        self.assertEqual(send_pending(), (0, 0))
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_gives_up_after_max_attempts(self):
+        enqueue_email('bounce', 'text', ['bounce@example.com'])
+
+        with mock.patch.object(mail.EmailMultiAlternatives, 'send', side_effect=SMTPException('down')):
+            self.assertEqual(send_pending(max_attempts=1), (0, 1))
+        self.assertEqual(OutboundEmail.objects.get().status, OutboundEmail.STATUS_FAILED)
+
+
+class EmailRenderingTests(TestCase):
+    def test_html_is_escaped_and_text_is_not(self):
+        user = CustomUser(email='a@example.com', first_name='<b>سارة</b>')
+        html, text = render_email('verification_code', {'user': user, 'code': '123456'})
+
+        self.assertIn('&lt;b&gt;سارة&lt;/b&gt;', html)
+        self.assertIn('123456', html)
+        self.assertNotIn('<style', html)
+        self.assertTrue(text.startswith('مرحباً <b>سارة</b>,'))
+
+    def test_bulk_rendering_shares_the_context(self):
+        rendered = list(render_emails('order_status', {'shop_name': 'Shop'}, [
+            {'customer_name': 'A', 'orders': [{'code': 'X1', 'status': 'Shipped'}]},
+            {'customer_name': 'B', 'orders': [{'code': 'X2', 'status': 'Shipped'}, {'code': 'X3', 'status': 'Shipped'}]},
+        ]))
+
+        self.assertEqual(len(rendered), 2)
+        self.assertIn('#X1: Shipped', rendered[0][1])
+        self.assertNotIn('X1', rendered[1][1])
+        self.assertTrue(all(text.endswith('Shop') for _html, text in rendered))
+
+    def test_emails_are_queued_not_sent(self):
+        user = CustomUser.objects.create_user('a@example.com', 'secret')
+        send_verification_code_email(user, '123456')
+        queued = enqueue_templated_emails('order_status', 'update', {}, [
+            ('b@example.com', {'orders': [{'code': 'X1', 'status': 'Shipped'}]}),
+            ('c@example.com', {'orders': [{'code': 'X2', 'status': 'Shipped'}]}),
+        ], batch_size=1)
 
-# Create your tests here.
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(queued, 2)
+        self.assertEqual(OutboundEmail.objects.count(), 3)
+        self.assertIn('123456', OutboundEmail.objects.get(recipient='a@example.com').body)
@@ -0,0 +1,160 @@
+"""
+Sales analytics over the pre-aggregated ``SalesFact`` table.
+
+``build_facts`` turns OrderDetail rows into one fact per day and scope
+(whole shop, category, brand); the analytics page only ever reads facts,
+so a year of data is at most a few thousand small rows.
+
+Revenue here is merchandise revenue: the order lines before delivery fees
+and discounts (the only amount that splits by category or brand).  The
+dashboard's monthly revenue is ``Order.total`` and includes both.
+"""
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.db.models import Count, Max, Sum
+from django.db.models.functions import Coalesce, Trunc, TruncDate
+from django.utils import timezone
+
+from orders.models import OrderDetail
+from products.models import Category
+
+from .models import SalesFact
+
+
+PERIODS = ('day', 'week', 'month')
+
+# scope -> OrderDetail field the facts are grouped by
+_SCOPE_FIELDS = {
+    SalesFact.SCOPE_ALL: None,
+    SalesFact.SCOPE_CATEGORY: 'product__category_id',
+    SalesFact.SCOPE_BRAND: 'product__brand',
+}
+
+
+def last_built_date():
+    return SalesFact.objects.aggregate(last=Max('date'))['last']
+
+
+def _start_of(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def _aggregate(details, field):
+    group_by = ['day'] + ([field] if field else [])
+    return (
+        details.values(*group_by)
+        .annotate(
+            order_count=Count('order_id', distinct=True),
+            units=Coalesce(Sum('quantity'), 0),
+            merchandise_revenue=Coalesce(Sum('total'), 0.0),
+        )
+        .order_by()
+    )
+
+
+def build_facts(start, end, chunk_days=31):
+    """
+    Rebuild the facts of every day in ``[start, end]``, one chunk of days
+    per transaction; returns the number of facts written.
+    """
+    written = 0
+    chunk_start = start
+    while chunk_start <= end:
+        chunk_end = min(chunk_start + timedelta(days=chunk_days - 1), end)
+        # A datetime range rather than __date, so no per-row date cast is needed to filter
+        details = OrderDetail.objects.filter(
+            order__order_time__gte=_start_of(chunk_start),
+            order__order_time__lt=_start_of(chunk_end + timedelta(days=1)),
+        ).annotate(day=TruncDate('order__order_time'))
+
+        facts = []
+        for scope, field in _SCOPE_FIELDS.items():
+            for row in _aggregate(details, field):
+                key = row[field] if field else ''
+                if field and key in (None, ''):
+                    continue  # deleted product, or no brand
+                facts.append(SalesFact(
+                    date=row['day'],
+                    scope=scope,
+                    key=str(key),
+                    order_count=row['order_count'],
+                    units=row['units'],
+                    merchandise_revenue=row['merchandise_revenue'],
+                ))
+
+        with transaction.atomic():
+            SalesFact.objects.filter(date__gte=chunk_start, date__lte=chunk_end).delete()
+            SalesFact.objects.bulk_create(facts, batch_size=1000)
+        written += len(facts)
+        chunk_start = chunk_end + timedelta(days=1)
+    return written
+
+
+def sales_series(start, end, period='day', scope=SalesFact.SCOPE_ALL, keys=None):
+    """
+    Merchandise revenue, orders, average order value and units per period and key.
+
+    Returns ``{key: [{period, merchandise_revenue, order_count, units, average_order_value}, ...]}``.
+    """
+    if period not in PERIODS:
+        raise ValueError(f'Unknown period: {period}')
+    facts = SalesFact.objects.filter(scope=scope, date__gte=start, date__lte=end)
+    if keys:
+        facts = facts.filter(key__in=keys)
+    rows = (
+        facts.annotate(period=Trunc('date', period))
+        .values('period', 'key')
+        .annotate(merchandise_revenue=Sum('merchandise_revenue'), order_count=Sum('order_count'), units=Sum('units'))
+        .order_by('key', 'period')
+    )
+    series = {}
+    for row in rows:
+        series.setdefault(row['key'], []).append({
+            'period': row['period'].isoformat(),
+            'merchandise_revenue': round(row['merchandise_revenue'], 2),
+            'order_count': row['order_count'],
+            'units': row['units'],
+            'average_order_value': (
+                round(row['merchandise_revenue'] / row['order_count'], 2) if row['order_count'] else 0
+            ),
+        })
+    return series
+
+
+def range_totals(start, end):
+    """
+    Shop-wide merchandise revenue, orders, units and average order value of the range.
+    """
+    totals = SalesFact.objects.filter(scope=SalesFact.SCOPE_ALL, date__gte=start, date__lte=end).aggregate(
+        merchandise_revenue=Coalesce(Sum('merchandise_revenue'), 0.0),
+        order_count=Coalesce(Sum('order_count'), 0),
+        units=Coalesce(Sum('units'), 0),
+    )
+    totals['merchandise_revenue'] = round(totals['merchandise_revenue'], 2)
+    totals['average_order_value'] = (
+        round(totals['merchandise_revenue'] / totals['order_count'], 2) if totals['order_count'] else 0
+    )
+    return totals
+
+
+def top_keys(start, end, scope, limit=5):
+    """
+    The ``limit`` best selling categories/brands of the range, by merchandise revenue.
+    """
+    return list(
+        SalesFact.objects.filter(scope=scope, date__gte=start, date__lte=end)
+        .values('key')
+        .annotate(merchandise_revenue=Sum('merchandise_revenue'))
+        .order_by('-merchandise_revenue')
+        .values_list('key', flat=True)[:limit]
+    )
+
+
+def key_labels(scope, keys):
+    if scope == SalesFact.SCOPE_CATEGORY:
+        names = dict(Category.objects.filter(pk__in=[key for key in keys if key.isdigit()]).values_list('pk', 'name'))
+        return {key: names.get(int(key), key) if key.isdigit() else key for key in keys}
+    if scope == SalesFact.SCOPE_ALL:
+        return {'': 'الكل'}
+    return {key: key for key in keys}
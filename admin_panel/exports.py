@@ -0,0 +1,217 @@
+"""
+Streaming CSV / XLSX exports.
+
+Rows are read with ``QuerySet.iterator(chunk_size=...)`` over
+``values_list`` and written out as they arrive, so memory use does not
+grow with the number of rows.  XLSX is produced with the standard library:
+the zip archive is written to an unseekable sink that hands back the
+compressed bytes after every few hundred rows.
+"""
+import csv
+import re
+import zipfile
+from datetime import date, datetime
+from itertools import chain
+from xml.sax.saxutils import escape
+
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+from orders.models import ORDER_STATUS, Order
+
+
+CHUNK_SIZE = 2000
+FORMATS = ('csv', 'xlsx')
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+
+# ---------- datasets ----------
+
+ORDER_HEADER = [
+    'رقم الطلب', 'التاريخ', 'الحالة', 'العميل', 'الهاتف', 'البريد الإلكتروني', 'المحافظة', 'المدينة',
+    'العنوان', 'المنتج', 'الكمية', 'السعر', 'إجمالي المنتج', 'رسوم التوصيل', 'إجمالي الطلب',
+]
+
+
+def order_rows(orders):
+    """
+    One row per order line, with the order and its address.
+
+    Read from ``Order`` so the lines are an outer join: an order without
+    lines still gets one row, with the product columns empty.
+    """
+    labels = dict(ORDER_STATUS)
+    lines = (
+        Order.objects.filter(pk__in=orders.order_by().values('pk'))
+        .order_by('-order_time', 'pk', 'order_detail__pk')
+        .values_list(
+            'code', 'order_time', 'status',
+            'address__customer_name', 'address__customer_phone', 'address__customer_email',
+            'address__governorate', 'address__city', 'address__address_line',
+            'order_detail__product__name', 'order_detail__quantity', 'order_detail__price', 'order_detail__total',
+            'delivery_fee', 'total',
+        )
+    )
+    for row in lines.iterator(chunk_size=CHUNK_SIZE):
+        row = list(row)
+        row[2] = labels.get(row[2], row[2])
+        yield row
+
+
+PRODUCT_HEADER = ['المعرف', 'SKU', 'الاسم', 'الفئة', 'العلامة التجارية', 'السعر', 'الكمية', 'نشط', 'مميز', 'تاريخ الإضافة']
+
+
+def product_rows(products):
+    return products.order_by('-created_at', '-id').values_list(
+        'id', 'sku', 'name', 'category__name', 'brand', 'price', 'quantity', 'is_active', 'is_featured', 'created_at',
+    ).iterator(chunk_size=CHUNK_SIZE)
+
+
+USER_HEADER = ['البريد الإلكتروني', 'الاسم الأول', 'الاسم الأخير', 'الهاتف', 'العنوان', 'مشرف', 'نشط', 'تاريخ التسجيل']
+
+
+def user_rows(users):
+    return users.order_by('-date_joined', '-id').values_list(
+        'email', 'first_name', 'last_name', 'phone_number', 'address', 'is_staff', 'is_active', 'date_joined',
+    ).iterator(chunk_size=CHUNK_SIZE)
+
+
+# ---------- writers ----------
+
+# Spreadsheets run a cell starting with one of these as a formula
+_FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def _text(value):
+    if value is None:
+        return ''
+    if isinstance(value, datetime):
+        return timezone.localtime(value).strftime('%Y-%m-%d %H:%M') if timezone.is_aware(value) else value.strftime('%Y-%m-%d %H:%M')
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, bool):
+        return 'نعم' if value else 'لا'
+    value = str(value)
+    if value.startswith(_FORMULA_PREFIXES):
+        # Customer names and addresses are user input: keep them as text
+        return "'" + value
+    return value
+
+
+class _Echo:
+    """
+    File-like object whose ``write`` just returns what it was given.
+    """
+    def write(self, value):
+        return value
+
+
+def csv_stream(header, rows):
+    writer = csv.writer(_Echo())
+    yield '\ufeff'  # Excel needs the BOM to read Arabic
+    yield writer.writerow(header)
+    for row in rows:
+        yield writer.writerow([value if isinstance(value, (int, float)) and not isinstance(value, bool) else _text(value) for value in row])
+
+
+class _Sink:
+    """
+    Unseekable binary stream collecting what zipfile writes to it.
+    """
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def pop(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+_XML_ILLEGAL = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+_XLSX_PARTS = {
+    '[Content_Types].xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'
+    ),
+    '_rels/.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    ),
+    'xl/workbook.xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="{sheet}" sheetId="1" r:id="rId1"/></sheets>'
+        '</workbook>'
+    ),
+    'xl/_rels/workbook.xml.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        'Target="worksheets/sheet1.xml"/>'
+        '</Relationships>'
+    ),
+}
+
+
+def _cell(value):
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return f'<c><v>{value}</v></c>'
+    text = escape(_XML_ILLEGAL.sub('', _text(value)))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+def xlsx_stream(header, rows, sheet='Sheet1', flush_every=500):
+    sink = _Sink()
+    with zipfile.ZipFile(sink, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for name, content in _XLSX_PARTS.items():
+            archive.writestr(name, content.replace('{sheet}', escape(sheet)))
+        yield sink.pop()
+
+        with archive.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as worksheet:
+            worksheet.write(
+                b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+                b'<sheetViews><sheetView rightToLeft="1" workbookViewId="0"/></sheetViews><sheetData>'
+            )
+            for index, row in enumerate(chain([header], rows), start=1):
+                cells = ''.join(_cell(value) for value in row)
+                worksheet.write(f'<row r="{index}">{cells}</row>'.encode('utf-8'))
+                if index % flush_every == 0:
+                    yield sink.pop()
+            worksheet.write(b'</sheetData></worksheet>')
+    yield sink.pop()
+
+
+def export_response(header, rows, filename, file_format='csv'):
+    """
+    ``StreamingHttpResponse`` of ``rows`` as ``filename``.csv / .xlsx.
+    """
+    if file_format == 'xlsx':
+        response = StreamingHttpResponse(xlsx_stream(header, rows), content_type=XLSX_CONTENT_TYPE)
+    else:
+        file_format = 'csv'
+        response = StreamingHttpResponse(csv_stream(header, rows), content_type='text/csv; charset=utf-8')
+    stamp = timezone.localtime().strftime('%Y%m%d-%H%M')
+    response['Content-Disposition'] = f'attachment; filename="{filename}-{stamp}.{file_format}"'
+    return response
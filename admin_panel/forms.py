@@ -1,4 +1,5 @@
 from django import forms
+from products.importers import MODES, ImportFormatError, detect_format
 from products.models import Product, ProductImages, Category
 from orders.models import Order
 
@@ -9,7 +10,7 @@ class ProductForm(forms.ModelForm):
     """
     class Meta:
         model = Product
-        fields = ['name', 'category', 'price', 'quantity', 'brand', 
+        fields = ['name', 'sku', 'category', 'price', 'quantity', 'brand', 
                   'subtitle', 'description', 'image', 'is_featured', 'is_active']
         widgets = {
             'name': forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'اسم المنتج'}),
@@ -17,6 +18,7 @@ class ProductForm(forms.ModelForm):
             'price': forms.NumberInput(attrs={'class': 'form-control', 'placeholder': 'السعر', 'step': '0.01'}),
             'quantity': forms.NumberInput(attrs={'class': 'form-control', 'placeholder': 'الكمية المتوفرة'}),
             'brand': forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'العلامة التجارية (اختياري)'}),
+            'sku': forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'رمز المنتج لدى المورد (اختياري)'}),
             'subtitle': forms.Textarea(attrs={'class': 'form-control', 'placeholder': 'وصف قصير', 'rows': 3}),
             'description': forms.Textarea(attrs={'class': 'form-control', 'placeholder': 'الوصف الكامل', 'rows': 6}),
             'image': forms.FileInput(attrs={'class': 'form-control'}),
@@ -25,6 +27,37 @@ class ProductForm(forms.ModelForm):
         }
 
 
+class ProductImportForm(forms.Form):
+    """
+    Upload form for the bulk product import, see products/importers.py.
+    """
+    file = forms.FileField(
+        label='ملف المنتجات',
+        widget=forms.FileInput(attrs={'class': 'form-control', 'accept': '.csv,.xlsx,.jsonl'}),
+    )
+    mode = forms.ChoiceField(
+        label='وضع الاستيراد',
+        choices=[(MODES[0], 'إضافة منتجات جديدة فقط'), (MODES[1], 'إضافة وتحديث حسب SKU')],
+        widget=forms.Select(attrs={'class': 'form-control'}),
+    )
+    create_categories = forms.BooleanField(
+        label='إنشاء الفئات غير الموجودة', required=False,
+        widget=forms.CheckboxInput(attrs={'class': 'form-check-input'}),
+    )
+    dry_run = forms.BooleanField(
+        label='فحص الملف فقط دون حفظ', required=False,
+        widget=forms.CheckboxInput(attrs={'class': 'form-check-input'}),
+    )
+
+    def clean_file(self):
+        upload = self.cleaned_data['file']
+        try:
+            self.file_format = detect_format(upload.name)
+        except ImportFormatError as exc:
+            raise forms.ValidationError(str(exc))
+        return upload
+
+
 class ProductImageForm(forms.ModelForm):
     """
     Form for product additional images.
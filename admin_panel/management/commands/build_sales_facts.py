@@ -0,0 +1,37 @@
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Min
+from django.utils import timezone
+
+from admin_panel.analytics import build_facts, last_built_date
+from orders.models import Order
+
+
+class Command(BaseCommand):
+    help = 'بناء جدول إحصائيات المبيعات اليومية (تحديث تدريجي)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', help='إعادة البناء بدءاً من تاريخ YYYY-MM-DD')
+        parser.add_argument('--full', action='store_true', help='إعادة بناء كل التاريخ')
+        parser.add_argument('--chunk-days', type=int, default=31)
+
+    def handle(self, *args, **options):
+        today = timezone.localdate()
+        if options['since']:
+            try:
+                start = date.fromisoformat(options['since'])
+            except ValueError:
+                raise CommandError('❌ صيغة التاريخ غير صحيحة، استخدم YYYY-MM-DD')
+        elif options['full'] or last_built_date() is None:
+            first = Order.objects.aggregate(first=Min('order_time'))['first']
+            if first is None:
+                self.stdout.write(self.style.WARNING('⚠️ لا توجد طلبات'))
+                return
+            start = timezone.localdate(first)
+        else:
+            # The last built day may have been partial, start again from it
+            start = min(last_built_date(), today - timedelta(days=1))
+
+        written = build_facts(start, today, chunk_days=options['chunk_days'])
+        self.stdout.write(self.style.SUCCESS(f'✅ تم بناء {written} صف من {start} حتى {today}'))
@@ -0,0 +1,27 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from admin_panel.stats import reconcile
+
+
+class Command(BaseCommand):
+    help = 'إعادة حساب إحصائيات لوحة التحكم من الجداول الأصلية'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=None,
+            help='إعادة حساب الإيرادات اليومية لآخر N يوم فقط (الافتراضي: كل التاريخ)',
+        )
+
+    def handle(self, *args, **options):
+        since = None
+        if options['days'] is not None:
+            since = timezone.localdate() - timedelta(days=options['days'])
+        counters = reconcile(since)
+        for key, value in sorted(counters.items()):
+            self.stdout.write(f'  {key}: {value}')
+        self.stdout.write(self.style.SUCCESS('✅ تم تحديث الإحصائيات'))
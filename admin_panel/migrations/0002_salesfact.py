@@ -0,0 +1,29 @@
+# Generated by Django 5.2.8 on 2026-10-18 12:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('admin_panel', '0001_statcounter_dailyrevenue'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SalesFact',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('scope', models.CharField(choices=[('all', 'الكل'), ('category', 'الفئة'), ('brand', 'العلامة التجارية')], max_length=10)),
+                ('key', models.CharField(blank=True, max_length=100)),
+                ('order_count', models.IntegerField(default=0)),
+                ('units', models.IntegerField(default=0)),
+                ('revenue', models.FloatField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['scope', 'date'], name='sales_fact_scope_date_idx')],
+                'constraints': [models.UniqueConstraint(fields=('scope', 'key', 'date'), name='unique_sales_fact')],
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.8 on 2026-10-18 13:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('admin_panel', '0002_salesfact'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dailyrevenue',
+            name='shard',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='dailyrevenue',
+            name='date',
+            field=models.DateField(),
+        ),
+        migrations.AddConstraint(
+            model_name='dailyrevenue',
+            constraint=models.UniqueConstraint(fields=('date', 'shard'), name='unique_daily_revenue_shard'),
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.8 on 2026-10-18 14:10
+
+from django.db import migrations
+from django.db.models import Count, Sum
+from django.db.models.functions import Coalesce, TruncDate
+
+
+ORDER_STATUSES = ('Received', 'Processed', 'Shipped', 'Delivered')
+
+
+def seed_stats(apps, schema_editor):
+    """
+    Fill the dashboard counters and the daily revenue from the existing
+    orders, users and products, as ``reconcile_stats`` does.
+    """
+    StatCounter = apps.get_model('admin_panel', 'StatCounter')
+    DailyRevenue = apps.get_model('admin_panel', 'DailyRevenue')
+    Order = apps.get_model('orders', 'Order')
+    Product = apps.get_model('products', 'Product')
+    CustomUser = apps.get_model('accounts', 'CustomUser')
+
+    counters = {
+        'products:active': Product.objects.filter(is_active=True).count(),
+        'orders': Order.objects.count(),
+        'users': CustomUser.objects.count(),
+    }
+    by_status = dict(Order.objects.order_by().values_list('status').annotate(count=Count('pk')))
+    for status in ORDER_STATUSES:
+        counters[f'orders:{status}'] = by_status.get(status, 0)
+    StatCounter.objects.all().delete()
+    StatCounter.objects.bulk_create([StatCounter(key=key, value=value) for key, value in counters.items()])
+
+    days = (
+        Order.objects.order_by()
+        .annotate(day=TruncDate('order_time'))
+        .values('day')
+        .annotate(order_count=Count('pk'), revenue=Coalesce(Sum('total'), 0.0))
+    )
+    DailyRevenue.objects.all().delete()
+    DailyRevenue.objects.bulk_create([
+        DailyRevenue(date=row['day'], order_count=row['order_count'], revenue=row['revenue'])
+        for row in days
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('admin_panel', '0003_dailyrevenue_shard'),
+        ('accounts', '0007_outboundemail'),
+        ('orders', '0008_orderstatusevent'),
+        ('products', '0003_category_product_brand_product_is_active_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(seed_stats, migrations.RunPython.noop),
+    ]
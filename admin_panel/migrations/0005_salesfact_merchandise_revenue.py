@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-18 13:53
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('admin_panel', '0004_seed_stats'),
+    ]
+
+    operations = [
+        migrations.RenameField(
+            model_name='salesfact',
+            old_name='revenue',
+            new_name='merchandise_revenue',
+        ),
+    ]
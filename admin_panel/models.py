@@ -1,3 +1,72 @@
 from django.db import models
 
-# Create your models here.
+
+class StatCounter(models.Model):
+    """
+    A running total shown on the dashboard, e.g. ``orders`` or ``orders:Shipped``.
+    Kept up to date by admin_panel/signals.py and ``reconcile_stats``.
+    Signals write to shards (``orders#3``) that readers add up, see admin_panel/stats.py.
+    """
+    key = models.CharField(max_length=100, unique=True)
+    value = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.key} = {self.value}"
+
+
+class DailyRevenue(models.Model):
+    """
+    Orders placed and their total per day, split over a few shards like
+    ``StatCounter``; a month is at most 31 x ``stats.SHARDS`` rows.
+    """
+    date = models.DateField()
+    shard = models.PositiveSmallIntegerField(default=0)
+    order_count = models.IntegerField(default=0)
+    revenue = models.FloatField(default=0)
+
+    class Meta:
+        ordering = ['-date']
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'shard'], name='unique_daily_revenue_shard'),
+        ]
+
+    def __str__(self):
+        return f"{self.date}: {self.revenue}"
+
+
+class SalesFact(models.Model):
+    """
+    Pre-aggregated sales of one day, built from OrderDetail by
+    ``build_sales_facts``.  ``scope`` says what ``key`` is: the whole shop
+    (empty key), a category id or a brand.
+
+    ``merchandise_revenue`` is the sum of the order lines, before delivery
+    fees and discounts, so it splits by category and brand; it is not the
+    ``Order.total`` revenue of the dashboard.
+    """
+    SCOPE_ALL = 'all'
+    SCOPE_CATEGORY = 'category'
+    SCOPE_BRAND = 'brand'
+    SCOPE_CHOICES = (
+        (SCOPE_ALL, 'الكل'),
+        (SCOPE_CATEGORY, 'الفئة'),
+        (SCOPE_BRAND, 'العلامة التجارية'),
+    )
+
+    date = models.DateField()
+    scope = models.CharField(max_length=10, choices=SCOPE_CHOICES)
+    key = models.CharField(max_length=100, blank=True)
+    order_count = models.IntegerField(default=0)
+    units = models.IntegerField(default=0)
+    merchandise_revenue = models.FloatField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['scope', 'key', 'date'], name='unique_sales_fact'),
+        ]
+        indexes = [
+            models.Index(fields=['scope', 'date'], name='sales_fact_scope_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.date} {self.scope}:{self.key} = {self.merchandise_revenue}"
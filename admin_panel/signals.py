@@ -0,0 +1,82 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from accounts.models import CustomUser
+from orders.models import Order
+from orders.signals import order_statuses_changed
+from products.models import Product
+from products.signals import products_bulk_changed
+
+from . import stats
+
+
+@receiver(post_save, sender=Order)
+def count_order(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        stats.increment(stats.ORDERS)
+        stats.increment(stats.status_key(instance.status))
+        stats.add_revenue(instance.order_time, instance.total or 0, orders=1)
+        return
+
+    previous = getattr(instance, '_persisted_status', None)
+    if previous is not None and previous != instance.status:
+        stats.increment(stats.status_key(previous), -1)
+        stats.increment(stats.status_key(instance.status))
+    if hasattr(instance, '_persisted_total'):
+        stats.add_revenue(instance.order_time, (instance.total or 0) - (instance._persisted_total or 0))
+
+
+@receiver(post_delete, sender=Order)
+def uncount_order(sender, instance, **kwargs):
+    stats.increment(stats.ORDERS, -1)
+    stats.increment(stats.status_key(instance.status), -1)
+    stats.add_revenue(instance.order_time, -(instance.total or 0), orders=-1)
+
+
+@receiver(order_statuses_changed)
+def count_bulk_status_change(sender, transitions, **kwargs):
+    deltas = {}
+    for _order_id, previous, status in transitions:
+        deltas[previous] = deltas.get(previous, 0) - 1
+        deltas[status] = deltas.get(status, 0) + 1
+    for status, delta in deltas.items():
+        stats.increment(stats.status_key(status), delta)
+
+
+@receiver(post_save, sender=Product)
+def count_product(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        was_active = False
+    else:
+        was_active = getattr(instance, '_persisted_is_active', None)
+        if was_active is None:
+            return  # loaded without is_active, left to reconcile_stats
+    if was_active != instance.is_active:
+        stats.increment(stats.ACTIVE_PRODUCTS, 1 if instance.is_active else -1)
+    instance._persisted_is_active = instance.is_active
+
+
+@receiver(products_bulk_changed)
+def count_bulk_products(sender, active_delta=0, **kwargs):
+    stats.increment(stats.ACTIVE_PRODUCTS, active_delta)
+
+
+@receiver(post_delete, sender=Product)
+def uncount_product(sender, instance, **kwargs):
+    if instance.is_active:
+        stats.increment(stats.ACTIVE_PRODUCTS, -1)
+
+
+@receiver(post_save, sender=CustomUser)
+def count_user(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        stats.increment(stats.USERS)
+
+
+@receiver(post_delete, sender=CustomUser)
+def uncount_user(sender, instance, **kwargs):
+    stats.increment(stats.USERS, -1)
@@ -0,0 +1,129 @@
+"""
+Dashboard statistics rollups.
+
+Counters and daily revenue are shifted by signals as orders, products and
+users change (admin_panel/signals.py) and rebuilt from the source tables by
+``manage.py reconcile_stats``, so the dashboard reads a handful of rows
+instead of aggregating whole tables.
+
+Every checkout shifts the same counters (``orders``, ``orders:Received``)
+and today's revenue.  Writes go to one of ``SHARDS`` rows picked at random
+(``orders#5``, ``DailyRevenue.shard``) so concurrent checkouts do not queue
+on a single row lock; readers add the shards up.
+"""
+import random
+
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from accounts.models import CustomUser
+from orders.models import ORDER_STATUS, Order
+from products.models import Product
+
+from .models import DailyRevenue, StatCounter
+
+
+ACTIVE_PRODUCTS = 'products:active'
+ORDERS = 'orders'
+USERS = 'users'
+SHARDS = 8
+
+
+def status_key(status):
+    return f'orders:{status}'
+
+
+def increment(key, delta=1):
+    if not delta:
+        return
+    key = f'{key}#{random.randrange(SHARDS)}'
+    if not StatCounter.objects.filter(key=key).update(value=F('value') + delta):
+        # First write for this key; a concurrent creator makes us retry the UPDATE
+        _counter, created = StatCounter.objects.get_or_create(key=key, defaults={'value': delta})
+        if not created:
+            StatCounter.objects.filter(key=key).update(value=F('value') + delta)
+
+
+def add_revenue(moment, amount=0, orders=0):
+    if not amount and not orders:
+        return
+    day = timezone.localdate(moment)
+    shard = random.randrange(SHARDS)
+    updated = DailyRevenue.objects.filter(date=day, shard=shard).update(
+        revenue=F('revenue') + amount,
+        order_count=F('order_count') + orders,
+    )
+    if not updated:
+        _row, created = DailyRevenue.objects.get_or_create(
+            date=day, shard=shard, defaults={'revenue': amount, 'order_count': orders}
+        )
+        if not created:
+            DailyRevenue.objects.filter(date=day, shard=shard).update(
+                revenue=F('revenue') + amount,
+                order_count=F('order_count') + orders,
+            )
+
+
+def get_dashboard_stats(today=None):
+    """
+    Counters and revenue of the current month: two small queries.
+    """
+    today = today or timezone.localdate()
+    counters = {}
+    for key, value in StatCounter.objects.values_list('key', 'value'):
+        key = key.partition('#')[0]
+        counters[key] = counters.get(key, 0) + value
+    monthly_revenue = DailyRevenue.objects.filter(
+        date__gte=today.replace(day=1), date__lte=today
+    ).aggregate(total=Sum('revenue'))['total'] or 0
+    return {
+        'total_products': counters.get(ACTIVE_PRODUCTS, 0),
+        'total_orders': counters.get(ORDERS, 0),
+        'pending_orders': counters.get(status_key('Received'), 0),
+        'total_users': counters.get(USERS, 0),
+        'orders_by_status': [
+            (value, label, counters.get(status_key(value), 0)) for value, label in ORDER_STATUS
+        ],
+        'monthly_revenue': monthly_revenue,
+    }
+
+
+def reconcile(since=None):
+    """
+    Recompute every counter, and the daily revenue from ``since`` (a date,
+    all history when None), from the source tables.
+    """
+    counters = {
+        ACTIVE_PRODUCTS: Product.objects.filter(is_active=True).count(),
+        ORDERS: Order.objects.count(),
+        USERS: CustomUser.objects.count(),
+    }
+    by_status = dict(Order.objects.order_by().values_list('status').annotate(count=Count('pk')))
+    for value, _label in ORDER_STATUS:
+        counters[status_key(value)] = by_status.get(value, 0)
+
+    orders = Order.objects.order_by()
+    if since is not None:
+        orders = orders.filter(order_time__date__gte=since)
+    days = (
+        orders.annotate(day=TruncDate('order_time'))
+        .values('day')
+        .annotate(order_count=Count('pk'), revenue=Coalesce(Sum('total'), 0.0))
+    )
+
+    with transaction.atomic():
+        # The shards are folded back into one row per counter
+        StatCounter.objects.all().delete()
+        StatCounter.objects.bulk_create([StatCounter(key=key, value=value) for key, value in counters.items()])
+
+        stale = DailyRevenue.objects.all()
+        if since is not None:
+            stale = stale.filter(date__gte=since)
+        stale.delete()
+        DailyRevenue.objects.bulk_create([
+            DailyRevenue(date=row['day'], order_count=row['order_count'], revenue=row['revenue'])
+            for row in days
+        ])
+    return counters
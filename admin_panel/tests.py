@@ -1,3 +1,162 @@
+import csv
+import io
+import zipfile
+from datetime import timedelta
+from itertools import count
+from unittest import mock
+
+from django.db.models import F
 from django.test import TestCase
+from django.utils import timezone
+
+from accounts.models import CustomUser
+from orders.models import Order, OrderAddress
+from orders.status import bulk_set_status
+from products.models import Category, Product
+
+from . import analytics, exports, stats
+from .models import SalesFact, StatCounter
+
+
+def make_order(user, product, quantity=1, status='Received'):
+    address = OrderAddress.objects.create(
+        customer_name='أحمد', customer_phone='01000000000', governorate='القاهرة', address_line='شارع التحرير'
+    )
+    order = Order.objects.create(
+        user=user, address=address, status=status,
+        subtotal=product.price * quantity, total=product.price * quantity,
+    )
+    order.order_detail.create(product=product, quantity=quantity, price=product.price, total=product.price * quantity)
+    return order
+
+
+class AdminTestCase(TestCase):
+    def setUp(self):
+        self.admin = CustomUser.objects.create_user('admin@example.com', 'secret', is_staff=True)
+        self.client.force_login(self.admin)
+        self.drill = Product.objects.create(
+            name='Drill', price=100.0, quantity=10, image='product/placeholder.jpg', subtitle='', description=''
+        )
+
+
+class BulkOrderActionTests(AdminTestCase):
+    def test_status_change_reports_the_changed_orders(self):
+        orders = [make_order(self.admin, self.drill) for _ in range(3)]
+        ids = ','.join(str(order.pk) for order in orders)
+
+        response = self.client.post('/admin-panel/orders/bulk/', {'action': 'status', 'status': 'Shipped', 'order_ids': ids})
+        self.assertEqual(response.json(), {'success': True, 'updated': 3, 'received': 3})
+        response = self.client.post('/admin-panel/orders/bulk/', {'action': 'status', 'status': 'Lost', 'order_ids': ids})
+        self.assertEqual(response.status_code, 400)
+
+
+class DashboardStatsTests(AdminTestCase):
+    def test_signals_keep_the_counters_and_revenue(self):
+        # Writes spread over several shards
+        with mock.patch.object(stats.random, 'randrange', side_effect=lambda n, shard=count(): next(shard) % n):
+            first = make_order(self.admin, self.drill, quantity=2)
+            second = make_order(self.admin, self.drill)
+        first.status = 'Shipped'
+        first.save()
+        bulk_set_status([second.pk], 'Delivered')
+        Product.objects.create(name='Saw', price=40.0, quantity=0, image='product/placeholder.jpg', subtitle='', description='', is_active=False)
+
+        result = stats.get_dashboard_stats()
+        self.assertEqual(
+            (result['total_orders'], result['pending_orders'], result['total_products'], result['total_users']),
+            (2, 0, 1, 1),
+        )
+        self.assertEqual({value: count for value, _label, count in result['orders_by_status']}['Shipped'], 1)
+        self.assertEqual(result['monthly_revenue'], 300.0)
+        self.assertGreater(StatCounter.objects.filter(key__startswith='orders#').count(), 1)
+
+    def test_reconcile_folds_the_shards(self):
+        make_order(self.admin, self.drill)
+        before = stats.get_dashboard_stats()
+        StatCounter.objects.update(value=999)
+
+        stats.reconcile()
+        self.assertEqual(stats.get_dashboard_stats(), before)
+        self.assertEqual(StatCounter.objects.filter(key__startswith=stats.ORDERS).count(), 1 + len(stats.ORDER_STATUS))
+
+    def test_dashboard_reads_the_rollups(self):
+        make_order(self.admin, self.drill)
+
+        response = self.client.get('/admin-panel/')
+        self.assertEqual(response.context['total_orders'], 1)
+
+
+class SalesAnalyticsTests(AdminTestCase):
+    def setUp(self):
+        super().setUp()
+        self.tools = Category.objects.create(name='Tools')
+        self.saw = Product.objects.create(
+            name='Saw', price=40.0, quantity=10, brand='Bosch', category=self.tools,
+            image='product/placeholder.jpg', subtitle='', description='',
+        )
+        self.today = timezone.localdate()
+        old = make_order(self.admin, self.saw, quantity=2)
+        Order.objects.filter(pk=old.pk).update(order_time=timezone.now() - timedelta(days=40))
+        make_order(self.admin, self.saw, quantity=1)
+        make_order(self.admin, self.drill, quantity=1)
+        # Delivery is part of the order total, not of the merchandise revenue
+        Order.objects.update(delivery_fee=50, total=F('total') + 50)
+
+    def test_facts_split_by_day_category_and_brand(self):
+        analytics.build_facts(self.today - timedelta(days=60), self.today, chunk_days=7)
+
+        totals = analytics.range_totals(self.today - timedelta(days=10), self.today)
+        self.assertEqual(totals, {'merchandise_revenue': 140.0, 'order_count': 2, 'units': 2, 'average_order_value': 70.0})
+        brands = analytics.sales_series(self.today - timedelta(days=60), self.today, 'month', SalesFact.SCOPE_BRAND)
+        self.assertEqual(sum(point['units'] for point in brands['Bosch']), 3)
+        self.assertEqual(
+            analytics.top_keys(self.today - timedelta(days=60), self.today, SalesFact.SCOPE_CATEGORY), [str(self.tools.pk)]
+        )
+
+    def test_rebuild_replaces_the_days(self):
+        analytics.build_facts(self.today, self.today)
+        Order.objects.filter(order_detail__product=self.drill).delete()
+        analytics.build_facts(self.today, self.today)
+
+        self.assertEqual(analytics.range_totals(self.today, self.today)['merchandise_revenue'], 40.0)
+
+    def test_page_reads_the_facts(self):
+        analytics.build_facts(self.today, self.today)
+
+        response = self.client.get('/admin-panel/analytics/', {'scope': 'category'})
+        self.assertEqual(response.context['totals']['order_count'], 2)
+        self.assertEqual([series['label'] for series in response.context['chart_data']], ['Tools'])
+
+
+class ExportTests(AdminTestCase):
+    def read_csv(self, response):
+        content = b''.join(response.streaming_content).decode('utf-8')
+        self.assertTrue(content.startswith('\ufeff'))
+        return list(csv.reader(io.StringIO(content[1:])))
+
+    def test_orders_one_row_per_line_and_orders_without_lines(self):
+        order = make_order(self.admin, self.drill, quantity=2)
+        order.order_detail.create(product=None, quantity=1, price=5.0, total=5.0)
+        empty = make_order(self.admin, self.drill)
+        empty.order_detail.all().delete()
+
+        rows = self.read_csv(self.client.get('/admin-panel/export/orders/'))
+        self.assertEqual(rows[0], exports.ORDER_HEADER)
+        self.assertEqual(sorted(row[0] for row in rows[1:]), sorted([order.code, order.code, empty.code]))
+        self.assertEqual([row[9:13] for row in rows[1:] if row[0] == empty.code], [['', '', '', '']])
+
+    def test_formulas_are_written_as_text(self):
+        CustomUser.objects.create_user('evil@example.com', 'secret', first_name='=HYPERLINK("http://x")')
+
+        rows = self.read_csv(self.client.get('/admin-panel/export/users/', {'search': 'evil'}))
+        self.assertEqual([row[1] for row in rows[1:]], ['\'=HYPERLINK("http://x")'])
+
+    def test_xlsx_is_a_valid_workbook(self):
+        self.drill.name = '<Drill & "Saw">'
+        self.drill.save()
 
-# Create your tests here.
+        response = self.client.get('/admin-panel/export/products/', {'format': 'xlsx'})
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+        sheet = archive.read('xl/worksheets/sheet1.xml').decode('utf-8')
+        self.assertIn('&lt;Drill &amp; "Saw"&gt;', sheet)
+        self.assertEqual(sheet.count('<row '), 2)
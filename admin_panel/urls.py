@@ -6,20 +6,27 @@ app_name = 'admin_panel'
 urlpatterns = [
     # Dashboard
     path('', views.admin_dashboard, name='dashboard'),
+    path('analytics/', views.admin_analytics, name='analytics'),
     
     # Products Management
     path('products/', views.admin_products_list, name='products-list'),
     path('products/create/', views.admin_product_create, name='product-create'),
+    path('products/import/', views.admin_products_import, name='products-import'),
     path('products/edit/<uuid:product_id>/', views.admin_product_edit, name='product-edit'),
     path('products/delete/<uuid:product_id>/', views.admin_product_delete, name='product-delete'),
     
     # Orders Management
     path('orders/', views.admin_orders_list, name='orders-list'),
+    path('orders/bulk/', views.admin_orders_bulk_action, name='orders-bulk-action'),
+    path('orders/matching-ids/', views.admin_orders_matching_ids, name='orders-matching-ids'),
     path('orders/<str:order_code>/', views.admin_order_detail, name='order-detail'),
     
     # Users Management
     path('users/', views.admin_users_list, name='users-list'),
     
+    # Exports (CSV / XLSX)
+    path('export/<str:dataset>/', views.admin_export, name='export'),
+    
     # Categories Management
     path('categories/', views.admin_categories_list, name='categories-list'),
     path('categories/add/', views.admin_category_add, name='category-add'),
@@ -1,14 +1,27 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
-from django.db.models import Count, Sum
+from django.db.models import Count, Prefetch, Q
+from django.http import Http404, JsonResponse
 from django.utils import timezone
-from datetime import timedelta
+from datetime import date, timedelta
 
+from . import exports
 from .decorators import admin_required
-from .forms import ProductForm, ProductImageFormSet, OrderStatusForm, CategoryForm
+from .analytics import PERIODS, key_labels, last_built_date, range_totals, sales_series, top_keys
+from .models import SalesFact
+from .stats import get_dashboard_stats
+from .forms import ProductForm, ProductImageFormSet, ProductImportForm, OrderStatusForm, CategoryForm
+from products.importers import ImportFormatError, import_products, read_rows
 from products.models import Product, Category
-from orders.models import Order, OrderDetail
+from orders.models import ORDER_STATUS, Order, OrderDetail
+from orders.status import bulk_set_status
 from accounts.models import CustomUser
+from utils.pagination import KeysetPaginator
+
+
+ADMIN_PAGE_SIZE = 50
+BULK_CHUNK_SIZE = 200     # orders per request when the page applies a bulk status change
+BULK_MAX_ORDERS = 10000
 
 
 @admin_required
@@ -16,67 +29,107 @@ def admin_dashboard(request):
     """
     Admin dashboard with statistics.
     """
-    # Get statistics
-    total_products = Product.objects.filter(is_active=True).count()
-    total_orders = Order.objects.count()
-    pending_orders = Order.objects.filter(status='Received').count()
-    total_users = CustomUser.objects.count()
+    # Counters and revenue come from the rollup tables (admin_panel/stats.py)
+    context = get_dashboard_stats()
     
     # Recent orders
-    recent_orders = Order.objects.all().order_by('-order_time')[:10]
+    context['recent_orders'] = Order.objects.all().order_by('-order_time')[:10]
     
     # Low stock products (quantity < 10)
-    low_stock_products = Product.objects.filter(quantity__lt=10, is_active=True).order_by('quantity')[:5]
+    context['low_stock_products'] = Product.objects.filter(quantity__lt=10, is_active=True).order_by('quantity')[:5]
     
-    # Revenue this month
-    current_month = timezone.now().month
-    current_year = timezone.now().year
-    monthly_revenue = Order.objects.filter(
-        order_time__month=current_month,
-        order_time__year=current_year
-    ).aggregate(total=Sum('total'))['total'] or 0
+    return render(request, 'admin_panel/dashboard.html', context)
+
+
+def _parse_date(value, default):
+    try:
+        return date.fromisoformat(value) if value else default
+    except ValueError:
+        return default
+
+
+@admin_required
+def admin_analytics(request):
+    """
+    Sales analytics over a date range, read from the SalesFact rollup.
+    """
+    today = timezone.localdate()
+    end = _parse_date(request.GET.get('end'), today)
+    start = _parse_date(request.GET.get('start'), end - timedelta(days=29))
+    if start > end:
+        start, end = end, start
+    period = request.GET.get('period', 'day')
+    if period not in PERIODS:
+        period = 'day'
+    scope = request.GET.get('scope', SalesFact.SCOPE_ALL)
+    if scope not in dict(SalesFact.SCOPE_CHOICES):
+        scope = SalesFact.SCOPE_ALL
+    
+    keys = None if scope == SalesFact.SCOPE_ALL else top_keys(start, end, scope)
+    series = sales_series(start, end, period, scope, keys) if keys != [] else {}
+    labels = key_labels(scope, list(series))
+    
+    totals = range_totals(start, end)
     
     context = {
-        'total_products': total_products,
-        'total_orders': total_orders,
-        'pending_orders': pending_orders,
-        'total_users': total_users,
-        'recent_orders': recent_orders,
-        'low_stock_products': low_stock_products,
-        'monthly_revenue': monthly_revenue,
+        'start': start,
+        'end': end,
+        'period': period,
+        'scope': scope,
+        'scope_choices': SalesFact.SCOPE_CHOICES,
+        'totals': totals,
+        'chart_data': [
+            {'label': labels.get(key, key), 'points': points} for key, points in series.items()
+        ],
+        'last_built': last_built_date(),
     }
     
-    return render(request, 'admin_panel/dashboard.html', context)
+    return render(request, 'admin_panel/analytics.html', context)
 
 
-@admin_required
-def admin_products_list(request):
+def _filtered_products(params):
     """
-    List all products with search and filter.
+    Products matching the search/category/status filters of the products list.
     """
     products = Product.objects.all().order_by('-created_at')
     
     # Search
-    search = request.GET.get('search', '')
+    search = params.get('search', '')
     if search:
-        products = products.filter(name__icontains=search)
+        products = products.filter(Q(name__icontains=search) | Q(sku=search))
     
     # Filter by category
-    category_id = request.GET.get('category', '')
+    category_id = params.get('category', '')
     if category_id:
         products = products.filter(category_id=category_id)
     
     # Filter by status
-    status = request.GET.get('status', '')
+    status = params.get('status', '')
     if status == 'active':
         products = products.filter(is_active=True)
     elif status == 'inactive':
         products = products.filter(is_active=False)
     
+    return products
+
+
+@admin_required
+def admin_products_list(request):
+    """
+    List all products with search and filter.
+    """
+    products = _filtered_products(request.GET)
+    search = request.GET.get('search', '')
+    
     categories = Category.objects.all()
     
+    page = KeysetPaginator(
+        products.select_related('category'), ('-created_at', '-id'), ADMIN_PAGE_SIZE, count_mode='approximate'
+    ).page(request.GET.get('cursor'))
+    
     context = {
-        'products': products,
+        'products': page.object_list,
+        'page_obj': page,
         'categories': categories,
         'search': search,
     }
@@ -116,6 +169,48 @@ def admin_product_create(request):
     return render(request, 'admin_panel/product_form.html', context)
 
 
+IMPORT_ERRORS_SHOWN = 500
+
+
+@admin_required
+def admin_products_import(request):
+    """
+    Bulk import products from an uploaded CSV / XLSX / JSONL file.
+    """
+    result = None
+    if request.method == 'POST':
+        form = ProductImportForm(request.POST, request.FILES)
+        if form.is_valid():
+            try:
+                result = import_products(
+                    read_rows(form.cleaned_data['file'].file, form.file_format),
+                    mode=form.cleaned_data['mode'],
+                    dry_run=form.cleaned_data['dry_run'],
+                    create_categories=form.cleaned_data['create_categories'],
+                )
+            except ImportFormatError as exc:
+                messages.error(request, f'❌ {exc}')
+            else:
+                prefix = 'فحص فقط: ' if form.cleaned_data['dry_run'] else ''
+                messages.success(
+                    request,
+                    f'✅ {prefix}{result.created} منتج جديد، {result.updated} منتج محدث.',
+                )
+                if result.errors:
+                    messages.warning(request, f'⚠️ تم رفض {len(result.errors)} صف، راجع الأخطاء بالأسفل.')
+    else:
+        form = ProductImportForm()
+    
+    context = {
+        'form': form,
+        'result': result,
+        'errors': result.errors[:IMPORT_ERRORS_SHOWN] if result else [],
+        'errors_hidden': max(len(result.errors) - IMPORT_ERRORS_SHOWN, 0) if result else 0,
+    }
+    
+    return render(request, 'admin_panel/products_import.html', context)
+
+
 @admin_required
 def admin_product_edit(request, product_id):
     """
@@ -161,32 +256,105 @@ def admin_product_delete(request, product_id):
     return redirect('admin_panel:products-list')
 
 
-@admin_required
-def admin_orders_list(request):
+def _filtered_orders(params):
     """
-    List all orders with filters.
+    Orders matching the status/search filters of the orders list.
     """
     orders = Order.objects.all().order_by('-order_time')
     
     # Filter by status
-    status = request.GET.get('status', '')
+    status = params.get('status', '')
     if status:
         orders = orders.filter(status=status)
     
     # Search by code or customer name
-    search = request.GET.get('search', '')
+    search = params.get('search', '')
     if search:
         orders = orders.filter(code__icontains=search) | orders.filter(address__customer_name__icontains=search)
     
+    return orders
+
+
+@admin_required
+def admin_orders_list(request):
+    """
+    List all orders with filters.
+    """
+    orders = _filtered_orders(request.GET)
+    
+    page = KeysetPaginator(
+        orders.select_related('address'), ('-order_time', '-id'), ADMIN_PAGE_SIZE, count_mode='approximate'
+    ).page(request.GET.get('cursor'))
+    
     context = {
-        'orders': orders,
-        'search': search,
-        'selected_status': status,
+        'orders': page.object_list,
+        'page_obj': page,
+        'search': request.GET.get('search', ''),
+        'selected_status': request.GET.get('status', ''),
+        'status_choices': ORDER_STATUS,
+        'bulk_chunk_size': BULK_CHUNK_SIZE,
     }
     
     return render(request, 'admin_panel/orders_list.html', context)
 
 
+@admin_required
+def admin_orders_matching_ids(request):
+    """
+    Ids of every order matching the current filters, for "select all".
+    """
+    ids = list(_filtered_orders(request.GET).values_list('pk', flat=True)[:BULK_MAX_ORDERS])
+    return JsonResponse({'ids': ids, 'truncated': len(ids) == BULK_MAX_ORDERS})
+
+
+def _selected_order_ids(request):
+    ids = []
+    for value in request.POST.getlist('order_ids'):
+        ids.extend(part for part in value.split(',') if part.strip().isdigit())
+    return [int(pk) for pk in ids[:BULK_MAX_ORDERS]]
+
+
+@admin_required
+def admin_orders_bulk_action(request):
+    """
+    Apply a bulk action to the selected orders: status change, CSV export
+    or packing slips.  Status changes are sent by the page in chunks so
+    very large selections show progress.
+    """
+    if request.method != 'POST':
+        return redirect('admin_panel:orders-list')
+
+    action = request.POST.get('action')
+    order_ids = _selected_order_ids(request)
+
+    if action == 'status':
+        try:
+            updated = bulk_set_status(order_ids, request.POST.get('status'))
+        except ValueError as e:
+            return JsonResponse({'success': False, 'message': str(e)}, status=400)
+        return JsonResponse({'success': True, 'updated': updated, 'received': len(order_ids)})
+
+    if not order_ids:
+        messages.warning(request, '⚠️ لم يتم اختيار أي طلب.')
+        return redirect('admin_panel:orders-list')
+
+    orders = Order.objects.filter(pk__in=order_ids).select_related('address', 'user').order_by('-order_time')
+
+    if action == 'export':
+        return exports.export_response(
+            exports.ORDER_HEADER, exports.order_rows(orders), 'orders', request.POST.get('format', 'csv')
+        )
+
+    if action == 'packing_slips':
+        orders = orders.prefetch_related(
+            Prefetch('order_detail', queryset=OrderDetail.objects.select_related('product'))
+        )
+        return render(request, 'admin_panel/packing_slips.html', {'orders': orders})
+
+    messages.error(request, '❌ إجراء غير معروف.')
+    return redirect('admin_panel:orders-list')
+
+
 @admin_required
 def admin_order_detail(request, order_code):
     """
@@ -213,26 +381,60 @@ def admin_order_detail(request, order_code):
     return render(request, 'admin_panel/order_detail.html', context)
 
 
-@admin_required
-def admin_users_list(request):
+def _filtered_users(params):
     """
-    List all users.
+    Users matching the search of the users list.
     """
     users = CustomUser.objects.all().order_by('-date_joined')
     
     # Search
-    search = request.GET.get('search', '')
+    search = params.get('search', '')
     if search:
         users = users.filter(email__icontains=search) | users.filter(first_name__icontains=search)
     
+    return users
+
+
+@admin_required
+def admin_users_list(request):
+    """
+    List all users.
+    """
+    users = _filtered_users(request.GET)
+    search = request.GET.get('search', '')
+    
+    page = KeysetPaginator(
+        users, ('-date_joined', '-id'), ADMIN_PAGE_SIZE, count_mode='approximate'
+    ).page(request.GET.get('cursor'))
+    
     context = {
-        'users': users,
+        'users': page.object_list,
+        'page_obj': page,
         'search': search,
     }
     
     return render(request, 'admin_panel/users_list.html', context)
 
 
+EXPORTS = {
+    'orders': (lambda params: exports.order_rows(_filtered_orders(params)), exports.ORDER_HEADER),
+    'products': (lambda params: exports.product_rows(_filtered_products(params)), exports.PRODUCT_HEADER),
+    'users': (lambda params: exports.user_rows(_filtered_users(params)), exports.USER_HEADER),
+}
+
+
+@admin_required
+def admin_export(request, dataset):
+    """
+    Stream orders (with lines and addresses), products or users as CSV/XLSX,
+    filtered with the same parameters as the matching list page.
+    """
+    if dataset not in EXPORTS:
+        raise Http404
+    rows, header = EXPORTS[dataset]
+    return exports.export_response(header, rows(request.GET), dataset, request.GET.get('format', 'csv'))
+
+
 # ==================== Categories Management ====================
 
 @admin_required
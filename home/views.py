@@ -1,9 +1,12 @@
 from django.shortcuts import render , redirect
 from django.urls import reverse
 
+from utils.cache import cache_anonymous_page
 
 
 
+
+@cache_anonymous_page()
 def home_view(request):
 
     return render(request, 'home/home.html')
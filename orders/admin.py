@@ -1,6 +1,6 @@
 from django.contrib import admin
 
-from .models import Order, OrderDetail, Cart, CartDetail, Coupon, DeliveryFee, OrderAddress
+from .models import Order, OrderDetail, Cart, CartDetail, Coupon, DeliveryFee, OrderAddress, DeliveryZone, DeliveryRateTier
 
 
 class OrderDetailInline(admin.TabularInline):
@@ -13,10 +13,21 @@ class OrderAdmin(admin.ModelAdmin):
     search_fields = ('code', 'user__email', 'address__customer_name')
     inlines = [OrderDetailInline]
 
+class DeliveryRateTierInline(admin.TabularInline):
+    model = DeliveryRateTier
+    extra = 0
+
+class DeliveryZoneAdmin(admin.ModelAdmin):
+    list_display = ('governorate', 'city', 'fee', 'free_shipping_threshold', 'is_active')
+    list_filter = ('is_active', 'governorate')
+    search_fields = ('governorate', 'city')
+    inlines = [DeliveryRateTierInline]
+
 admin.site.register(Order, OrderAdmin)
 admin.site.register(OrderDetail)
 admin.site.register(OrderAddress)
 admin.site.register(Cart)
 admin.site.register(CartDetail)
 admin.site.register(Coupon)
-admin.site.register(DeliveryFee)
\ No newline at end of file
+admin.site.register(DeliveryFee)
+admin.site.register(DeliveryZone, DeliveryZoneAdmin)
@@ -0,0 +1,72 @@
+"""
+Turn an in-progress cart into an order with a fixed number of queries.
+
+    1. close the cart                               (1 UPDATE)
+    2. load the cart lines with their products      (1 SELECT)
+    3. reserve the stock                            (see orders/stock.py)
+    4. insert the address and the order             (2 INSERTs)
+    5. insert every order line                      (1 bulk INSERT)
+
+Totals are computed in memory from the lines loaded in step 2, at the
+current product prices: the totals stored on the cart lines are only what
+the cart page shows and can miss a queryset write.
+
+The cart is closed first with a conditional UPDATE (``status='Inprogress'``),
+which also locks its row: of two concurrent submits of the same cart (a
+double click) only one updates it, the other waits for it and then finds
+the cart closed.  Any failure rolls the close back with the rest.
+"""
+from django.db import transaction
+
+from .models import Cart, Order, OrderAddress, OrderDetail
+from .stock import reserve_stock
+
+
+class EmptyCart(Exception):
+    pass
+
+
+class CartClosed(Exception):
+    """
+    The cart was already turned into an order, e.g. by a second submit.
+    """
+
+
+def place_order(cart, user, address, delivery_fee=0):
+    """
+    Create the order for ``cart`` and mark the cart completed.
+
+    ``address`` holds the OrderAddress fields.  Raises ``CartClosed``,
+    ``EmptyCart`` or ``orders.stock.InsufficientStock``; in every case
+    nothing is written.
+    """
+    with transaction.atomic():
+        if Cart.objects.filter(pk=cart.pk, status='Inprogress').update(status='Completed') != 1:
+            raise CartClosed()
+
+        lines = list(cart.cart_detail.select_related('product'))
+        if not lines:
+            raise EmptyCart()
+
+        reserve_stock((line.product_id, line.quantity) for line in lines)
+
+        order_address = OrderAddress.objects.create(**address)
+
+        details = [
+            OrderDetail(
+                product=line.product,
+                quantity=line.quantity,
+                price=line.product.price,
+                total=round(line.product.price * line.quantity, 2),
+            )
+            for line in lines
+        ]
+        order = Order(user=user, address=order_address, status='Received', delivery_fee=delivery_fee)
+        order.calculate_total(details=details)
+        order.save()
+
+        for detail in details:
+            detail.order = order
+        OrderDetail.objects.bulk_create(details)
+    cart.status = 'Completed'
+    return order
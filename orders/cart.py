@@ -0,0 +1,184 @@
+"""
+Cart helpers shared by the views and the navbar context processor.
+"""
+import time
+from dataclasses import dataclass
+
+from django.db import transaction
+from django.db.models import Case, F, FloatField, IntegerField, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce, Round
+
+from products.models import Product
+
+from .models import Cart, CartDetail
+
+
+# The navbar summary is kept in the session, which the auth middleware has
+# already loaded, so rendering a page costs no cart or cache query.  The
+# user's own cart requests rewrite it; changes made elsewhere (a price feed
+# repricing the cart, another device) show up within the timeout.
+CART_SUMMARY_TIMEOUT = 60
+SESSION_KEY = 'cart_summary'
+
+
+@dataclass(frozen=True)
+class CartSummary:
+    item_count: int = 0
+    total: float = 0
+
+
+def get_cart_summary(request):
+    """
+    Item count and total of the user's open cart, served from the session.
+    """
+    stored = request.session.get(SESSION_KEY)
+    if stored and stored[2] > time.time():
+        return CartSummary(stored[0], stored[1])
+    totals = Cart.objects.filter(
+        user_id=request.user.pk, status='Inprogress'
+    ).values('item_count', 'subtotal').first()
+    summary = CartSummary(totals['item_count'], round(totals['subtotal'], 2)) if totals else CartSummary()
+    set_cart_summary(request, summary.item_count, summary.total)
+    return summary
+
+
+def set_cart_summary(request, item_count, total):
+    request.session[SESSION_KEY] = [item_count, round(total or 0, 2), time.time() + CART_SUMMARY_TIMEOUT]
+
+
+class CartLineError(Exception):
+    def __init__(self, message, item_id=None, available=None, status=400):
+        self.item_id = item_id
+        self.available = available
+        self.status = status
+        super().__init__(message)
+
+
+def apply_line_changes(cart, changes):
+    """
+    Apply several line changes to ``cart`` at once, all or nothing.
+
+    Each change is a dict with an ``id`` and one of:
+
+    * ``quantity``: the new quantity, 0 removes the line.
+    * ``delta``: added to the current quantity, which never drops below 1.
+    * ``delete``: remove the line.
+
+    The lines are read in one query, written with one UPDATE (plus one
+    DELETE) and the cart totals are shifted by the summed delta in one more
+    UPDATE, so the cost does not depend on the size of the cart.  Returns
+    ``(lines, removed)``: ``{id: (quantity, total)}`` for the kept lines and
+    the ids of the removed ones.  ``cart`` is refreshed with the new totals.
+    """
+    try:
+        item_ids = {int(change['id']) for change in changes}
+    except (KeyError, TypeError, ValueError):
+        raise CartLineError('طلب غير صالح') from None
+    if not item_ids:
+        return {}, []
+
+    with transaction.atomic():
+        current = {
+            row['id']: row
+            for row in CartDetail.objects.select_for_update()
+            .filter(cart=cart, pk__in=item_ids)
+            .values('id', 'quantity', 'total', 'product__name', 'product__price', 'product__quantity')
+        }
+
+        lines, removed = {}, []
+        for change in changes:
+            item_id = int(change['id'])
+            row = current.get(item_id)
+            if row is None:
+                raise CartLineError('العنصر غير موجود', item_id=item_id, status=404)
+            quantity = before = lines[item_id][0] if item_id in lines else row['quantity']
+            try:
+                if change.get('delete'):
+                    quantity = 0
+                elif change.get('quantity') is not None:
+                    quantity = int(change['quantity'])
+                else:
+                    quantity = max(quantity + int(change.get('delta', 0)), 1)
+            except (TypeError, ValueError):
+                raise CartLineError('طلب غير صالح', item_id=item_id) from None
+            if quantity < 0:
+                raise CartLineError('طلب غير صالح', item_id=item_id)
+            # Only an increase is checked: a line above the remaining stock can still be lowered
+            if row['product__quantity'] is not None and quantity > max(row['product__quantity'], before):
+                raise CartLineError(
+                    f'⚠️ الكمية المتوفرة من "{row["product__name"]}": {row["product__quantity"]} قطعة فقط',
+                    item_id=item_id,
+                    available=row['product__quantity'],
+                )
+            lines[item_id] = (quantity, round((row['product__price'] or 0) * quantity, 2))
+
+        items_delta, amount_delta = 0, 0
+        for item_id, (quantity, total) in list(lines.items()):
+            previous = current[item_id]['total'] or 0
+            if quantity == 0:
+                removed.append(item_id)
+                del lines[item_id]
+                items_delta -= 1
+                amount_delta -= previous
+            else:
+                amount_delta += total - previous
+
+        # Queryset writes skip CartDetail.save()/delete(), the cart totals
+        # are shifted once below for the whole batch.
+        if lines:
+            CartDetail.objects.filter(pk__in=lines).update(
+                quantity=Case(
+                    *[When(pk=item_id, then=Value(quantity)) for item_id, (quantity, _total) in lines.items()],
+                    output_field=IntegerField(),
+                ),
+                total=Case(
+                    *[When(pk=item_id, then=Value(total)) for item_id, (_quantity, total) in lines.items()],
+                    output_field=FloatField(),
+                ),
+            )
+        if removed:
+            CartDetail.objects.filter(pk__in=removed).delete()
+        Cart.apply_line_delta(cart.pk, items_delta, amount_delta)
+
+    cart.refresh_from_db(fields=['item_count', 'subtotal', 'total_with_coupon'])
+    return lines, removed
+
+
+def reprice_open_carts(product_ids):
+    """
+    Recompute the open cart lines of ``product_ids`` from the current prices.
+
+    Checkout copies the line totals into the order, so a price change must
+    reach the carts.  One UPDATE rewrites the lines, one more rebuilds the
+    totals of the carts involved; returns the number of carts repriced.
+    """
+    product_ids = list(product_ids)
+    if not product_ids:
+        return 0
+    with transaction.atomic():
+        carts = dict(
+            Cart.objects.filter(status='Inprogress', cart_detail__product_id__in=product_ids)
+            .distinct()
+            .values_list('pk', 'user_id')
+        )
+        if not carts:
+            return 0
+        price = Subquery(Product.objects.filter(pk=OuterRef('product_id')).values('price')[:1])
+        CartDetail.objects.filter(cart_id__in=carts, product_id__in=product_ids).update(
+            total=Round(F('quantity') * price, 2)
+        )
+        subtotal = Coalesce(
+            Subquery(
+                CartDetail.objects.filter(cart_id=OuterRef('pk'))
+                .order_by()
+                .values('cart_id')
+                .annotate(total=Sum('total'))
+                .values('total')
+            ),
+            Value(0.0),
+        )
+        Cart.objects.filter(pk__in=carts).update(
+            subtotal=subtotal,
+            total_with_coupon=subtotal * Cart._coupon_factor(),
+        )
+    return len(carts)
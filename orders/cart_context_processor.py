@@ -1,15 +1,14 @@
-from .models import Cart, CartDetail
+from django.utils.functional import SimpleLazyObject
+
+from .cart import get_cart_summary
 
 
 def get_cart_data(request):
     """
     Context processor to get cart data for navbar.
-    Returns cart and cart_detail for authenticated users.
+    The summary is kept in the session and only loaded if a template uses
+    it, so rendering a page never touches the cart tables.
     """
     if request.user.is_authenticated:
-        cart, created = Cart.objects.get_or_create(user=request.user, status='Inprogress')
-        cart_detail = CartDetail.objects.filter(cart=cart)
-        return {'cart_data': cart, 'cart_detail_data': cart_detail}
-    else:
-        # Return empty queryset for anonymous users
-        return {'cart_data': None, 'cart_detail_data': []}
\ No newline at end of file
+        return {'cart_summary': SimpleLazyObject(lambda: get_cart_summary(request))}
+    return {'cart_summary': None}
@@ -0,0 +1,124 @@
+"""
+Shop configuration (delivery fee, delivery zones) as one cached, versioned snapshot.
+
+The snapshot is built from the database once, shared through the cache and
+memoised per process.  orders/signals.py bumps the namespace version
+whenever a configuration row changes.  The version lives in the shared cache
+(settings.CACHES, the database by default), so reading it costs a query: the
+memo is trusted for ``PROCESS_TIMEOUT`` seconds and only then compared with
+the version, which means a change saved through another worker shows up here
+within that delay.  The worker that saved the change drops its memo at once.
+"""
+import time
+from bisect import bisect_right
+from dataclasses import dataclass, field
+
+from django.core.cache import cache
+
+from products.search import normalize_text
+from utils.cache import bump_version, get_version, make_key
+
+from .models import DeliveryFee, DeliveryRateTier, DeliveryZone
+
+
+CACHE_NAMESPACE = 'shop-config'
+CACHE_TIMEOUT = 60 * 60 * 24
+PROCESS_TIMEOUT = 10
+
+
+def zone_key(governorate, city=''):
+    """
+    Lookup key of a zone, so "الاسكندرية" and "الإسكندرية " are the same zone.
+    """
+    return normalize_text(' '.join((governorate or '').split())), normalize_text(' '.join((city or '').split()))
+
+
+@dataclass(frozen=True)
+class ZoneRate:
+    fee: int
+    free_shipping_threshold: float = None
+    # Sorted ``min_items`` thresholds and the fee of each one
+    tier_thresholds: tuple = ()
+    tier_fees: tuple = ()
+
+    def fee_for(self, units=0, subtotal=0):
+        if self.free_shipping_threshold is not None and subtotal >= self.free_shipping_threshold:
+            return 0
+        index = bisect_right(self.tier_thresholds, units)
+        return self.tier_fees[index - 1] if index else self.fee
+
+
+@dataclass(frozen=True)
+class ShopConfig:
+    delivery_fee: int = 0
+    # zone_key() -> ZoneRate, a governorate-wide zone has an empty city
+    delivery_zones: dict = field(default_factory=dict)
+
+    def delivery_fee_for(self, governorate='', city='', units=0, subtotal=0):
+        """
+        Shipping for a cart of ``units`` pieces: the city zone, else the
+        governorate zone, else the global delivery fee.
+        """
+        if self.delivery_zones and governorate:
+            key = zone_key(governorate, city)
+            zone = self.delivery_zones.get(key) or self.delivery_zones.get((key[0], ''))
+            if zone is not None:
+                return zone.fee_for(units, subtotal)
+        return self.delivery_fee
+
+
+_process_cache = {'version': None, 'config': None, 'expires': 0}
+
+
+def load_shop_config():
+    """
+    Build the configuration snapshot from the database.
+    """
+    # Same row as DeliveryFee.objects.last(): the most recently added fee
+    delivery_fee = DeliveryFee.objects.order_by('-pk').values_list('fee', flat=True).first()
+
+    tiers = {}
+    for zone_id, min_items, fee in DeliveryRateTier.objects.filter(zone__is_active=True).order_by(
+        'zone_id', 'min_items'
+    ).values_list('zone_id', 'min_items', 'fee'):
+        tiers.setdefault(zone_id, []).append((min_items, fee))
+
+    zones = {}
+    for zone_id, governorate, city, fee, threshold in DeliveryZone.objects.filter(is_active=True).values_list(
+        'pk', 'governorate', 'city', 'fee', 'free_shipping_threshold'
+    ):
+        zone_tiers = tiers.get(zone_id, [])
+        zones[zone_key(governorate, city)] = ZoneRate(
+            fee=fee,
+            free_shipping_threshold=threshold,
+            tier_thresholds=tuple(min_items for min_items, _fee in zone_tiers),
+            tier_fees=tuple(tier_fee for _min_items, tier_fee in zone_tiers),
+        )
+    return ShopConfig(delivery_fee=delivery_fee or 0, delivery_zones=zones)
+
+
+def get_shop_config():
+    """
+    Current ``ShopConfig``, without touching the cache or the database once warm.
+    """
+    now = time.monotonic()
+    if now < _process_cache['expires']:
+        return _process_cache['config']
+
+    version = get_version(CACHE_NAMESPACE)
+    if _process_cache['version'] == version:
+        _process_cache['expires'] = now + PROCESS_TIMEOUT
+        return _process_cache['config']
+
+    key = make_key(CACHE_NAMESPACE, 'config')
+    config = cache.get(key)
+    if config is None:
+        config = load_shop_config()
+        cache.set(key, config, CACHE_TIMEOUT)
+    _process_cache.update(version=version, config=config, expires=now + PROCESS_TIMEOUT)
+    return config
+
+
+def invalidate_shop_config():
+    _process_cache['expires'] = 0
+    bump_version(CACHE_NAMESPACE)
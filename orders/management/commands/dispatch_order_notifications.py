@@ -0,0 +1,33 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from orders.notifications import notify_customers, notify_webhook
+
+
+class Command(BaseCommand):
+    help = 'إرسال إشعارات تغيير حالة الطلبات للعملاء والـ webhook'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--window', type=int, default=300, help='ثواني تجميع التغييرات لكل طلب')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--loop', action='store_true', help='العمل باستمرار كـ worker')
+        parser.add_argument('--interval', type=float, default=30)
+
+    def handle(self, *args, **options):
+        window = timedelta(seconds=options['window'])
+        batch_size = options['batch_size']
+        while True:
+            events, emails = notify_customers(window, batch_size)
+            delivered = notify_webhook(window, batch_size)
+            if events or delivered:
+                self.stdout.write(f'🔔 {events} تغيير حالة → {emails} رسالة، webhook: {delivered}')
+
+            if events >= batch_size or delivered >= batch_size:
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+
+        self.stdout.write(self.style.SUCCESS('✅ تم إرسال الإشعارات'))
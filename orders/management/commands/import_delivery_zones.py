@@ -0,0 +1,102 @@
+import csv
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from orders.config import invalidate_shop_config
+from orders.models import DeliveryRateTier, DeliveryZone
+
+
+class Command(BaseCommand):
+    help = 'استيراد مناطق التوصيل ورسومها من ملف CSV'
+
+    def add_arguments(self, parser):
+        parser.add_argument('csv_file')
+        parser.add_argument(
+            '--replace',
+            action='store_true',
+            help='حذف المناطق غير الموجودة في الملف',
+        )
+
+    def handle(self, *args, **options):
+        """
+        Columns: governorate, city, fee, free_shipping_threshold, tiers
+        ``tiers`` looks like ``3:30|6:0`` (from 3 pieces in the cart the fee is 30, from 6 it is free).
+        """
+        rows = self._read_rows(options['csv_file'])
+
+        with transaction.atomic():
+            existing = {(zone.governorate, zone.city): zone for zone in DeliveryZone.objects.all()}
+
+            to_create, to_update = [], []
+            for row in rows:
+                zone = existing.get((row['governorate'], row['city']))
+                if zone is None:
+                    zone = DeliveryZone(governorate=row['governorate'], city=row['city'])
+                    to_create.append(zone)
+                else:
+                    to_update.append(zone)
+                zone.fee = row['fee']
+                zone.free_shipping_threshold = row['free_shipping_threshold']
+                zone.is_active = True
+                row['zone'] = zone
+
+            DeliveryZone.objects.bulk_create(to_create)
+            DeliveryZone.objects.bulk_update(to_update, ['fee', 'free_shipping_threshold', 'is_active'])
+
+            # Tiers of the imported zones are replaced as a whole
+            DeliveryRateTier.objects.filter(zone__in=to_update).delete()
+            DeliveryRateTier.objects.bulk_create([
+                DeliveryRateTier(zone=row['zone'], min_items=min_items, fee=fee)
+                for row in rows
+                for min_items, fee in row['tiers']
+            ])
+
+            removed = 0
+            if options['replace']:
+                imported = {(row['governorate'], row['city']) for row in rows}
+                stale = [zone.pk for key, zone in existing.items() if key not in imported]
+                removed, _ = DeliveryZone.objects.filter(pk__in=stale).delete()
+
+            # Bulk writes skip the model signals
+            transaction.on_commit(invalidate_shop_config)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ تم استيراد {len(rows)} منطقة ({len(to_create)} جديدة، {len(to_update)} محدثة، {removed} محذوفة)'
+        ))
+
+    def _read_rows(self, path):
+        try:
+            with open(path, newline='', encoding='utf-8-sig') as csv_file:
+                reader = csv.DictReader(csv_file)
+                rows, seen = [], set()
+                for line, raw in enumerate(reader, start=2):
+                    row = self._parse_row(raw, line)
+                    key = (row['governorate'], row['city'])
+                    if key in seen:
+                        raise CommandError(f'❌ السطر {line}: المنطقة مكررة')
+                    seen.add(key)
+                    rows.append(row)
+        except OSError as e:
+            raise CommandError(f'❌ تعذر قراءة الملف: {e}')
+        return rows
+
+    def _parse_row(self, raw, line):
+        governorate = ' '.join((raw.get('governorate') or '').split())
+        if not governorate:
+            raise CommandError(f'❌ السطر {line}: المحافظة مطلوبة')
+        try:
+            threshold = (raw.get('free_shipping_threshold') or '').strip()
+            tiers = []
+            for tier in filter(None, (raw.get('tiers') or '').split('|')):
+                min_items, fee = tier.split(':')
+                tiers.append((int(min_items), int(fee)))
+            return {
+                'governorate': governorate,
+                'city': ' '.join((raw.get('city') or '').split()),
+                'fee': int(raw['fee']),
+                'free_shipping_threshold': float(threshold) if threshold else None,
+                'tiers': tiers,
+            }
+        except (KeyError, TypeError, ValueError):
+            raise CommandError(f'❌ السطر {line}: قيمة غير صالحة')
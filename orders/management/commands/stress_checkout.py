@@ -0,0 +1,110 @@
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection
+
+from accounts.models import CustomUser
+from orders.builder import CartClosed, place_order
+from orders.models import Cart, CartDetail, Order, OrderDetail
+from orders.stock import InsufficientStock
+from products.models import Product
+
+
+ADDRESS = {
+    'customer_name': 'stress test',
+    'customer_phone': '0100000000',
+    'governorate': 'stress test',
+    'address_line': 'stress test',
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'اختبار ضغط لإتمام الطلب: طلبات متوازية (place_order) على منتج واحد والتأكد من عدم البيع بأكثر من المتوفر. '
+        'يعمل على قاعدة بيانات مؤقتة تُحذف في النهاية، ولا يلمس البيانات الحقيقية'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--checkouts', type=int, default=300, help='عدد السلات المتوازية')
+        parser.add_argument('--workers', type=int, default=32)
+        parser.add_argument('--stock', type=int, default=100, help='الكمية الابتدائية للمنتج')
+        parser.add_argument('--quantity', type=int, default=1, help='الكمية في كل سلة')
+        parser.add_argument('--double-submit', action='store_true', help='إرسال كل سلة مرتين (نقرة مزدوجة)')
+        parser.add_argument('--retries', type=int, default=50, help='إعادة المحاولة عند قفل قاعدة البيانات (SQLite)')
+
+    def handle(self, *args, **options):
+        # A throwaway copy of the schema: the signals fired by the checkouts
+        # (search index, caches, counters) never reach the configured database.
+        original_name = connection.settings_dict['NAME']
+        directory = None
+        if connection.vendor == 'sqlite':
+            # A file rather than memory, so every worker thread opens the same database
+            directory = tempfile.mkdtemp(prefix='stress-checkout-')
+            connection.settings_dict.setdefault('TEST', {})['NAME'] = os.path.join(directory, 'stress.sqlite3')
+        self.stdout.write('⏳ إنشاء قاعدة بيانات مؤقتة...')
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            self.run_checkouts(options)
+        finally:
+            connection.creation.destroy_test_db(original_name, verbosity=0)
+            if directory:
+                os.rmdir(directory)
+
+    def run_checkouts(self, options):
+        stock, quantity = options['stock'], options['quantity']
+        product = Product.objects.create(
+            name='stress test', price=1, image='product/stress-test.jpg',
+            subtitle='stress test', description='stress test', quantity=stock,
+        )
+        user = CustomUser.objects.create_user('stress@example.com')
+        carts = Cart.objects.bulk_create(
+            Cart(user=user, status='Inprogress', item_count=1, subtotal=quantity)
+            for _ in range(options['checkouts'])
+        )
+        CartDetail.objects.bulk_create(
+            CartDetail(cart=cart, product=product, quantity=quantity, total=quantity) for cart in carts
+        )
+        submits = carts * 2 if options['double_submit'] else carts
+
+        def checkout(cart):
+            try:
+                for _attempt in range(options['retries']):
+                    try:
+                        place_order(cart, user, ADDRESS)
+                        return 'ok'
+                    except InsufficientStock:
+                        return 'insufficient'
+                    except CartClosed:
+                        return 'closed'
+                    except OperationalError:
+                        # SQLite allows one writer at a time, wait and retry
+                        time.sleep(0.01)
+                return 'error'
+            finally:
+                connection.close()
+
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            results = list(pool.map(checkout, submits))
+        elapsed = time.monotonic() - started
+
+        product.refresh_from_db(fields=['quantity'])
+        succeeded = results.count('ok')
+        failed = results.count('error')
+        orders = Order.objects.count()
+        sold = sum(OrderDetail.objects.values_list('quantity', flat=True))
+        self.stdout.write(
+            f'submits={len(results)} succeeded={succeeded} rejected={results.count("insufficient")} '
+            f'closed={results.count("closed")} errors={failed} orders={orders} '
+            f'final_stock={product.quantity} elapsed={elapsed:.2f}s'
+        )
+        if product.quantity < 0 or sold != stock - product.quantity:
+            raise CommandError('❌ تم بيع كمية أكبر من المتوفر (oversell)')
+        if orders != succeeded or orders > len(carts):
+            raise CommandError('❌ عدد الطلبات لا يطابق عدد السلات المكتملة (طلب مكرر)')
+        if succeeded * quantity != min(stock // quantity, len(carts) - failed) * quantity:
+            self.stdout.write(self.style.WARNING('⚠️ بعض الطلبات رُفضت رغم توفر الكمية (راجع أخطاء القفل)'))
+        self.stdout.write(self.style.SUCCESS('✅ لا يوجد بيع بأكثر من المتوفر'))
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.8 on 2026-10-18 12:36
+
+from django.db import migrations, models
+
+
+def backfill_cart_totals(apps, schema_editor):
+    Cart = apps.get_model('orders', 'Cart')
+    CartDetail = apps.get_model('orders', 'CartDetail')
+    totals = CartDetail.objects.values('cart_id').annotate(
+        item_count=models.Count('pk'), subtotal=models.Sum('total')
+    )
+    for row in totals:
+        cart = Cart.objects.select_related('coupon').get(pk=row['cart_id'])
+        subtotal = row['subtotal'] or 0
+        discount = cart.coupon.descount if cart.coupon_id else 0
+        Cart.objects.filter(pk=cart.pk).update(
+            item_count=row['item_count'],
+            subtotal=subtotal,
+            total_with_coupon=subtotal * (1 - discount / 100),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0005_alter_order_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cart',
+            name='item_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='عدد المنتجات'),
+        ),
+        migrations.AddField(
+            model_name='cart',
+            name='subtotal',
+            field=models.FloatField(default=0, verbose_name='المجموع الفرعي'),
+        ),
+        migrations.RunPython(backfill_cart_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.8 on 2026-10-18 12:41
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0006_cart_item_count_cart_subtotal'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeliveryZone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('governorate', models.CharField(max_length=100, verbose_name='المحافظة')),
+                ('city', models.CharField(blank=True, max_length=100, verbose_name='المدينة')),
+                ('fee', models.IntegerField(verbose_name='رسوم الشحن')),
+                ('free_shipping_threshold', models.FloatField(blank=True, null=True, verbose_name='شحن مجاني من')),
+                ('is_active', models.BooleanField(default=True, verbose_name='مفعل')),
+            ],
+            options={
+                'verbose_name': 'منطقة توصيل',
+                'verbose_name_plural': 'مناطق التوصيل',
+                'constraints': [models.UniqueConstraint(fields=('governorate', 'city'), name='unique_delivery_zone')],
+            },
+        ),
+        migrations.CreateModel(
+            name='DeliveryRateTier',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('min_items', models.PositiveIntegerField(verbose_name='من عدد منتجات')),
+                ('fee', models.IntegerField(verbose_name='رسوم الشحن')),
+                ('zone', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tiers', to='orders.deliveryzone')),
+            ],
+            options={
+                'ordering': ['zone', 'min_items'],
+                'constraints': [models.UniqueConstraint(fields=('zone', 'min_items'), name='unique_delivery_tier')],
+            },
+        ),
+    ]
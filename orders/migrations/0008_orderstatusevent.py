@@ -0,0 +1,31 @@
+# Generated by Django 5.2.8 on 2026-10-18 12:44
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0007_deliveryzone_deliveryratetier'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderStatusEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('from_status', models.CharField(choices=[('Received', 'تم الاستلام'), ('Processed', 'قيد المعالجة'), ('Shipped', 'تم الشحن'), ('Delivered', 'تم التوصيل')], max_length=20)),
+                ('to_status', models.CharField(choices=[('Received', 'تم الاستلام'), ('Processed', 'قيد المعالجة'), ('Shipped', 'تم الشحن'), ('Delivered', 'تم التوصيل')], max_length=20)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('notified_at', models.DateTimeField(blank=True, null=True)),
+                ('webhook_sent_at', models.DateTimeField(blank=True, null=True)),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='status_events', to='orders.order')),
+            ],
+            options={
+                'ordering': ['created_at', 'id'],
+                'indexes': [models.Index(fields=['notified_at', 'created_at'], name='status_event_notify_idx'), models.Index(fields=['webhook_sent_at', 'created_at'], name='status_event_webhook_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.8 on 2026-10-18 13:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0008_orderstatusevent'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderstatusevent',
+            name='webhook_claimed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='orderstatusevent',
+            name='webhook_claimed_by',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+    ]
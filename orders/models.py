@@ -1,5 +1,7 @@
 
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
 from accounts.models import CustomUser 
 from django.utils import timezone
 import datetime
@@ -54,10 +56,34 @@ class Order(models.Model):
     
     def __str__(self):
         return f"Order #{self.code}"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if 'status' in field_names:
+            instance._persisted_status = instance.status
+        if 'total' in field_names:
+            instance._persisted_total = instance.total
+        return instance
+
+    def save(self, *args, **kwargs):
+        previous = getattr(self, '_persisted_status', None)
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            # كل تغيير في الحالة يُسجَّل ليُرسل إشعار العميل لاحقاً
+            if previous is not None and previous != self.status:
+                OrderStatusEvent.objects.create(order=self, from_status=previous, to_status=self.status)
+        self._persisted_status = self.status
+        self._persisted_total = self.total
     
-    def calculate_total(self):
-        """Calculate order total from order details."""
-        subtotal = sum([detail.total for detail in self.order_detail.all()])
+    def calculate_total(self, details=None):
+        """
+        Calculate order total from order details.
+        Pass ``details`` when the lines are already in memory to skip the query.
+        """
+        if details is None:
+            details = self.order_detail.all()
+        subtotal = sum([detail.total for detail in details])
         self.subtotal = subtotal
         self.total = subtotal + self.delivery_fee - self.discount
         if self.coupon:
@@ -71,6 +97,31 @@ class Order(models.Model):
         ordering = ['-order_time']
 
 
+class OrderStatusEvent(models.Model):
+    """
+    A status transition, fanned out by ``dispatch_order_notifications``.
+    """
+    order = models.ForeignKey(Order, related_name='status_events', on_delete=models.CASCADE)
+    from_status = models.CharField(choices=ORDER_STATUS, max_length=20)
+    to_status = models.CharField(choices=ORDER_STATUS, max_length=20)
+    created_at = models.DateTimeField(default=timezone.now)
+    notified_at = models.DateTimeField(blank=True, null=True)
+    webhook_sent_at = models.DateTimeField(blank=True, null=True)
+    # Set while a worker posts the event, see orders/notifications.py
+    webhook_claimed_by = models.CharField(max_length=64, blank=True)
+    webhook_claimed_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ['created_at', 'id']
+        indexes = [
+            models.Index(fields=['notified_at', 'created_at'], name='status_event_notify_idx'),
+            models.Index(fields=['webhook_sent_at', 'created_at'], name='status_event_webhook_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.order} : {self.from_status} → {self.to_status}"
+
+
 class OrderDetail(models.Model):
     order = models.ForeignKey(Order,related_name = 'order_detail',on_delete = models.CASCADE)
     product = models.ForeignKey(Product,related_name = 'orderdetail_product',on_delete = models.SET_NULL,blank=True, null=True)
@@ -92,20 +143,83 @@ class Cart(models.Model):
     user = models.ForeignKey(CustomUser,related_name='cart_owner',on_delete=models.SET_NULL,blank=True, null=True)
     status = models.CharField( choices=CART_STATUS,max_length=20)
     coupon = models.ForeignKey('Coupon',related_name='cart_coupon',on_delete=models.SET_NULL,blank=True, null=True)
+    # Denormalised totals, maintained by CartDetail.save()/delete()
+    item_count = models.PositiveIntegerField('عدد المنتجات', default=0)
+    subtotal = models.FloatField('المجموع الفرعي', default=0)
     total_with_coupon = models.FloatField(blank=True, null=True)
 
     @property
     def cart_total(self):
-        total = 0
-        for item in self.cart_detail.all():
-            total += item.total
-        return round(total,2)
+        return round(self.subtotal, 2)
+
+    @staticmethod
+    def _coupon_factor():
+        descount = Subquery(Coupon.objects.filter(pk=OuterRef('coupon_id')).values('descount')[:1])
+        return 1 - Coalesce(descount, Value(0.0)) / 100
+
+    @classmethod
+    def apply_line_delta(cls, cart_id, items=0, amount=0):
+        """
+        Shift the cart totals by a line change in a single UPDATE.
+        """
+        return cls.objects.filter(pk=cart_id).update(
+            item_count=F('item_count') + items,
+            subtotal=F('subtotal') + amount,
+            # SET expressions see the old row, so recompute from the new subtotal
+            total_with_coupon=(F('subtotal') + amount) * cls._coupon_factor(),
+        )
+
+    def unit_count(self):
+        """
+        Pieces in the cart, the sum of the line quantities (``item_count`` counts lines).
+        """
+        return self.cart_detail.aggregate(units=models.Sum('quantity'))['units'] or 0
+
+    def recalculate(self):
+        """
+        Rebuild the totals from the cart lines (e.g. after a coupon change).
+        """
+        totals = self.cart_detail.aggregate(item_count=models.Count('pk'), subtotal=models.Sum('total'))
+        Cart.objects.filter(pk=self.pk).update(
+            item_count=totals['item_count'],
+            subtotal=totals['subtotal'] or 0,
+            total_with_coupon=(totals['subtotal'] or 0) * self._coupon_factor(),
+        )
+        self.refresh_from_db(fields=['item_count', 'subtotal', 'total_with_coupon'])
+
 
 class CartDetail(models.Model):
     cart = models.ForeignKey(Cart,related_name = 'cart_detail',on_delete = models.CASCADE)
     product = models.ForeignKey(Product,related_name = 'cartdetail_product',on_delete = models.SET_NULL,blank=True, null=True)
     quantity = models.IntegerField(default=1)
     total = models.FloatField(blank=True, null=True)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if 'total' in field_names:
+            instance._persisted_total = instance.total or 0
+        return instance
+
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        with transaction.atomic():
+            if adding:
+                previous = 0
+            elif hasattr(self, '_persisted_total'):
+                previous = self._persisted_total
+            else:
+                previous = CartDetail.objects.filter(pk=self.pk).values_list('total', flat=True).first() or 0
+            super().save(*args, **kwargs)
+            Cart.apply_line_delta(self.cart_id, 1 if adding else 0, (self.total or 0) - previous)
+        self._persisted_total = self.total or 0
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            result = super().delete(*args, **kwargs)
+            Cart.apply_line_delta(self.cart_id, -1, -getattr(self, '_persisted_total', self.total or 0))
+        return result
+
     def to_dict(self):
         return {
             'id': self.id,
@@ -135,4 +249,43 @@ class DeliveryFee(models.Model):
     fee = models.IntegerField()
 
     def __str__(self) :
-        return str(self.fee)
\ No newline at end of file
+        return str(self.fee)
+
+class DeliveryZone(models.Model):
+    """
+    Delivery fee for a governorate, or for one city inside it.
+    A zone with an empty city covers the rest of the governorate.
+    """
+    governorate = models.CharField('المحافظة', max_length=100)
+    city = models.CharField('المدينة', max_length=100, blank=True)
+    fee = models.IntegerField('رسوم الشحن')
+    free_shipping_threshold = models.FloatField('شحن مجاني من', blank=True, null=True)
+    is_active = models.BooleanField('مفعل', default=True)
+
+    class Meta:
+        verbose_name = 'منطقة توصيل'
+        verbose_name_plural = 'مناطق التوصيل'
+        constraints = [
+            models.UniqueConstraint(fields=['governorate', 'city'], name='unique_delivery_zone'),
+        ]
+
+    def __str__(self):
+        return f"{self.governorate} - {self.city}" if self.city else self.governorate
+
+
+class DeliveryRateTier(models.Model):
+    """
+    Zone fee for carts with at least ``min_items`` pieces (line quantities summed).
+    """
+    zone = models.ForeignKey(DeliveryZone, related_name='tiers', on_delete=models.CASCADE)
+    min_items = models.PositiveIntegerField('من عدد منتجات')
+    fee = models.IntegerField('رسوم الشحن')
+
+    class Meta:
+        ordering = ['zone', 'min_items']
+        constraints = [
+            models.UniqueConstraint(fields=['zone', 'min_items'], name='unique_delivery_tier'),
+        ]
+
+    def __str__(self):
+        return f"{self.zone} ({self.min_items}+): {self.fee}"
@@ -0,0 +1,185 @@
+"""
+Fan-out of order status changes to customers (email) and a webhook.
+
+``Order.save()`` records an ``OrderStatusEvent`` for every transition.  The
+``dispatch_order_notifications`` worker picks events once they are older
+than a coalescing window, folds all transitions of an order into one
+(first ``from_status`` → last ``to_status``) and sends each customer a
+single email covering all of their changed orders.  The webhook receives
+the same events as JSON, one POST per batch.  Webhook events are claimed
+(``webhook_claimed_by``) and committed before the POST, so no transaction
+or row lock is held while waiting on the remote server; a claim left by a
+dead worker expires after ``CLAIM_TIMEOUT``.
+"""
+import json
+import logging
+import urllib.request
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from accounts.email_rendering import enqueue_templated_emails
+
+from .models import ORDER_STATUS, OrderStatusEvent
+
+
+logger = logging.getLogger(__name__)
+
+STATUS_LABELS = dict(ORDER_STATUS)
+DEFAULT_WINDOW = timedelta(minutes=5)
+EMAIL_SUBJECT = 'تحديث حالة طلبك - متجر الوسام للأدوات الكهربائية'
+CLAIM_TIMEOUT = timedelta(minutes=15)
+
+
+def _due_events(flag, window, batch_size, extra=Q()):
+    """
+    Unhandled events of up to ``batch_size`` orders that had no transition
+    during the last ``window``; all events of an order come together.
+    """
+    cutoff = timezone.now() - window
+    pending = OrderStatusEvent.objects.filter(extra, **{f'{flag}__isnull': True, 'created_at__lte': cutoff})
+    recent_orders = OrderStatusEvent.objects.filter(created_at__gt=cutoff).values('order_id')
+    order_ids = list(
+        pending.exclude(order_id__in=recent_orders)
+        .order_by('order_id')
+        .values_list('order_id', flat=True)
+        .distinct()[:batch_size]
+    )
+    if not order_ids:
+        return []
+
+    events = pending.filter(order_id__in=order_ids).select_related('order__address', 'order__user')
+    # Parallel workers skip each other's rows instead of sending twice
+    if connection.features.has_select_for_update_skip_locked and connection.features.has_select_for_update_of:
+        events = events.select_for_update(skip_locked=True, of=('self',))
+    return list(events.order_by('created_at', 'pk'))
+
+
+def coalesce(events):
+    """
+    Fold the events of each order into ``{order: (from_status, to_status)}``.
+    Orders that ended where they started (e.g. a status set by mistake and
+    reverted) are dropped.
+    """
+    changes = {}
+    for event in events:
+        if event.order_id in changes:
+            order, first, _last = changes[event.order_id]
+            changes[event.order_id] = (order, first, event.to_status)
+        else:
+            changes[event.order_id] = (event.order, event.from_status, event.to_status)
+    return {
+        order: (from_status, to_status)
+        for order, from_status, to_status in changes.values()
+        if from_status != to_status
+    }
+
+
+def _customer_email(order):
+    if order.address and order.address.customer_email:
+        return order.address.customer_email
+    return order.user.email if order.user else ''
+
+
+def notify_customers(window=DEFAULT_WINDOW, batch_size=500):
+    """
+    Queue one email per customer for the due events; returns ``(events, emails)``.
+    """
+    with transaction.atomic():
+        events = _due_events('notified_at', window, batch_size)
+        if not events:
+            return 0, 0
+
+        per_customer = {}
+        for order, (from_status, to_status) in coalesce(events).items():
+            email = _customer_email(order)
+            if not email:
+                continue
+            per_customer.setdefault(email, []).append({
+                'code': order.code,
+                'from_status': STATUS_LABELS.get(from_status, from_status),
+                'status': STATUS_LABELS.get(to_status, to_status),
+                'name': order.address.customer_name if order.address else '',
+            })
+
+        emails = enqueue_templated_emails(
+            'order_status',
+            EMAIL_SUBJECT,
+            {},
+            ((email, {'orders': orders, 'customer_name': orders[0]['name']}) for email, orders in per_customer.items()),
+        )
+        OrderStatusEvent.objects.filter(pk__in=[event.pk for event in events]).update(notified_at=timezone.now())
+    return len(events), emails
+
+
+def post_webhook(payload, url, timeout=10):
+    request = urllib.request.Request(
+        url,
+        data=json.dumps(payload, ensure_ascii=False).encode('utf-8'),
+        headers={'Content-Type': 'application/json'},
+        method='POST',
+    )
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return response.status
+
+
+def notify_webhook(window=DEFAULT_WINDOW, batch_size=500):
+    """
+    POST the due events to ``ORDER_WEBHOOK_URL`` in one request; returns the
+    number delivered.  Failed batches are released for the next run.
+    """
+    url = getattr(settings, 'ORDER_WEBHOOK_URL', '')
+    if not url:
+        return 0
+
+    owner, events = _claim_webhook_events(window, batch_size)
+    if not events:
+        return 0
+    return _deliver_webhook(url, owner, events)
+
+
+def _claim_webhook_events(window, batch_size):
+    """
+    Mark the due events as taken by this worker and commit.
+
+    The conditional UPDATE only takes events nobody holds, so two workers
+    never post the same event even where SKIP LOCKED is unavailable (SQLite).
+    """
+    now = timezone.now()
+    unclaimed = Q(webhook_claimed_at__isnull=True) | Q(webhook_claimed_at__lt=now - CLAIM_TIMEOUT)
+    owner = uuid.uuid4().hex
+    with transaction.atomic():
+        ids = [event.pk for event in _due_events('webhook_sent_at', window, batch_size, unclaimed)]
+        if not ids:
+            return owner, []
+        OrderStatusEvent.objects.filter(unclaimed, pk__in=ids).update(
+            webhook_claimed_by=owner, webhook_claimed_at=now
+        )
+    events = OrderStatusEvent.objects.filter(webhook_claimed_by=owner, webhook_sent_at__isnull=True)
+    return owner, list(events.select_related('order').order_by('created_at', 'pk'))
+
+
+def _deliver_webhook(url, owner, events):
+    payload = {
+        'events': [
+            {
+                'order': order.code,
+                'from_status': from_status,
+                'to_status': to_status,
+            }
+            for order, (from_status, to_status) in coalesce(events).items()
+        ],
+    }
+    claimed = OrderStatusEvent.objects.filter(pk__in=[event.pk for event in events], webhook_claimed_by=owner)
+    try:
+        post_webhook(payload, url)
+    except Exception:
+        logger.exception('Order webhook delivery failed')
+        claimed.update(webhook_claimed_by='', webhook_claimed_at=None)
+        return 0
+    claimed.update(webhook_sent_at=timezone.now())
+    return len(events)
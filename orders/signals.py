@@ -0,0 +1,42 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import Signal, receiver
+
+from products.models import Product
+from products.signals import product_stock_changed
+
+from .cart import reprice_open_carts
+from .config import invalidate_shop_config
+from .models import DeliveryFee, DeliveryRateTier, DeliveryZone
+
+
+# Sent by orders.status.bulk_set_status(), whose queryset UPDATE skips
+# post_save. ``transitions`` is a list of (order_id, from_status, to_status).
+order_statuses_changed = Signal()
+
+
+@receiver(post_save, sender=DeliveryFee)
+@receiver(post_delete, sender=DeliveryFee)
+@receiver(post_save, sender=DeliveryZone)
+@receiver(post_delete, sender=DeliveryZone)
+@receiver(post_save, sender=DeliveryRateTier)
+@receiver(post_delete, sender=DeliveryRateTier)
+def invalidate_config_cache(sender, raw=False, **kwargs):
+    if raw:
+        return
+    transaction.on_commit(invalidate_shop_config)
+
+
+@receiver(product_stock_changed)
+def reprice_carts(sender, changes, **kwargs):
+    reprice_open_carts(change.product_id for change in changes if change.old_price != change.new_price)
+
+
+@receiver(post_save, sender=Product)
+def reprice_carts_on_save(sender, instance, created, raw=False, **kwargs):
+    # Admin form edits; bulk writes send product_stock_changed
+    if raw or created or getattr(instance, '_persisted_price', None) == instance.price:
+        return
+    instance._persisted_price = instance.price
+    product_id = instance.pk
+    transaction.on_commit(lambda: reprice_open_carts([product_id]))
@@ -0,0 +1,45 @@
+"""
+Bulk order status changes.
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ORDER_STATUS, Order, OrderStatusEvent
+from .signals import order_statuses_changed
+
+
+STATUS_VALUES = {value for value, _label in ORDER_STATUS}
+
+
+def bulk_set_status(order_ids, status):
+    """
+    Move the given orders to ``status`` and return how many changed.
+
+    One SELECT reads the current statuses, one ``UPDATE ... WHERE id IN (...)``
+    writes the new one and one INSERT records the transitions for the
+    customer notifications, whatever the number of orders.
+    """
+    if status not in STATUS_VALUES:
+        raise ValueError(f'Unknown order status: {status}')
+
+    with transaction.atomic():
+        current = list(
+            Order.objects.select_for_update()
+            .filter(pk__in=list(order_ids))
+            .exclude(status=status)
+            .values_list('pk', 'status')
+        )
+        if not current:
+            return 0
+
+        Order.objects.filter(pk__in=[pk for pk, _status in current]).update(status=status)
+        now = timezone.now()
+        OrderStatusEvent.objects.bulk_create([
+            OrderStatusEvent(order_id=pk, from_status=previous, to_status=status, created_at=now)
+            for pk, previous in current
+        ])
+        order_statuses_changed.send(
+            sender=Order,
+            transitions=[(pk, previous, status) for pk, previous in current],
+        )
+    return len(current)
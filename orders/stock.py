@@ -0,0 +1,99 @@
+"""
+Race-free stock reservation for checkout.
+
+Stock is taken with one conditional UPDATE:
+
+    UPDATE products_product
+       SET quantity = quantity - CASE id WHEN ... THEN n END
+     WHERE id IN (...) AND quantity >= CASE id WHEN ... THEN n END
+
+If fewer rows than requested products were updated, at least one product
+ran short and the whole reservation is rolled back.  Rows are locked in
+primary key order first (where the backend supports it) so concurrent
+checkouts touching the same products cannot deadlock.
+"""
+from collections import namedtuple
+
+from django.db import connection, transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.db.models.functions import Now
+
+from products import facets
+from products.models import Product
+from utils.cache import PAGES_NAMESPACE, bump_version
+
+
+Shortage = namedtuple('Shortage', 'product_id name requested available')
+
+
+class InsufficientStock(Exception):
+    def __init__(self, shortages):
+        self.shortages = shortages
+        super().__init__(', '.join(f'{s.name}: {s.available}/{s.requested}' for s in shortages))
+
+
+def _requested_quantities(lines):
+    """
+    Merge ``(product_id, quantity)`` pairs, a product may appear twice.
+    """
+    requested = {}
+    for product_id, quantity in lines:
+        requested[product_id] = requested.get(product_id, 0) + quantity
+    return requested
+
+
+def reserve_stock(lines):
+    """
+    Take ``(product_id, quantity)`` pairs out of stock, all or nothing.
+
+    Raises ``InsufficientStock`` listing every product that ran short; the
+    enclosing transaction (if any) is left untouched.
+    """
+    requested = _requested_quantities(lines)
+    if not requested:
+        return
+
+    needed = Case(
+        *[When(pk=product_id, then=Value(quantity)) for product_id, quantity in requested.items()],
+        output_field=IntegerField(),
+    )
+    try:
+        with transaction.atomic():
+            if connection.features.has_select_for_update:
+                list(
+                    Product.objects.select_for_update()
+                    .filter(pk__in=requested)
+                    .order_by('pk')
+                    .values_list('pk', flat=True)
+                )
+            updated = Product.objects.filter(pk__in=requested, quantity__gte=needed).update(
+                quantity=F('quantity') - needed,
+                updated_at=Now(),
+            )
+            if updated != len(requested):
+                raise _Rollback
+            # Stock badges of the cached catalogue pages and the availability facet
+            transaction.on_commit(lambda: bump_version(PAGES_NAMESPACE))
+            transaction.on_commit(lambda: bump_version(facets.CACHE_NAMESPACE))
+    except _Rollback:
+        raise InsufficientStock(_shortages(requested)) from None
+
+
+class _Rollback(Exception):
+    pass
+
+
+def _shortages(requested):
+    # Products deleted since they were added to the cart count as empty
+    stock = {
+        product_id: (name, quantity)
+        for product_id, name, quantity in Product.objects.filter(pk__in=requested).values_list(
+            'pk', 'name', 'quantity'
+        )
+    }
+    shortages = []
+    for product_id, quantity in requested.items():
+        name, available = stock.get(product_id, ('', 0))
+        if available < quantity:
+            shortages.append(Shortage(product_id, name, quantity, available))
+    return shortages
@@ -1,3 +1,391 @@
-from django.test import TestCase
+import io
+import json
+from datetime import timedelta
+from unittest import mock
+import os
+import tempfile
 
-# Create your tests here.
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from accounts.models import CustomUser, OutboundEmail
+from products import facets
+from products.models import Product
+from utils.cache import PAGES_NAMESPACE, bump_version, get_version
+
+from .builder import CartClosed, place_order
+from .cart import CartLineError, apply_line_changes
+from .config import CACHE_NAMESPACE as CONFIG_NAMESPACE, _process_cache, get_shop_config
+from . import notifications
+from .models import Cart, CartDetail, DeliveryFee, DeliveryZone, Order, OrderStatusEvent
+from .status import bulk_set_status
+from .stock import InsufficientStock, reserve_stock
+
+
+ADDRESS = {
+    'customer_name': 'أحمد',
+    'customer_phone': '01000000000',
+    'governorate': 'القاهرة',
+    'address_line': 'شارع التحرير',
+}
+
+
+def make_product(name, quantity, price=100.0):
+    return Product.objects.create(
+        name=name, price=price, quantity=quantity, image='product/placeholder.jpg', subtitle='', description=''
+    )
+
+
+def make_cart(user, *lines):
+    """
+    Open cart of ``user`` holding ``(product, quantity)`` lines priced at the current price.
+    """
+    cart = Cart.objects.create(user=user, status='Inprogress')
+    for product, quantity in lines:
+        CartDetail.objects.create(cart=cart, product=product, quantity=quantity, total=product.price * quantity)
+    cart.refresh_from_db()
+    return cart
+
+
+class CartSummaryTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user('buyer@example.com', 'secret')
+        self.client.force_login(self.user)
+        self.drill = make_product('Drill', quantity=5)
+
+    def test_pages_read_the_summary_from_the_session(self):
+        make_cart(self.user, (self.drill, 2))
+        self.assertContains(self.client.get('/'), '<span id="cart-count">1</span>', html=True)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/')
+        self.assertContains(response, '<span id="cart-count">1</span>', html=True)
+        self.assertFalse([query for query in queries if 'orders_cart' in query['sql']])
+
+    def test_cart_requests_rewrite_the_summary(self):
+        self.client.get('/')
+        self.client.post('/orders/add-to-cart', {'product_id': self.drill.pk, 'quantity': 2})
+
+        self.assertContains(self.client.get('/'), '<span id="cart-count">1</span>', html=True)
+
+
+class CartTotalsTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user('buyer@example.com', 'secret')
+        self.drill = make_product('Drill', quantity=5, price=100.0)
+        self.saw = make_product('Saw', quantity=5, price=40.0)
+
+    def test_line_saves_and_deletes_shift_the_totals(self):
+        cart = make_cart(self.user, (self.drill, 2), (self.saw, 1))
+        self.assertEqual((cart.item_count, cart.subtotal), (2, 240.0))
+
+        line = cart.cart_detail.get(product=self.saw)
+        line.quantity, line.total = 3, 120.0
+        line.save()
+        cart.cart_detail.get(product=self.drill).delete()
+        cart.refresh_from_db()
+        self.assertEqual((cart.item_count, cart.subtotal), (1, 120.0))
+
+    def test_price_edits_reprice_open_carts(self):
+        cart = make_cart(self.user, (self.drill, 2))
+        self.drill.price = 90.0
+        with self.captureOnCommitCallbacks(execute=True):
+            self.drill.save()
+
+        cart.refresh_from_db()
+        self.assertEqual(cart.subtotal, 180.0)
+        self.assertEqual(cart.cart_detail.get().total, 180.0)
+
+    def test_checkout_prices_the_lines_at_the_current_price(self):
+        cart = make_cart(self.user, (self.drill, 2))
+        # A queryset write skips CartDetail.save() and leaves the stored totals behind
+        CartDetail.objects.filter(cart=cart).update(total=1.0)
+        Product.objects.filter(pk=self.drill.pk).update(price=110.0)
+
+        order = place_order(cart, self.user, ADDRESS)
+        self.assertEqual(order.subtotal, 220.0)
+        self.assertEqual(order.order_detail.get().total, 220.0)
+
+
+class CartLineTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user('buyer@example.com', 'secret')
+        self.client.force_login(self.user)
+        self.drill = make_product('Drill', quantity=5)
+        self.saw = make_product('Saw', quantity=5, price=40.0)
+        self.cart = make_cart(self.user, (self.drill, 4), (self.saw, 1))
+        self.drill_line = self.cart.cart_detail.get(product=self.drill)
+        self.saw_line = self.cart.cart_detail.get(product=self.saw)
+
+    def test_batch_is_all_or_nothing(self):
+        with self.assertRaises(CartLineError) as raised:
+            apply_line_changes(self.cart, [{'id': self.saw_line.pk, 'delta': 1}, {'id': self.drill_line.pk, 'quantity': 6}])
+
+        self.assertEqual((raised.exception.item_id, raised.exception.available), (self.drill_line.pk, 5))
+        self.saw_line.refresh_from_db()
+        self.assertEqual(self.saw_line.quantity, 1)
+
+    def test_lines_above_the_stock_can_still_be_lowered(self):
+        Product.objects.filter(pk=self.drill.pk).update(quantity=2)
+
+        lines, removed = apply_line_changes(
+            self.cart, [{'id': self.drill_line.pk, 'delta': -1}, {'id': self.saw_line.pk, 'delete': True}]
+        )
+        self.assertEqual((lines, removed), ({self.drill_line.pk: (3, 300.0)}, [self.saw_line.pk]))
+        self.assertEqual((self.cart.item_count, self.cart.subtotal), (1, 300.0))
+        with self.assertRaises(CartLineError):
+            apply_line_changes(self.cart, [{'id': self.drill_line.pk, 'delta': 1}])
+
+    def test_api_changes_a_line(self):
+        response = self.client.patch(
+            f'/orders/cart/items/{self.saw_line.pk}', json.dumps({'quantity': 3}), content_type='application/json'
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.saw_line.refresh_from_db()
+        self.assertEqual((self.saw_line.quantity, self.saw_line.total), (3, 120.0))
+
+    def test_legacy_endpoint_does_not_change_the_cart_over_get(self):
+        url = f'/orders/checkout/update/{self.saw_line.pk}/'
+        self.assertEqual(self.client.get(url, {'action': 'delete'}).status_code, 405)
+        self.assertTrue(CartDetail.objects.filter(pk=self.saw_line.pk).exists())
+
+        self.assertTrue(self.client.post(url, {'action': 'increase'}).json()['success'])
+        self.saw_line.refresh_from_db()
+        self.assertEqual(self.saw_line.quantity, 2)
+
+
+class ShopConfigTests(TestCase):
+    def setUp(self):
+        _process_cache.update(version=None, config=None, expires=0)
+        self.addCleanup(_process_cache.update, version=None, config=None, expires=0)
+        DeliveryFee.objects.create(fee=50)
+
+    def test_warm_reads_skip_the_cache_and_the_database(self):
+        get_shop_config()
+
+        with self.assertNumQueries(0):
+            self.assertEqual(get_shop_config().delivery_fee, 50)
+
+    def test_changes_drop_the_snapshot(self):
+        self.assertEqual(get_shop_config().delivery_fee, 50)
+        with self.captureOnCommitCallbacks(execute=True):
+            DeliveryFee.objects.create(fee=70)
+
+        self.assertEqual(get_shop_config().delivery_fee, 70)
+
+    def test_other_workers_changes_show_up_after_the_memo_expires(self):
+        get_shop_config()
+        # Saved through another worker: only the shared version moves
+        DeliveryFee.objects.create(fee=70)
+        bump_version(CONFIG_NAMESPACE)
+        self.assertEqual(get_shop_config().delivery_fee, 50)
+
+        _process_cache['expires'] = 0
+        self.assertEqual(get_shop_config().delivery_fee, 70)
+
+
+class DeliveryZoneTests(TestCase):
+    def setUp(self):
+        _process_cache.update(version=None, config=None, expires=0)
+        self.addCleanup(_process_cache.update, version=None, config=None, expires=0)
+        DeliveryFee.objects.create(fee=50)
+        directory = tempfile.mkdtemp()
+        self.addCleanup(os.rmdir, directory)
+        self.path = os.path.join(directory, 'zones.csv')
+        self.addCleanup(os.remove, self.path)
+
+    def import_zones(self, text, *args):
+        with open(self.path, 'w', encoding='utf-8') as csv_file:
+            csv_file.write(text)
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('import_delivery_zones', self.path, *args, stdout=io.StringIO())
+
+    def test_city_then_governorate_then_global_fee(self):
+        self.import_zones(
+            'governorate,city,fee,free_shipping_threshold,tiers\n'
+            'الإسكندرية,,40,,\n'
+            'الإسكندرية,العجمي,60,1000,3:30|6:0\n'
+        )
+        config = get_shop_config()
+
+        self.assertEqual(config.delivery_fee_for('الاسكندرية ', 'سموحة'), 40)
+        self.assertEqual(config.delivery_fee_for('الإسكندرية', 'العجمي', units=2), 60)
+        self.assertEqual(config.delivery_fee_for('الإسكندرية', 'العجمي', units=4), 30)
+        self.assertEqual(config.delivery_fee_for('الإسكندرية', 'العجمي', units=6), 0)
+        self.assertEqual(config.delivery_fee_for('الإسكندرية', 'العجمي', units=1, subtotal=1000), 0)
+        self.assertEqual(config.delivery_fee_for('أسوان'), 50)
+
+    def test_reimport_replaces_tiers_and_drops_missing_zones(self):
+        self.import_zones('governorate,city,fee,free_shipping_threshold,tiers\nالجيزة,,40,,3:30\nأسوان,,90,,\n')
+        self.import_zones('governorate,city,fee,free_shipping_threshold,tiers\nالجيزة,,45,,\n', '--replace')
+
+        self.assertEqual(list(DeliveryZone.objects.values_list('governorate', flat=True)), ['الجيزة'])
+        config = get_shop_config()
+        self.assertEqual(config.delivery_fee_for('الجيزة', units=5), 45)
+        self.assertEqual(config.delivery_fee_for('أسوان'), 50)
+
+    def test_bad_rows_abort_the_import(self):
+        with self.assertRaises(CommandError):
+            self.import_zones('governorate,city,fee,free_shipping_threshold,tiers\nالجيزة,,40,,3-30\n')
+        self.assertFalse(DeliveryZone.objects.exists())
+
+
+class ReserveStockTests(TestCase):
+    def setUp(self):
+        self.drill = make_product('Drill', quantity=2)
+        self.saw = make_product('Saw', quantity=5)
+
+    def test_shortage_reserves_nothing(self):
+        with self.assertRaises(InsufficientStock) as raised:
+            reserve_stock([(self.drill.pk, 3), (self.saw.pk, 1)])
+
+        self.assertEqual(
+            [(s.product_id, s.requested, s.available) for s in raised.exception.shortages],
+            [(self.drill.pk, 3, 2)],
+        )
+        self.saw.refresh_from_db()
+        self.assertEqual(self.saw.quantity, 5)
+
+    def test_lines_of_the_same_product_add_up(self):
+        with self.assertRaises(InsufficientStock) as raised:
+            reserve_stock([(self.saw.pk, 3), (self.saw.pk, 3)])
+        self.assertEqual(raised.exception.shortages[0].requested, 6)
+
+        reserve_stock([(self.saw.pk, 2), (self.saw.pk, 3), (self.drill.pk, 2)])
+        self.saw.refresh_from_db()
+        self.drill.refresh_from_db()
+        self.assertEqual((self.saw.quantity, self.drill.quantity), (0, 0))
+
+    def test_sale_refreshes_pages_and_availability_facets(self):
+        versions = get_version(PAGES_NAMESPACE), get_version(facets.CACHE_NAMESPACE)
+        with self.captureOnCommitCallbacks(execute=True):
+            reserve_stock([(self.drill.pk, 2)])
+
+        self.assertNotEqual(get_version(PAGES_NAMESPACE), versions[0])
+        self.assertNotEqual(get_version(facets.CACHE_NAMESPACE), versions[1])
+
+
+class PlaceOrderTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user('buyer@example.com', 'secret')
+        self.drill = make_product('Drill', quantity=5)
+        self.saw = make_product('Saw', quantity=5, price=40.0)
+        self.cart = make_cart(self.user, (self.drill, 2), (self.saw, 1))
+
+    def test_writes_every_line_in_one_insert(self):
+        with CaptureQueriesContext(connection) as queries:
+            order = place_order(self.cart, self.user, ADDRESS, delivery_fee=50)
+
+        inserts = [query for query in queries if query['sql'].startswith('INSERT INTO "orders_orderdetail"')]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(order.order_detail.count(), 2)
+        self.assertEqual((order.subtotal, order.total), (240.0, 290.0))
+        self.assertEqual(Cart.objects.get(pk=self.cart.pk).status, 'Completed')
+
+    def test_double_submit_places_one_order(self):
+        # Both requests loaded the open cart before either placed the order
+        second = Cart.objects.get(pk=self.cart.pk)
+        order = place_order(self.cart, self.user, ADDRESS)
+
+        with self.assertRaises(CartClosed):
+            place_order(second, self.user, ADDRESS)
+        self.assertEqual(list(Order.objects.values_list('pk', flat=True)), [order.pk])
+        self.drill.refresh_from_db()
+        self.assertEqual(self.drill.quantity, 3)
+
+    def test_shortage_leaves_the_cart_open(self):
+        Product.objects.filter(pk=self.drill.pk).update(quantity=1)
+
+        with self.assertRaises(InsufficientStock):
+            place_order(self.cart, self.user, ADDRESS)
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(Cart.objects.get(pk=self.cart.pk).status, 'Inprogress')
+
+    def test_resubmitting_the_form_places_one_order(self):
+        self.client.force_login(self.user)
+        data = {'customer_name': 'أحمد', 'customer_phone': '01000000000', 'governorate': 'القاهرة', 'address': 'x'}
+        first = self.client.post('/orders/create-order/', data)
+        self.client.post('/orders/create-order/', data)
+
+        order = Order.objects.get()
+        self.assertRedirects(first, f'/orders/success/{order.code}/', fetch_redirect_response=False)
+
+
+@override_settings(ORDER_WEBHOOK_URL='https://hooks.example.com/orders')
+class StatusNotificationTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user('buyer@example.com', 'secret')
+        self.first = place_order(make_cart(self.user, (make_product('Drill', quantity=5), 1)), self.user, ADDRESS)
+        self.second = place_order(make_cart(self.user, (make_product('Saw', quantity=5), 1)), self.user, ADDRESS)
+        for order, statuses in ((self.first, ('Processed', 'Shipped')), (self.second, ('Processed', 'Received'))):
+            for status in statuses:
+                order.status = status
+                order.save()
+        OrderStatusEvent.objects.update(created_at=timezone.now() - timedelta(minutes=10))
+
+    def test_one_email_per_customer_with_the_transitions_folded(self):
+        self.assertEqual(notifications.notify_customers(), (4, 1))
+        body = OutboundEmail.objects.get(recipient='buyer@example.com').body
+        self.assertIn(self.first.code, body)
+        # Changed back to where it started: nothing to tell
+        self.assertNotIn(self.second.code, body)
+        self.assertEqual(notifications.notify_customers(), (0, 0))
+
+    def test_webhook_posts_outside_any_transaction(self):
+        depth = len(connection.atomic_blocks)
+        calls = []
+
+        def post(payload, url):
+            calls.append((payload, len(connection.atomic_blocks)))
+            return 200
+
+        with mock.patch.object(notifications, 'post_webhook', post):
+            self.assertEqual(notifications.notify_webhook(), 4)
+            self.assertEqual(notifications.notify_webhook(), 0)
+
+        self.assertEqual(calls, [({'events': [{'order': self.first.code, 'from_status': 'Received', 'to_status': 'Shipped'}]}, depth)])
+        self.assertFalse(OrderStatusEvent.objects.filter(webhook_sent_at__isnull=True).exists())
+
+    def test_failed_posts_are_released_and_claims_respected(self):
+        with mock.patch.object(notifications, 'post_webhook', side_effect=OSError('timeout')):
+            with self.assertLogs('orders.notifications', 'ERROR'):
+                self.assertEqual(notifications.notify_webhook(), 0)
+        self.assertFalse(OrderStatusEvent.objects.exclude(webhook_claimed_by='').exists())
+
+        # Held by another worker, then abandoned by it
+        OrderStatusEvent.objects.update(webhook_claimed_by='other', webhook_claimed_at=timezone.now())
+        with mock.patch.object(notifications, 'post_webhook', return_value=200) as post:
+            self.assertEqual(notifications.notify_webhook(), 0)
+            OrderStatusEvent.objects.update(webhook_claimed_at=timezone.now() - notifications.CLAIM_TIMEOUT * 2)
+            self.assertEqual(notifications.notify_webhook(), 4)
+        self.assertEqual(post.call_count, 1)
+
+
+class BulkStatusTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user('buyer@example.com', 'secret')
+        drill = make_product('Drill', quantity=10)
+        self.orders = [place_order(make_cart(self.user, (drill, 1)), self.user, ADDRESS) for _ in range(3)]
+        Order.objects.filter(pk=self.orders[0].pk).update(status='Shipped')
+
+    def test_changes_every_order_in_one_update(self):
+        ids = [order.pk for order in self.orders]
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(bulk_set_status(ids + [0], 'Shipped'), 2)
+
+        updates = [query for query in queries if query['sql'].startswith('UPDATE "orders_order"')]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(set(Order.objects.values_list('status', flat=True)), {'Shipped'})
+        self.assertEqual(
+            sorted(OrderStatusEvent.objects.values_list('order_id', 'from_status', 'to_status')),
+            [(order.pk, 'Received', 'Shipped') for order in self.orders[1:]],
+        )
+
+    def test_unknown_status_is_refused(self):
+        with self.assertRaises(ValueError):
+            bulk_set_status([self.orders[1].pk], 'Lost')
+        self.assertEqual(Order.objects.get(pk=self.orders[1].pk).status, 'Received')
@@ -1,13 +1,16 @@
 from django.urls import path
-from .views import checkout, add_to_cart, create_order, order_success, my_orders, order_detail_view
+from .views import checkout, checkout_update, add_to_cart, create_order, order_success, my_orders, order_detail_view, cart_item, cart_items_batch, delivery_quote
 
 
 app_name = 'orders'
 urlpatterns = [
     path('', my_orders, name='my_orders'),
     path('checkout/', checkout, name='checkout'),
-    path('checkout/update/<int:item_id>/', checkout, name='checkout-update'),
+    path('checkout/update/<int:item_id>/', checkout_update, name='checkout-update'),
+    path('checkout/delivery-fee/', delivery_quote, name='delivery-quote'),
     path('add-to-cart', add_to_cart, name='add-to-cart'),
+    path('cart/items/batch/', cart_items_batch, name='cart-items-batch'),
+    path('cart/items/<int:item_id>', cart_item, name='cart-item'),
     path('create-order/', create_order, name='create-order'),
     path('success/<str:order_code>/', order_success, name='order_success'),
     path('detail/<str:order_code>/', order_detail_view, name='order-detail'),
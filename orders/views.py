@@ -2,76 +2,51 @@ from django.shortcuts import render, get_object_or_404, redirect
 from django.urls import reverse
 from django.contrib import messages
 import datetime
+import json
 
 from django.http import JsonResponse
 from django.template.loader import render_to_string
 
 from .models import Order, OrderDetail, Cart, CartDetail, Coupon
 from products.models import Product
-from .models import DeliveryFee
+from products.copurchase import bought_together
+from .config import get_shop_config
 from django.contrib.auth.decorators import login_required
 from accounts.models import CustomUser
+from .cart import CartLineError, apply_line_changes, set_cart_summary
+
+
+def _delivery_fee(request, cart):
+    """
+    Shipping for ``cart`` to the governorate/city sent in the query string, if any.
+    """
+    return get_shop_config().delivery_fee_for(
+        request.GET.get('governorate', ''),
+        request.GET.get('city', ''),
+        units=cart.unit_count(),
+        subtotal=cart.subtotal,
+    )
 
 
 @login_required
-def checkout(request, item_id=None):
+def checkout(request):
     try:
         cart = Cart.objects.get(user=request.user, status='Inprogress')
     except Cart.DoesNotExist:
         # If cart doesn't exist, redirect to products
         messages.warning(request, '⚠️ السلة فارغة.')
-        return redirect('product_list')
-    
-    deliveryFee = DeliveryFee.objects.last()
-    delivery_fee = deliveryFee.fee if deliveryFee else 0
-
-
-    # ----------- تحديث السلة لو الطلب AJAX ويحتوي على action ----------
-    action = request.GET.get('action')
-
-    if request.method == 'GET' and action:
-        if item_id:
-            try:
-                cart_detail_item = CartDetail.objects.get(id=item_id, cart=cart)
-                
-                if action == 'increase':
-                    cart_detail_item.quantity += 1
-                    cart_detail_item.total = round(cart_detail_item.product.price * cart_detail_item.quantity, 2)
-                    cart_detail_item.save()
-                elif action == 'decrease' and cart_detail_item.quantity > 1:
-                    cart_detail_item.quantity -= 1
-                    cart_detail_item.total = round(cart_detail_item.product.price * cart_detail_item.quantity, 2)
-                    cart_detail_item.save()
-                elif action == 'delete':
-                    cart_detail_item.delete()
-                    
-            except CartDetail.DoesNotExist:
-                return JsonResponse({'success': False, 'message': 'العنصر غير موجود'})
-
-        # حساب الإجمالي بعد التحديث
-        cart_detail = CartDetail.objects.filter(cart=cart)
-        subtotal = sum([item.product.price * item.quantity for item in cart_detail])
-        total = subtotal + delivery_fee
-
-        # إرجاع JSON مع البيانات المحدثة
-        response_data = {
-            'success': True,
-            'quantity': cart_detail_item.quantity if action != 'delete' else 0,
-            'item_total': round(cart_detail_item.total, 2) if action != 'delete' else 0,
-            'sub_total': round(subtotal, 2),
-            'deliveryFee': delivery_fee,
-            'total': f"{round(total, 2)} جنيه",
-        }
-        
-        return JsonResponse(response_data)
+        return redirect('products:product_list')
 
     # ----------- عرض صفحة Checkout العادية ----------
-    cart_detail = CartDetail.objects.filter(cart=cart)
-    subtotal = sum([item.product.price * item.quantity for item in cart_detail])
+    cart_detail = CartDetail.objects.filter(cart=cart).select_related('product')
+    subtotal = cart.cart_total
+    delivery_fee = _delivery_fee(request, cart)
     total = subtotal + delivery_fee
 
     context = {
         'cart_detail_data': cart_detail,
+        # "يُشترى معها غالبًا": إضافة بنقرة واحدة
+        'suggestions': bought_together([item.product_id for item in cart_detail if item.product_id]),
         'deliveryFee': delivery_fee,
         'subtotal': subtotal,
         'total': total,
@@ -141,9 +116,10 @@ def add_to_cart(request):
         cart_detail.total = round(product.price * cart_detail.quantity, 2)
         cart_detail.save()
 
-        cart_detail_list = CartDetail.objects.filter(cart=cart)
+        cart.refresh_from_db(fields=['item_count', 'subtotal'])
         total = cart.cart_total
-        cart_count = cart_detail_list.count()
+        cart_count = cart.item_count
+        set_cart_summary(request, cart_count, total)
 
         if already_exists:
             message = f"🔄 المنتج '{product.name}' موجود مسبقاً - تم تحديث الكمية"
@@ -161,8 +137,171 @@ def add_to_cart(request):
     return JsonResponse({'success': False, 'message': 'طريقة الطلب غير صحيحة'}, status=400)
 
 
+def _cart_changes_response(request, cart, lines, removed):
+    """
+    New line values and cart totals, taken from the cart row only.
+    """
+    set_cart_summary(request, cart.item_count, cart.subtotal)
+    delivery_fee = _delivery_fee(request, cart)
+    subtotal = round(cart.subtotal, 2)
+    return JsonResponse({
+        'success': True,
+        'items': [
+            {'id': item_id, 'quantity': quantity, 'item_total': total}
+            for item_id, (quantity, total) in lines.items()
+        ],
+        'removed': removed,
+        'item_count': cart.item_count,
+        'sub_total': subtotal,
+        'deliveryFee': delivery_fee,
+        'total': round(subtotal + delivery_fee, 2),
+    })
+
+
+def _cart_changes_error(error):
+    return JsonResponse({
+        'success': False,
+        'message': str(error),
+        'item_id': error.item_id,
+        'available': error.available,
+    }, status=error.status)
+
+
+def _json_body(request):
+    try:
+        return json.loads(request.body or b'{}')
+    except ValueError:
+        raise CartLineError('طلب غير صالح') from None
+
+
+@login_required
+def checkout_update(request, item_id):
+    """
+    Old quantity endpoint (``action=increase|decrease|set|delete``), kept for
+    cached pages that still post to it.  POST only: a GET that changes the
+    cart could be fired by a crawler, a prefetch or another site.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'message': 'طريقة الطلب غير صحيحة'}, status=405)
+
+    action = request.POST.get('action') or request.GET.get('action')
+    change = {'id': item_id}
+    if action == 'increase':
+        change['delta'] = 1
+    elif action == 'decrease':
+        change['delta'] = -1
+    elif action == 'set':
+        change['quantity'] = request.POST.get('value', request.GET.get('value'))
+    elif action == 'delete':
+        change['delete'] = True
+    else:
+        return JsonResponse({'success': False, 'message': 'طلب غير صالح'}, status=400)
+
+    cart = Cart.objects.filter(user=request.user, status='Inprogress').first()
+    if cart is None:
+        return JsonResponse({'success': False, 'message': 'السلة غير موجودة'}, status=404)
+    try:
+        lines, removed = apply_line_changes(cart, [change])
+    except CartLineError as e:
+        return JsonResponse({'success': False, 'message': str(e)})
+    set_cart_summary(request, cart.item_count, cart.subtotal)
+
+    quantity, item_total = lines.get(item_id, (0, 0))
+    subtotal = cart.subtotal
+    delivery_fee = _delivery_fee(request, cart)
+    total = subtotal + delivery_fee
+
+    # إرجاع JSON مع البيانات المحدثة
+    return JsonResponse({
+        'success': True,
+        'quantity': quantity,
+        'item_total': item_total,
+        'sub_total': round(subtotal, 2),
+        'deliveryFee': delivery_fee,
+        'total': f"{round(total, 2)} جنيه",
+    })
+
+
+@login_required
+def cart_item(request, item_id):
+    """
+    JSON API for a single cart line.
+
+    POST   {"delta": 1}      add to the quantity (default 1)
+    PATCH  {"quantity": 3}   set the quantity, or {"delta": -1}
+    DELETE                   remove the line
+    """
+    if request.method not in ('POST', 'PATCH', 'DELETE'):
+        return JsonResponse({'success': False, 'message': 'طريقة الطلب غير صحيحة'}, status=405)
+
+    cart = Cart.objects.filter(user=request.user, status='Inprogress').first()
+    if cart is None:
+        return JsonResponse({'success': False, 'message': 'السلة غير موجودة'}, status=404)
+
+    try:
+        if request.method == 'DELETE':
+            change = {'delete': True}
+        else:
+            change = _json_body(request)
+            if not isinstance(change, dict):
+                raise CartLineError('طلب غير صالح')
+            if request.method == 'POST' and change.get('quantity') is None:
+                change.setdefault('delta', 1)
+        change['id'] = item_id
+        lines, removed = apply_line_changes(cart, [change])
+    except CartLineError as e:
+        return _cart_changes_error(e)
+
+    return _cart_changes_response(request, cart, lines, removed)
+
+
+@login_required
+def cart_items_batch(request):
+    """
+    Apply several line changes in one request:
+    {"changes": [{"id": 1, "quantity": 3}, {"id": 2, "delta": -1}, {"id": 3, "delete": true}]}
+    """
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'message': 'طريقة الطلب غير صحيحة'}, status=405)
+
+    cart = Cart.objects.filter(user=request.user, status='Inprogress').first()
+    if cart is None:
+        return JsonResponse({'success': False, 'message': 'السلة غير موجودة'}, status=404)
+
+    try:
+        body = _json_body(request)
+        changes = body.get('changes') if isinstance(body, dict) else None
+        if not isinstance(changes, list) or not all(isinstance(change, dict) for change in changes):
+            raise CartLineError('طلب غير صالح')
+        lines, removed = apply_line_changes(cart, changes)
+    except CartLineError as e:
+        return _cart_changes_error(e)
+
+    return _cart_changes_response(request, cart, lines, removed)
+
+
+@login_required
+def delivery_quote(request):
+    """
+    Delivery fee and total of the open cart for ?governorate=&city=.
+    """
+    cart = Cart.objects.filter(user=request.user, status='Inprogress').only('item_count', 'subtotal').first()
+    if cart is None:
+        return JsonResponse({'success': False, 'message': 'السلة غير موجودة'}, status=404)
+
+    delivery_fee = _delivery_fee(request, cart)
+    subtotal = round(cart.subtotal, 2)
+    return JsonResponse({
+        'success': True,
+        'sub_total': subtotal,
+        'deliveryFee': delivery_fee,
+        'total': round(subtotal + delivery_fee, 2),
+    })
+
+
 from django.contrib.auth.decorators import login_required
-from .models import OrderAddress
+from .builder import CartClosed, EmptyCart, place_order
+from .stock import InsufficientStock
 
 @login_required
 def create_order(request):
@@ -173,15 +312,9 @@ def create_order(request):
         # Get cart
         try:
             cart = Cart.objects.get(user=request.user, status='Inprogress')
-            cart_detail = CartDetail.objects.filter(cart=cart)
-            
-            if not cart_detail.exists():
-                messages.error(request, '❌ السلة فارغة.')
-                return redirect('checkout')
-            
         except Cart.DoesNotExist:
             messages.error(request, '❌ السلة غير موجودة.')
-            return redirect('checkout')
+            return redirect('orders:checkout')
         
         # Get form data
         customer_name = request.POST.get('customer_name')
@@ -197,65 +330,46 @@ def create_order(request):
             messages.error(request, '❌ يرجى ملء جميع الحقول المطلوبة.')
             return redirect('orders:checkout')
         
-        # التحقق من توفر الكمية لجميع المنتجات في السلة
-        for cart_item in cart_detail:
-            if cart_item.quantity > cart_item.product.quantity:
-                messages.error(
-                    request, 
-                    f'❌ عذراً، الكمية المتوفرة من "{cart_item.product.name}" هي {cart_item.product.quantity} فقط. '
-                    f'يرجى تعديل الكمية في السلة.'
-                )
-                return redirect('orders:checkout')
-        
         try:
-            # Create order address
-            order_address = OrderAddress.objects.create(
-                customer_name=customer_name,
-                customer_phone=customer_phone,
-                customer_email=customer_email,
-                governorate=governorate,
-                city=city,
-                address_line=address_line,
-                notes=notes
-            )
-            
-            # Get delivery fee
-            delivery_fee_obj = DeliveryFee.objects.last()
-            delivery_fee = delivery_fee_obj.fee if delivery_fee_obj else 0
-            
-            # Create order
-            order = Order.objects.create(
+            # إنشاء الطلب وحجز المخزون في transaction واحدة بعدد ثابت من الاستعلامات
+            order = place_order(
+                cart,
                 user=request.user if request.user.is_authenticated else None,
-                address=order_address,
-                status='Received',
-                delivery_fee=delivery_fee
+                address={
+                    'customer_name': customer_name,
+                    'customer_phone': customer_phone,
+                    'customer_email': customer_email,
+                    'governorate': governorate,
+                    'city': city,
+                    'address_line': address_line,
+                    'notes': notes,
+                },
+                delivery_fee=get_shop_config().delivery_fee_for(
+                    governorate, city, units=cart.unit_count(), subtotal=cart.subtotal
+                ),
             )
-            
-            # Create order details from cart
-            for cart_item in cart_detail:
-                OrderDetail.objects.create(
-                    order=order,
-                    product=cart_item.product,
-                    quantity=cart_item.quantity,
-                    price=cart_item.product.price,
-                    total=cart_item.total
-                )
-                
-                # إنقاص الكمية من المخزون
-                product = cart_item.product
-                product.quantity -= cart_item.quantity
-                product.save()
-            
-            # Calculate and save order total
-            order.calculate_total()
-            order.save()
-            
-            # Mark cart as completed
-            cart.status = 'Completed'
-            cart.save()
+            set_cart_summary(request, 0, 0)
             
             messages.success(request, f'✅ تم إنشاء الطلب بنجاح! رقم الطلب: {order.code}')
             return redirect('orders:order_success', order_code=order.code)
+        
+        except EmptyCart:
+            messages.error(request, '❌ السلة فارغة.')
+            return redirect('orders:checkout')
+        
+        except CartClosed:
+            # ضغطة مزدوجة: الطلب أُنشئ بالفعل من الطلب الأول
+            messages.warning(request, '⚠️ تم إنشاء الطلب بالفعل.')
+            return redirect('orders:my_orders')
+        
+        except InsufficientStock as e:
+            shortage = e.shortages[0]
+            messages.error(
+                request, 
+                f'❌ عذراً، الكمية المتوفرة من "{shortage.name}" هي {shortage.available} فقط. '
+                f'يرجى تعديل الكمية في السلة.'
+            )
+            return redirect('orders:checkout')
             
         except Exception as e:
             messages.error(request, f'❌ حدث خطأ أثناء إنشاء الطلب: {str(e)}')
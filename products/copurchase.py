@@ -0,0 +1,156 @@
+"""
+"Frequently bought together", mined from the order history.
+
+``mine_copurchases`` streams ``OrderDetail`` sorted by order, so one order
+is in memory at a time, and counts every pair of products in it in a
+sparse counter keyed by small integers rather than UUIDs.  When the counter
+reaches ``max_pairs`` it is written to a temporary file as a sorted run and
+cleared; the runs are then merged (``heapq.merge``), which adds up the
+counts of each pair in a single pass.  Pairs bought together in fewer than
+``min_support`` orders are dropped and every product keeps its ``top``
+best partners in ``CoPurchase``.  Memory stays bounded by ``max_pairs``
+plus ``top`` rows per product, whatever the number of order lines.
+
+Orders with more than ``MAX_BASKET`` distinct products (wholesale, stock
+transfers) are skipped: they say little about what goes together and their
+pairs grow with the square of the basket.
+
+``bought_together`` reads the table for the product page and the cart.
+"""
+import heapq
+import os
+import tempfile
+from collections import Counter, defaultdict
+from itertools import groupby
+from operator import itemgetter
+
+from django.db import transaction
+from django.db.models import Sum
+
+from orders.models import OrderDetail
+
+from .models import CoPurchase, Product
+
+
+MIN_SUPPORT = 2
+TOP = 20
+MAX_PAIRS = 1_000_000
+MAX_BASKET = 50
+CHUNK_SIZE = 5000
+
+
+def _spill(counter, directory):
+    """
+    Write ``counter`` as a sorted run, one ``first second count`` line per pair.
+    """
+    descriptor, path = tempfile.mkstemp(dir=directory, suffix='.run')
+    with os.fdopen(descriptor, 'w') as run:
+        for (first, second), count in sorted(counter.items()):
+            run.write(f'{first} {second} {count}\n')
+    counter.clear()
+    return path
+
+
+def _read_run(path):
+    with open(path) as run:
+        for line in run:
+            first, second, count = line.split()
+            yield int(first), int(second), int(count)
+
+
+def _count_pairs(rows, max_pairs, directory, positions):
+    """
+    Count the pairs of ``(order_id, product_id)`` rows sorted by order.
+
+    Returns the paths of the sorted runs; every run but the last holds
+    ``max_pairs`` pairs.
+    """
+    runs = []
+    counter = Counter()
+    for _order_id, lines in groupby(rows, key=itemgetter(0)):
+        basket = {positions.setdefault(product_id, len(positions)) for _order, product_id in lines}
+        if len(basket) < 2 or len(basket) > MAX_BASKET:
+            continue
+        basket = sorted(basket)
+        for index, first in enumerate(basket):
+            for second in basket[index + 1:]:
+                counter[first, second] += 1
+        if len(counter) >= max_pairs:
+            runs.append(_spill(counter, directory))
+    if counter:
+        runs.append(_spill(counter, directory))
+    return runs
+
+
+def _merge(runs):
+    """
+    ``(first, second, count)`` of every pair, counts of the runs added up.
+    """
+    merged = heapq.merge(*(_read_run(path) for path in runs))
+    for pair, parts in groupby(merged, key=itemgetter(0, 1)):
+        yield pair[0], pair[1], sum(count for _first, _second, count in parts)
+
+
+def mine_copurchases(min_support=MIN_SUPPORT, top=TOP, max_pairs=MAX_PAIRS, chunk_size=CHUNK_SIZE):
+    """
+    Rebuild ``CoPurchase`` from the order history; returns the number of rows written.
+    """
+    positions = {}
+    rows = (
+        OrderDetail.objects.filter(product__isnull=False)
+        .order_by('order_id')
+        .values_list('order_id', 'product_id')
+        .iterator(chunk_size=chunk_size)
+    )
+    # Min-heaps of (orders, -partner): the root is the weakest partner kept
+    best = defaultdict(list)
+    with tempfile.TemporaryDirectory(prefix='copurchase-') as directory:
+        runs = _count_pairs(rows, max_pairs, directory, positions)
+        for first, second, count in _merge(runs):
+            if count < min_support:
+                continue
+            for product, partner in ((first, second), (second, first)):
+                heap = best[product]
+                if len(heap) < top:
+                    heapq.heappush(heap, (count, -partner))
+                elif (count, -partner) > heap[0]:
+                    heapq.heapreplace(heap, (count, -partner))
+
+    ids = [None] * len(positions)
+    for product_id, position in positions.items():
+        ids[position] = product_id
+    # Products deleted since the order was placed
+    existing = set(Product.objects.values_list('pk', flat=True).iterator(chunk_size=chunk_size))
+
+    links = []
+    for position, heap in best.items():
+        if ids[position] not in existing:
+            continue
+        rank = 0
+        for count, partner in sorted(heap, reverse=True):
+            if ids[-partner] in existing:
+                rank += 1
+                links.append(CoPurchase(product_id=ids[position], other_id=ids[-partner], orders=count, rank=rank))
+    with transaction.atomic():
+        CoPurchase.objects.all().delete()
+        CoPurchase.objects.bulk_create(links, batch_size=chunk_size)
+    return len(links)
+
+
+def bought_together(product_ids, limit=4):
+    """
+    Active, in-stock products most often bought with ``product_ids``, best first.
+
+    Partners of several of the products add up; the products themselves are left out.
+    """
+    product_ids = list(product_ids)
+    partners = (
+        CoPurchase.objects.filter(product_id__in=product_ids, other__is_active=True, other__quantity__gt=0)
+        .exclude(other_id__in=product_ids)
+        .values('other_id')
+        .annotate(orders=Sum('orders'))
+        .order_by('-orders', 'other_id')[:limit]
+    )
+    ranked = [partner['other_id'] for partner in partners]
+    products = Product.objects.in_bulk(ranked)
+    return [products[pk] for pk in ranked if pk in products]
@@ -0,0 +1,131 @@
+"""
+Facet counts for the product list sidebar.
+
+All facets are computed from one grouped query over the filtered result
+set, except the categories when a category is selected: they are counted
+without that filter, so the other categories do not all show 0.  Facets are
+cached under the ``catalog`` namespace, whose version is bumped by
+products/signals.py whenever a product, category or tag changes.
+"""
+from django.core.cache import cache
+from django.db.models import BooleanField, Case, CharField, Count, Q, Value, When
+
+from utils.cache import make_key
+
+from .models import Category
+
+
+CACHE_NAMESPACE = 'catalog'
+CACHE_TIMEOUT = 60 * 60
+
+# key, label, lower bound (inclusive), upper bound (exclusive)
+PRICE_RANGES = (
+    ('0-1000', 'أقل من 1000 جنيه', None, 1000),
+    ('1000-5000', '1000 - 5000 جنيه', 1000, 5000),
+    ('5000-10000', '5000 - 10000 جنيه', 5000, 10000),
+    ('10000-plus', 'أكثر من 10000 جنيه', 10000, None),
+)
+
+FACET_PARAMS = ('search', 'category', 'brand', 'price_range', 'availability')
+
+
+def _price_q(low, high):
+    q = Q()
+    if low is not None:
+        q &= Q(price__gte=low)
+    if high is not None:
+        q &= Q(price__lt=high)
+    return q
+
+
+def price_range_key(price):
+    for key, _label, low, high in PRICE_RANGES:
+        if (low is None or price >= low) and (high is None or price < high):
+            return key
+    return None
+
+
+def filter_price_range(queryset, key):
+    for range_key, _label, low, high in PRICE_RANGES:
+        if range_key == key:
+            return queryset.filter(_price_q(low, high))
+    return queryset
+
+
+def get_categories():
+    """
+    All categories as (id, name) pairs, cached with the catalogue version.
+    """
+    key = make_key(CACHE_NAMESPACE, 'categories')
+    categories = cache.get(key)
+    if categories is None:
+        categories = list(Category.objects.values_list('id', 'name'))
+        cache.set(key, categories, CACHE_TIMEOUT)
+    return categories
+
+
+def compute_facets(queryset, category_queryset=None):
+    """
+    Per-category, per-brand, per-price-range and availability counts of ``queryset``.
+
+    ``category_queryset`` is ``queryset`` without its category filter, the
+    category counts come from it when given.
+    """
+    price_bucket = Case(
+        *[When(_price_q(low, high), then=Value(key)) for key, _label, low, high in PRICE_RANGES],
+        output_field=CharField(),
+    )
+    rows = (
+        queryset.order_by()
+        .annotate(
+            price_bucket=price_bucket,
+            in_stock=Case(When(quantity__gt=0, then=Value(True)), default=Value(False), output_field=BooleanField()),
+        )
+        .values('category_id', 'brand', 'price_bucket', 'in_stock')
+        .annotate(count=Count('pk'))
+    )
+
+    categories, brands, prices = {}, {}, {}
+    availability = {'in_stock': 0, 'out_of_stock': 0}
+    total = 0
+    for row in rows:
+        count = row['count']
+        total += count
+        categories[row['category_id']] = categories.get(row['category_id'], 0) + count
+        if row['brand']:
+            brands[row['brand']] = brands.get(row['brand'], 0) + count
+        prices[row['price_bucket']] = prices.get(row['price_bucket'], 0) + count
+        availability['in_stock' if row['in_stock'] else 'out_of_stock'] += count
+    if category_queryset is not None:
+        categories = {
+            row['category_id']: row['count']
+            for row in category_queryset.order_by().values('category_id').annotate(count=Count('pk'))
+        }
+
+    return {
+        'total': total,
+        'categories': [
+            {'id': category_id, 'name': name, 'count': categories.get(category_id, 0)}
+            for category_id, name in get_categories()
+        ],
+        'brands': [{'name': name, 'count': brands[name]} for name in sorted(brands)],
+        'price_ranges': [
+            {'key': key, 'label': label, 'count': prices.get(key, 0)}
+            for key, label, _low, _high in PRICE_RANGES
+        ],
+        'availability': availability,
+    }
+
+
+def get_facets(queryset, params, category_queryset=None):
+    """
+    Cached ``compute_facets`` keyed by the filter parameters that shaped ``queryset``.
+    """
+    key = make_key(CACHE_NAMESPACE, 'facets', *[params.get(name, '') for name in FACET_PARAMS])
+    facets = cache.get(key)
+    if facets is None:
+        if not params.get('category'):
+            category_queryset = None  # Same counts as the main query
+        facets = compute_facets(queryset, category_queryset)
+        cache.set(key, facets, CACHE_TIMEOUT)
+    return facets
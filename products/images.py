@@ -0,0 +1,208 @@
+"""
+Resized renditions of product pictures.
+
+Every uploaded picture gets the ``RENDITIONS`` below (longest side in
+pixels) in WebP and JPEG, stored next to the original as
+``<name>.<rendition>.<extension>``, e.g. ``product/drill.jpg.medium.webp``.
+The original extension is kept so ``drill.jpg`` and ``drill.png`` do not
+share renditions.
+EXIF orientation is applied to the pixels and the metadata (camera, GPS)
+is dropped.
+
+Renditions are written on upload by products/signals.py and for existing
+pictures by ``manage.py build_image_renditions``.  Templates reach them
+through the ``product_images`` tag library.
+
+Pictures without stored renditions are resized on demand instead
+(products.views.product_image) to one of ``ALLOWED_WIDTHS``.  The result is
+kept on disk under ``IMAGE_CACHE_ROOT`` keyed by the SHA-256 of the source
+bytes, so a picture uploaded under several names is resized once;
+``manage.py warm_image_cache`` fills that cache ahead of traffic.
+"""
+import hashlib
+import io
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+
+RENDITIONS = {
+    'thumb': 200,
+    'medium': 600,
+    'large': 1200,
+}
+# extension: (Pillow format, save options)
+FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+# Written last by generate_renditions(), its presence means the set is complete.
+_LAST = ('large', 'jpg')
+
+# On-demand widths; anything else would let clients fill the disk cache.
+ALLOWED_WIDTHS = (200, 400, 600, 800, 1200)
+# Only product pictures are served through the resizer.
+SOURCE_DIRS = ('product/', 'productimages/')
+CONTENT_TYPES = {
+    'webp': 'image/webp',
+    'jpg': 'image/jpeg',
+}
+DIGEST_TIMEOUT = 60 * 60 * 24 * 30
+
+
+def rendition_name(name, rendition, extension):
+    return f'{name}.{rendition}.{extension}'
+
+
+def has_renditions(name, storage=default_storage):
+    return bool(name) and storage.exists(rendition_name(name, *_LAST))
+
+
+def _flatten(image):
+    """
+    RGB copy of ``image``, transparent areas on white (JPEG has no alpha).
+    """
+    if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def encode(image, width, extension):
+    """
+    ``image`` scaled down to fit ``width`` x ``width``, encoded without metadata.
+    """
+    pillow_format, options = FORMATS[extension]
+    resized = image.copy()
+    resized.thumbnail((width, width), Image.Resampling.LANCZOS)
+    if extension == 'jpg' or resized.mode not in ('RGB', 'RGBA'):
+        resized = _flatten(resized)
+    output = io.BytesIO()
+    # No exif= / icc_profile= arguments: the copy carries no metadata
+    resized.save(output, pillow_format, **options)
+    return output.getvalue()
+
+
+def open_image(fileobj):
+    image = Image.open(fileobj)
+    image = ImageOps.exif_transpose(image)
+    image.load()
+    return image
+
+
+def generate_renditions(name, storage=default_storage, force=False):
+    """
+    Write the renditions of the stored picture ``name``; returns how many were written.
+
+    Pictures that already have their renditions are skipped unless
+    ``force``; a file Pillow cannot read is skipped as well.
+    """
+    if not name or (not force and has_renditions(name, storage)):
+        return 0
+    try:
+        with storage.open(name, 'rb') as fileobj:
+            image = open_image(fileobj)
+    except (OSError, UnidentifiedImageError, Image.DecompressionBombError):
+        return 0
+
+    written = 0
+    renditions = [
+        (rendition, extension)
+        for rendition in RENDITIONS
+        for extension in FORMATS
+        if (rendition, extension) != _LAST
+    ]
+    for rendition, extension in renditions + [_LAST]:
+        target = rendition_name(name, rendition, extension)
+        if storage.exists(target):
+            storage.delete(target)
+        storage.save(target, ContentFile(encode(image, RENDITIONS[rendition], extension)))
+        written += 1
+    return written
+
+
+# ---------- on-demand renditions ----------
+
+def source_digest(name, storage=default_storage):
+    """
+    SHA-256 of the stored picture ``name``, memoised per size and mtime.
+
+    Raises ``OSError`` when the picture does not exist.
+    """
+    stamp = f'{storage.size(name)}:{storage.get_modified_time(name).timestamp()}'
+    key = 'image-digest:' + hashlib.md5(f'{name}:{stamp}'.encode('utf-8')).hexdigest()
+    digest = cache.get(key)
+    if digest is None:
+        sha = hashlib.sha256()
+        with storage.open(name, 'rb') as fileobj:
+            for block in iter(lambda: fileobj.read(1024 * 1024), b''):
+                sha.update(block)
+        digest = sha.hexdigest()
+        cache.set(key, digest, DIGEST_TIMEOUT)
+    return digest
+
+
+def cache_path(digest, width, extension):
+    return os.path.join(settings.IMAGE_CACHE_ROOT, digest[:2], f'{digest}-{width}.{extension}')
+
+
+def _write_cache_file(path, data):
+    # Written to a temporary name and renamed, concurrent readers never see half an image
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    descriptor, temporary = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    with os.fdopen(descriptor, 'wb') as output:
+        output.write(data)
+    os.replace(temporary, path)
+
+
+def cached_rendition(name, digest, width, extension, storage=default_storage):
+    """
+    Path of the cached rendition of ``name``, resized and written on a miss.
+
+    Returns None when the source cannot be decoded.
+    """
+    path = cache_path(digest, width, extension)
+    if os.path.exists(path):
+        return path
+    try:
+        with storage.open(name, 'rb') as fileobj:
+            data = encode(open_image(fileobj), width, extension)
+    except (OSError, UnidentifiedImageError, Image.DecompressionBombError):
+        return None
+    _write_cache_file(path, data)
+    return path
+
+
+def warm_cache(name, widths=ALLOWED_WIDTHS, extensions=tuple(FORMATS)):
+    """
+    Fill the on-demand cache of ``name``; returns how many renditions were written.
+
+    The source is decoded once for every width and format.
+    """
+    try:
+        digest = source_digest(name)
+    except OSError:
+        return 0
+    missing = [
+        (width, extension)
+        for width in widths
+        for extension in extensions
+        if not os.path.exists(cache_path(digest, width, extension))
+    ]
+    if not missing:
+        return 0
+    try:
+        with default_storage.open(name, 'rb') as fileobj:
+            image = open_image(fileobj)
+    except (OSError, UnidentifiedImageError, Image.DecompressionBombError):
+        return 0
+    for width, extension in missing:
+        _write_cache_file(cache_path(digest, width, extension), encode(image, width, extension))
+    return len(missing)
@@ -0,0 +1,593 @@
+"""
+Bulk product import from supplier catalogues (CSV, XLSX or JSON Lines).
+
+Rows are read lazily and written in chunks.  Per chunk one query finds the
+SKUs that already exist, one ``bulk_create`` inserts the new products, one
+``bulk_update`` rewrites the known ones and a handful of statements attach
+their tags, so a 50k rows feed costs a few hundred queries.  Slugs are
+de-duplicated in memory against the slugs loaded once at the start.
+
+``post_save`` does not fire for bulk writes: every chunk sends
+``products_bulk_changed`` instead, which the search index, the catalogue
+cache and the dashboard counters listen to, and ``product_stock_changed``
+for the known products whose price or quantity moved, so open carts are
+repriced.  Related products are refreshed once, after the last chunk, for
+every product written.
+
+An upsert only writes the columns present in the row: a catalogue feed
+without a quantity column never writes back the stock it read before
+checkouts sold some of it.
+
+A row that fails validation is reported with its line number and skipped;
+it never aborts the import.
+"""
+import csv
+import io
+import json
+import math
+import os
+import urllib.request
+import uuid
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from urllib.parse import urlparse
+
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import DatabaseError, transaction
+from django.db.models.functions import Lower
+from django.utils import timezone
+from django.utils.text import slugify
+from taggit.models import Tag
+
+from . import related
+from .models import Category, Product, TaggedProduct
+from .signals import StockChange, product_stock_changed, products_bulk_changed
+
+
+FORMATS = ('csv', 'xlsx', 'jsonl')
+MODES = ('create', 'upsert')
+CHUNK_SIZE = 1000
+
+COLUMNS = (
+    'sku', 'name', 'category', 'brand', 'price', 'quantity', 'tags', 'image',
+    'subtitle', 'description', 'is_active', 'is_featured',
+)
+REQUIRED_FOR_CREATE = ('name', 'price', 'quantity', 'image')
+# Headers of the admin products export, so an exported file can be edited and re-imported.
+HEADER_ALIASES = {
+    'المعرف': 'id',
+    'الاسم': 'name',
+    'الفئة': 'category',
+    'العلامة التجارية': 'brand',
+    'السعر': 'price',
+    'الكمية': 'quantity',
+    'الوسوم': 'tags',
+    'الصورة': 'image',
+    'نشط': 'is_active',
+    'مميز': 'is_featured',
+}
+
+IMAGE_DIR = 'product'
+IMAGE_MAX_BYTES = 10 * 1024 * 1024
+IMAGE_TIMEOUT = 15
+IMAGE_WORKERS = 8
+
+_TRUE = {'1', 'true', 'yes', 'y', 'نعم'}
+_FALSE = {'0', 'false', 'no', 'n', 'لا', ''}
+
+
+RowError = namedtuple('RowError', 'line sku message')
+
+
+class ImportFormatError(Exception):
+    pass
+
+
+class _InvalidRow(Exception):
+    pass
+
+
+@dataclass
+class ImportResult:
+    created: int = 0
+    updated: int = 0
+    errors: list = field(default_factory=list)
+
+    @property
+    def processed(self):
+        return self.created + self.updated + len(self.errors)
+
+
+# ---------- readers ----------
+
+def detect_format(filename):
+    extension = os.path.splitext(filename)[1].lower().lstrip('.')
+    if extension in ('jsonl', 'ndjson'):
+        return 'jsonl'
+    if extension in FORMATS:
+        return extension
+    raise ImportFormatError(f'صيغة ملف غير مدعومة: {filename} (المدعوم: CSV / XLSX / JSONL)')
+
+
+def _column(name):
+    name = str(name or '').strip()
+    return HEADER_ALIASES.get(name, name.lower())
+
+
+def read_rows(fileobj, file_format):
+    """
+    Yield ``(line number, row dict)`` pairs from a binary file object.
+
+    The row is None for a line that could not be decoded at all.
+    """
+    if file_format == 'csv':
+        return _csv_rows(fileobj)
+    if file_format == 'jsonl':
+        return _jsonl_rows(fileobj)
+    if file_format == 'xlsx':
+        try:
+            from openpyxl import load_workbook
+        except ImportError:
+            raise ImportFormatError('قراءة ملفات Excel تتطلب تثبيت openpyxl، استخدم CSV أو JSONL') from None
+        return _xlsx_rows(load_workbook(fileobj, read_only=True, data_only=True))
+    raise ImportFormatError(f'صيغة ملف غير مدعومة: {file_format}')
+
+
+def _csv_rows(fileobj):
+    reader = csv.reader(io.TextIOWrapper(fileobj, encoding='utf-8-sig', newline=''))
+    header = [_column(name) for name in next(reader, [])]
+    for values in reader:
+        if any(value.strip() for value in values):
+            yield reader.line_num, {key: value for key, value in zip(header, values) if key}
+
+
+def _jsonl_rows(fileobj):
+    for line, raw in enumerate(io.TextIOWrapper(fileobj, encoding='utf-8-sig'), start=1):
+        if not raw.strip():
+            continue
+        try:
+            row = json.loads(raw)
+        except ValueError:
+            row = None
+        if not isinstance(row, dict):
+            yield line, None
+            continue
+        yield line, {_column(key): value for key, value in row.items()}
+
+
+def _xlsx_rows(workbook):
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = [_column(name) for name in next(rows, ())]
+        for line, values in enumerate(rows, start=2):
+            if any(value not in (None, '') for value in values):
+                yield line, {key: value for key, value in zip(header, values) if key}
+    finally:
+        workbook.close()
+
+
+def _chunks(rows, size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+# ---------- cell parsers ----------
+
+def _string(value, max_length=None):
+    value = '' if value is None else str(value).strip()
+    if max_length and len(value) > max_length:
+        raise _InvalidRow(f'القيمة أطول من {max_length} حرف')
+    return value
+
+
+def _number(value, cast, label):
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        number = value
+    else:
+        try:
+            number = float(_string(value).replace(',', ''))
+        except ValueError:
+            raise _InvalidRow(f'{label} غير صالح: {value}') from None
+    try:
+        finite = math.isfinite(number)
+    except OverflowError:  # int too large for a float
+        finite = False
+    # nan, inf and 1e400 parse as floats but cannot be stored or cast to int
+    if not finite:
+        raise _InvalidRow(f'{label} غير صالح: {value}')
+    if number < 0:
+        raise _InvalidRow(f'{label} لا يمكن أن يكون سالبًا')
+    if cast is int:
+        if number != int(number):
+            raise _InvalidRow(f'{label} يجب أن يكون عددًا صحيحًا')
+        return int(number)
+    return float(number)
+
+
+def _boolean(value):
+    if isinstance(value, bool):
+        return value
+    text = _string(value).lower()
+    if text in _TRUE:
+        return True
+    if text in _FALSE:
+        return False
+    raise _InvalidRow(f'قيمة منطقية غير صالحة: {value}')
+
+
+def _tags(value):
+    if isinstance(value, (list, tuple)):
+        names = value
+    else:
+        names = _string(value).replace('|', ',').split(',')
+    names = [_string(name, 100) for name in names]
+    return list(dict.fromkeys(name for name in names if name))
+
+
+def _is_url(value):
+    return urlparse(value).scheme in ('http', 'https')
+
+
+# ---------- importer ----------
+
+def import_products(rows, mode='create', chunk_size=CHUNK_SIZE, dry_run=False, create_categories=False,
+                    refresh_images=False, image_root=None, progress=None):
+    """
+    Import ``(line, row)`` pairs as produced by ``read_rows`` and return an ``ImportResult``.
+
+    ``mode='create'`` only adds products and reports known SKUs as errors;
+    ``mode='upsert'`` requires a SKU on every row and updates the products
+    that already have it, only touching the columns present in the row.
+    Image cells are paths in the media storage (or under ``image_root``) or
+    http(s) URLs; an existing product keeps its picture unless
+    ``refresh_images`` is set.  ``progress`` is called with the result after
+    every chunk.
+    """
+    if mode not in MODES:
+        raise ValueError(f'Unknown import mode: {mode}')
+    importer = _Importer(mode, dry_run, create_categories, refresh_images, image_root)
+    for chunk in _chunks(rows, chunk_size):
+        importer.import_chunk(chunk)
+        if progress:
+            progress(importer.result)
+    if importer.written:
+        related.refresh_related(importer.written)
+    return importer.result
+
+
+class _Importer:
+    def __init__(self, mode, dry_run, create_categories, refresh_images, image_root):
+        self.mode = mode
+        self.dry_run = dry_run
+        self.create_categories = create_categories
+        self.refresh_images = refresh_images
+        self.image_root = image_root
+        self.result = ImportResult()
+        self.written = []
+        self.seen_skus = set()
+        self.slugs = set(Product.objects.exclude(slug=None).values_list('slug', flat=True))
+        self.slug_counters = {}
+        self.copied_images = {}
+        self.categories = {}
+        for pk, name, slug in Category.objects.values_list('pk', 'name', 'slug'):
+            self.categories[name.strip().lower()] = pk
+            if slug:
+                self.categories.setdefault(slug, pk)
+
+    def error(self, line, sku, message):
+        self.result.errors.append(RowError(line, sku or '', message))
+
+    # ---------- per row ----------
+
+    def clean(self, row):
+        """
+        Parse the known columns of ``row`` into model values.
+        """
+        values = {}
+        for column in COLUMNS:
+            if column not in row:
+                continue
+            value = row[column]
+            if column in ('name', 'price', 'quantity') and value in (None, ''):
+                continue  # required columns keep their current value when left empty
+            if column in ('price', 'quantity'):
+                values[column] = _number(value, int if column == 'quantity' else float,
+                                         'السعر' if column == 'price' else 'الكمية')
+            elif column in ('is_active', 'is_featured'):
+                if value in (None, ''):
+                    continue
+                values[column] = _boolean(value)
+            elif column == 'tags':
+                values[column] = _tags(value)
+            elif column == 'category':
+                name = _string(value)
+                values['category_id'] = self.category_id(name) if name else None
+            else:
+                max_length = Product._meta.get_field(column).max_length if column != 'image' else None
+                values[column] = _string(value, max_length)
+        values['sku'] = values.get('sku') or None
+        return values
+
+    def category_id(self, name):
+        key = name.lower()
+        if key in self.categories:
+            return self.categories[key]
+        if not self.create_categories:
+            raise _InvalidRow(f'فئة غير موجودة: {name}')
+        if self.dry_run:
+            category_id = None
+        else:
+            category_id = Category.objects.create(
+                name=name, slug=self.unique_category_slug(name)
+            ).pk
+        self.categories[key] = category_id
+        return category_id
+
+    def unique_category_slug(self, name):
+        base = slugify(name) or slugify(name, allow_unicode=True) or 'category'
+        taken = set(Category.objects.filter(slug__startswith=base).values_list('slug', flat=True))
+        slug, number = base, 1
+        while slug in taken:
+            number += 1
+            slug = f'{base}-{number}'
+        return slug
+
+    def unique_slug(self, name, sku):
+        base = slugify(name) or slugify(sku or '') or 'product'
+        slug = base
+        number = self.slug_counters.get(base, 1)
+        while slug in self.slugs:
+            number += 1
+            slug = f'{base}-{number}'
+        self.slug_counters[base] = number
+        self.slugs.add(slug)
+        return slug
+
+    # ---------- images ----------
+
+    def _local_image(self, value):
+        """
+        Path of ``value`` under ``image_root``, None when it points outside it.
+        """
+        if not self.image_root:
+            return None
+        root = os.path.realpath(self.image_root)
+        local = os.path.realpath(os.path.join(root, value))
+        if os.path.commonpath([root, local]) != root:
+            return None
+        return local
+
+    def resolve_images(self, pending):
+        """
+        Turn the image cells of ``pending`` ``{line: value}`` into storage names.
+
+        Returns ``{line: name}`` and ``{line: error message}``; URLs are
+        downloaded in parallel.
+        """
+        names, errors, downloads = {}, {}, {}
+        for line, value in pending.items():
+            if _is_url(value):
+                downloads[line] = value
+                continue
+            path = value.lstrip('/')
+            try:
+                if default_storage.exists(path):
+                    names[line] = path
+                    continue
+            except SuspiciousFileOperation:
+                # ../ or an absolute path outside MEDIA_ROOT
+                errors[line] = f'مسار الصورة غير مسموح: {value}'
+                continue
+            local = self._local_image(value)
+            if local and os.path.isfile(local):
+                if self.dry_run:
+                    names[line] = value
+                    continue
+                # Suppliers reuse one placeholder picture for many rows, copy it once
+                if local not in self.copied_images:
+                    with open(local, 'rb') as image:
+                        self.copied_images[local] = default_storage.save(
+                            f'{IMAGE_DIR}/{os.path.basename(local)}', ContentFile(image.read())
+                        )
+                names[line] = self.copied_images[local]
+                continue
+            errors[line] = f'الصورة غير موجودة: {value}'
+
+        if downloads and self.dry_run:
+            names.update(downloads)
+        elif downloads:
+            with ThreadPoolExecutor(max_workers=IMAGE_WORKERS) as pool:
+                for line, (name, message) in zip(downloads, pool.map(_download_image, downloads.values())):
+                    if name:
+                        names[line] = name
+                    else:
+                        errors[line] = message
+        return names, errors
+
+    # ---------- per chunk ----------
+
+    def import_chunk(self, chunk):
+        parsed = []
+        for line, row in chunk:
+            if row is None:
+                self.error(line, '', 'سطر غير صالح')
+                continue
+            sku = _string(row.get('sku'))
+            try:
+                values = self.clean(row)
+            except _InvalidRow as exc:
+                self.error(line, sku, str(exc))
+                continue
+            if values['sku']:
+                if values['sku'] in self.seen_skus:
+                    self.error(line, sku, 'SKU مكرر في الملف')
+                    continue
+                self.seen_skus.add(values['sku'])
+            elif self.mode == 'upsert':
+                self.error(line, sku, 'SKU مطلوب في وضع التحديث')
+                continue
+            parsed.append((line, values))
+
+        skus = [values['sku'] for _line, values in parsed if values['sku']]
+        existing = {product.sku: product for product in Product.objects.filter(sku__in=skus)} if skus else {}
+
+        rows, pending_images = [], {}
+        for line, values in parsed:
+            product = existing.get(values['sku'])
+            if product is not None and self.mode == 'create':
+                self.error(line, values['sku'], 'SKU موجود بالفعل، استخدم وضع التحديث (upsert)')
+                continue
+            if product is None:
+                missing = [column for column in REQUIRED_FOR_CREATE if not values.get(column) and values.get(column) != 0]
+                if missing:
+                    self.error(line, values['sku'], 'أعمدة مطلوبة لمنتج جديد: ' + ', '.join(missing))
+                    continue
+            image = values.pop('image', '')
+            # A known product keeps its picture: nothing is downloaded or copied again
+            if image and (product is None or self.refresh_images or not product.image):
+                pending_images[line] = image
+            rows.append((line, values, product))
+
+        images, image_errors = self.resolve_images(pending_images)
+        to_create, to_update, tags, lines = [], [], {}, []
+        # Known products grouped by the columns their row carries
+        updates, stock_changes = {}, []
+        active_delta = 0
+        now = timezone.now()
+        for line, values, product in rows:
+            if line in image_errors:
+                self.error(line, values['sku'], image_errors[line])
+                continue
+            row_tags = values.pop('tags', None)
+            if product is None:
+                product = Product(**{'subtitle': '', 'description': '', **values})
+                product.slug = self.unique_slug(product.name, product.sku)
+                to_create.append(product)
+                active_delta += 1 if product.is_active else 0
+                if line in images:
+                    product.image = images[line]
+            else:
+                was_active, old_price, old_quantity = product.is_active, product.price, product.quantity
+                fields = set(values) - {'sku'}
+                if 'name' in values and values['name'] != product.name:
+                    product.slug = self.unique_slug(values['name'], product.sku)
+                    fields.add('slug')
+                for name, value in values.items():
+                    setattr(product, name, value)
+                if line in images:
+                    product.image = images[line]
+                    fields.add('image')
+                product.updated_at = now  # bulk_update skips auto_now
+                updates.setdefault(tuple(sorted(fields)) + ('updated_at',), []).append(product)
+                to_update.append(product)
+                active_delta += int(product.is_active) - int(was_active)
+                if (product.price, product.quantity) != (old_price, old_quantity):
+                    stock_changes.append(StockChange(
+                        line, product.pk, product.sku, product.name,
+                        old_price, product.price, old_quantity, product.quantity,
+                    ))
+            if row_tags is not None:
+                tags[product.pk] = row_tags
+            lines.append((line, product.sku))
+
+        if self.dry_run:
+            self.result.created += len(to_create)
+            self.result.updated += len(to_update)
+            return
+        if not lines:
+            return
+        try:
+            with transaction.atomic():
+                Product.objects.bulk_create(to_create)
+                for fields, products in updates.items():
+                    Product.objects.bulk_update(products, fields)
+                self.write_tags(tags, replace={product.pk for product in to_update})
+                products_bulk_changed.send(
+                    sender=Product,
+                    product_ids=[product.pk for product in to_create + to_update],
+                    active_delta=active_delta,
+                )
+                if stock_changes:
+                    product_stock_changed.send(sender=Product, changes=stock_changes)
+        except DatabaseError as exc:
+            for line, sku in lines:
+                self.error(line, sku, f'تعذر حفظ الدفعة: {exc}')
+            return
+        self.written.extend(product.pk for product in to_create + to_update)
+        self.result.created += len(to_create)
+        self.result.updated += len(to_update)
+
+    def write_tags(self, product_tags, replace):
+        """
+        Attach ``{product_id: [tag names]}``, replacing the tags of the ``replace`` products.
+        """
+        if replace:
+            TaggedProduct.objects.filter(content_object_id__in=[pk for pk in product_tags if pk in replace]).delete()
+        wanted = {}
+        for names in product_tags.values():
+            for name in names:
+                wanted.setdefault(name.lower(), name)
+        if not wanted:
+            return
+
+        # TAGGIT_CASE_INSENSITIVE: "Makita" and "makita" are the same tag
+        tag_ids = dict(
+            Tag.objects.annotate(lower_name=Lower('name'))
+            .filter(lower_name__in=list(wanted))
+            .values_list('lower_name', 'pk')
+        )
+        missing = {key: name for key, name in wanted.items() if key not in tag_ids}
+        if missing:
+            slugs = {key: Tag().slugify(name) for key, name in missing.items()}
+            taken = set(Tag.objects.filter(slug__in=list(slugs.values())).values_list('slug', flat=True))
+            fresh, clashing = [], []
+            for key, name in missing.items():
+                slug = slugs[key]
+                if slug and slug not in taken:
+                    taken.add(slug)
+                    fresh.append(Tag(name=name, slug=slug))
+                else:
+                    clashing.append(name)
+            Tag.objects.bulk_create(fresh)
+            tag_ids.update(
+                Tag.objects.annotate(lower_name=Lower('name'))
+                .filter(lower_name__in=[tag.name.lower() for tag in fresh])
+                .values_list('lower_name', 'pk')
+            )
+            # Tag.save() finds a free slug for the rare name whose slug is taken
+            for name in clashing:
+                tag_ids[name.lower()] = Tag.objects.create(name=name).pk
+
+        TaggedProduct.objects.bulk_create([
+            TaggedProduct(content_object_id=product_id, tag_id=tag_ids[name.lower()])
+            for product_id, names in product_tags.items()
+            for name in names
+        ])
+
+
+def _download_image(url):
+    """
+    Fetch ``url`` into the media storage; returns ``(name, None)`` or ``(None, error)``.
+    """
+    request = urllib.request.Request(url, headers={'User-Agent': 'alwesam-import/1.0'})
+    try:
+        with urllib.request.urlopen(request, timeout=IMAGE_TIMEOUT) as response:
+            if not response.headers.get_content_type().startswith('image/'):
+                return None, f'الرابط لا يشير إلى صورة: {url}'
+            data = response.read(IMAGE_MAX_BYTES + 1)
+    except (OSError, ValueError) as exc:
+        return None, f'تعذر تحميل الصورة {url}: {exc}'
+    if len(data) > IMAGE_MAX_BYTES:
+        return None, f'الصورة أكبر من المسموح: {url}'
+    extension = os.path.splitext(urlparse(url).path)[1].lower() or '.jpg'
+    name = default_storage.save(f'{IMAGE_DIR}/{uuid.uuid4().hex}{extension}', ContentFile(data))
+    return name, None
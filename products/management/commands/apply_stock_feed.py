@@ -0,0 +1,61 @@
+import csv
+
+from django.core.management.base import BaseCommand, CommandError
+
+from products.importers import CHUNK_SIZE, ImportFormatError, detect_format, read_rows
+from products.stock_feed import apply_stock_feed
+
+
+REPORT_HEADER = ['line', 'id', 'sku', 'name', 'old_price', 'new_price', 'old_quantity', 'new_quantity']
+
+
+class Command(BaseCommand):
+    help = 'تحديث أسعار ومخزون المنتجات من ملف المورد (sku أو id مع price و/أو quantity)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=('csv', 'xlsx', 'jsonl'), help='تحديد الصيغة بدلاً من امتداد الملف')
+        parser.add_argument('--dry-run', action='store_true', help='عرض الفروقات دون حفظ')
+        parser.add_argument('--report', help='حفظ الفروقات والأخطاء في ملف CSV')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        try:
+            file_format = options['format'] or detect_format(options['path'])
+            with open(options['path'], 'rb') as fileobj:
+                result = apply_stock_feed(
+                    read_rows(fileobj, file_format),
+                    dry_run=options['dry_run'],
+                    chunk_size=options['chunk_size'],
+                )
+        except OSError as exc:
+            raise CommandError(f'❌ تعذر قراءة الملف: {exc}')
+        except ImportFormatError as exc:
+            raise CommandError(f'❌ {exc}')
+
+        for change in result.changes[:20]:
+            self.stdout.write(
+                f'🔄 {change.sku or change.product_id} {change.name}: '
+                f'السعر {change.old_price} ← {change.new_price}، الكمية {change.old_quantity} ← {change.new_quantity}'
+            )
+        if len(result.changes) > 20:
+            self.stdout.write(f'... و {len(result.changes) - 20} تغيير آخر')
+        for error in result.errors[:20]:
+            self.stdout.write(self.style.WARNING(f'⚠️ سطر {error.line} {error.sku}: {error.message}'))
+
+        if options['report']:
+            with open(options['report'], 'w', newline='', encoding='utf-8-sig') as output:
+                writer = csv.writer(output)
+                writer.writerow(REPORT_HEADER + ['error'])
+                for change in result.changes:
+                    writer.writerow([
+                        change.line, change.product_id, change.sku, change.name,
+                        change.old_price, change.new_price, change.old_quantity, change.new_quantity, '',
+                    ])
+                for error in result.errors:
+                    writer.writerow([error.line, '', error.sku, '', '', '', '', '', error.message])
+
+        prefix = 'فحص فقط: ' if options['dry_run'] else ''
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ {prefix}{len(result.changes)} منتج تغيّر، {result.unchanged} بدون تغيير، {len(result.errors)} صف مرفوض'
+        ))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from products.images import generate_renditions
+from products.models import Product, ProductImages
+
+
+class Command(BaseCommand):
+    help = 'إنشاء النسخ المصغرة (WebP / JPEG) لصور المنتجات الحالية'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='إعادة إنشاء النسخ الموجودة')
+
+    def handle(self, *args, **options):
+        # Imported products often share one picture, each file is processed once
+        names = set(Product.objects.exclude(image='').values_list('image', flat=True).distinct())
+        names.update(ProductImages.objects.exclude(image='').values_list('image', flat=True).distinct())
+
+        processed = 0
+        for name in sorted(names):
+            if generate_renditions(name, force=options['force']):
+                processed += 1
+        self.stdout.write(self.style.SUCCESS(f'✅ تمت معالجة {processed} صورة من {len(names)}'))
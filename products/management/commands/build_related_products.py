@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from products.models import RelatedProduct
+from products.related import CHUNK_SIZE, build_related
+
+
+class Command(BaseCommand):
+    help = 'إعادة حساب المنتجات ذات الصلة لكل منتج (الوسوم، الفئة، العلامة التجارية والشراء المشترك)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        written = build_related(chunk_size=options['chunk_size'])
+        products = RelatedProduct.objects.values('product_id').distinct().count()
+        self.stdout.write(self.style.SUCCESS(f'✅ تم حفظ {written} علاقة لـ {products} منتج'))
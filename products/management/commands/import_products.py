@@ -0,0 +1,66 @@
+import csv
+
+from django.core.management.base import BaseCommand, CommandError
+
+from products.importers import (
+    CHUNK_SIZE, MODES, ImportFormatError, detect_format, import_products, read_rows,
+)
+
+
+class Command(BaseCommand):
+    help = 'استيراد المنتجات من ملف CSV أو XLSX أو JSONL على دفعات'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=('csv', 'xlsx', 'jsonl'), help='تحديد الصيغة بدلاً من امتداد الملف')
+        parser.add_argument('--mode', choices=MODES, default='create',
+                            help='create: إضافة فقط، upsert: تحديث المنتجات الموجودة حسب SKU')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+        parser.add_argument('--dry-run', action='store_true', help='فحص الملف دون حفظ أي شيء')
+        parser.add_argument('--create-categories', action='store_true', help='إنشاء الفئات غير الموجودة')
+        parser.add_argument('--refresh-images', action='store_true', help='إعادة تحميل صور المنتجات الموجودة')
+        parser.add_argument('--image-root', help='مجلد محلي لمسارات الصور النسبية')
+        parser.add_argument('--errors', help='حفظ الأخطاء في ملف CSV')
+
+    def handle(self, *args, **options):
+        try:
+            file_format = options['format'] or detect_format(options['path'])
+        except ImportFormatError as exc:
+            raise CommandError(f'❌ {exc}')
+
+        def progress(result):
+            self.stdout.write(
+                f'🔄 {result.processed} صف: {result.created} جديد، {result.updated} محدث، {len(result.errors)} خطأ'
+            )
+
+        try:
+            with open(options['path'], 'rb') as fileobj:
+                result = import_products(
+                    read_rows(fileobj, file_format),
+                    mode=options['mode'],
+                    chunk_size=options['chunk_size'],
+                    dry_run=options['dry_run'],
+                    create_categories=options['create_categories'],
+                    refresh_images=options['refresh_images'],
+                    image_root=options['image_root'],
+                    progress=progress,
+                )
+        except OSError as exc:
+            raise CommandError(f'❌ تعذر قراءة الملف: {exc}')
+        except ImportFormatError as exc:
+            raise CommandError(f'❌ {exc}')
+
+        for error in result.errors[:20]:
+            self.stdout.write(self.style.WARNING(f'⚠️ سطر {error.line} {error.sku}: {error.message}'))
+        if len(result.errors) > 20:
+            self.stdout.write(self.style.WARNING(f'⚠️ ... و {len(result.errors) - 20} خطأ آخر'))
+        if options['errors'] and result.errors:
+            with open(options['errors'], 'w', newline='', encoding='utf-8-sig') as output:
+                writer = csv.writer(output)
+                writer.writerow(['line', 'sku', 'error'])
+                writer.writerows(result.errors)
+
+        prefix = 'فحص فقط: ' if options['dry_run'] else ''
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ {prefix}{result.created} منتج جديد، {result.updated} منتج محدث، {len(result.errors)} صف مرفوض'
+        ))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from products.copurchase import MAX_PAIRS, MIN_SUPPORT, TOP, mine_copurchases
+
+
+class Command(BaseCommand):
+    help = 'استخراج المنتجات التي تُشترى معًا من سجل الطلبات (OrderDetail)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--min-support', type=int, default=MIN_SUPPORT, help='أقل عدد طلبات يجمع المنتجين')
+        parser.add_argument('--top', type=int, default=TOP, help='عدد المنتجات المحفوظة لكل منتج')
+        parser.add_argument('--max-pairs', type=int, default=MAX_PAIRS, help='عدد الأزواج في الذاكرة قبل الكتابة على القرص')
+
+    def handle(self, *args, **options):
+        written = mine_copurchases(
+            min_support=options['min_support'],
+            top=options['top'],
+            max_pairs=options['max_pairs'],
+        )
+        self.stdout.write(self.style.SUCCESS(f'✅ تم حفظ {written} زوج من المنتجات المشتراة معًا'))
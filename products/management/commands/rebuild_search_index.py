@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from products.models import ProductSearchIndex
+from products.search import index_products
+
+
+class Command(BaseCommand):
+    help = 'إعادة بناء فهرس البحث للمنتجات'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        # Orphans disappear through the FK cascade, so only stale documents remain to refresh.
+        indexed = index_products(batch_size=options['batch_size'])
+        total = ProductSearchIndex.objects.count()
+        self.stdout.write(self.style.SUCCESS(f'✅ تمت فهرسة {indexed} منتج (إجمالي الفهرس: {total})'))
@@ -0,0 +1,38 @@
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from products.images import ALLOWED_WIDTHS, has_renditions, warm_cache
+from products.models import Product, ProductImages
+
+
+class Command(BaseCommand):
+    help = 'تجهيز النسخ المصغرة لصور المنتجات مسبقاً في ذاكرة الصور المؤقتة'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=None, help='عدد العمليات (الافتراضي: عدد المعالجات)')
+        parser.add_argument('--widths', type=int, nargs='+', choices=ALLOWED_WIDTHS, default=list(ALLOWED_WIDTHS))
+        parser.add_argument('--all', action='store_true', help='تضمين الصور التي لها نسخ محفوظة بجوار الأصل')
+
+    def handle(self, *args, **options):
+        names = set(Product.objects.exclude(image='').values_list('image', flat=True).distinct())
+        names.update(ProductImages.objects.exclude(image='').values_list('image', flat=True).distinct())
+        if not options['all']:
+            # Pictures with stored renditions are served as media files, not by the resizer
+            names = {name for name in names if not has_renditions(name)}
+        names = sorted(names)
+
+        # Forked workers must not share the parent's database connections
+        connections.close_all()
+        written = 0
+        with ProcessPoolExecutor(max_workers=options['workers'], initializer=django.setup) as pool:
+            warm = partial(warm_cache, widths=options['widths'])
+            for index, count in enumerate(pool.map(warm, names, chunksize=16), start=1):
+                written += count
+                if index % 500 == 0:
+                    self.stdout.write(f'🔄 {index}/{len(names)} صورة')
+        self.stdout.write(self.style.SUCCESS(f'✅ تم إنشاء {written} نسخة لـ {len(names)} صورة'))
+
@@ -0,0 +1,130 @@
+# Generated by Django 5.2.8 on 2026-10-18 12:32
+
+import django.db.models.deletion
+import taggit.managers
+from django.db import migrations, models
+
+
+SQLITE_FTS = [
+    """
+    CREATE VIRTUAL TABLE products_search_fts USING fts5(
+        document,
+        content='products_productsearchindex',
+        content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER products_search_fts_ai AFTER INSERT ON products_productsearchindex BEGIN
+        INSERT INTO products_search_fts(rowid, document) VALUES (new.id, new.document);
+    END
+    """,
+    """
+    CREATE TRIGGER products_search_fts_ad AFTER DELETE ON products_productsearchindex BEGIN
+        INSERT INTO products_search_fts(products_search_fts, rowid, document)
+        VALUES ('delete', old.id, old.document);
+    END
+    """,
+    """
+    CREATE TRIGGER products_search_fts_au AFTER UPDATE ON products_productsearchindex BEGIN
+        INSERT INTO products_search_fts(products_search_fts, rowid, document)
+        VALUES ('delete', old.id, old.document);
+        INSERT INTO products_search_fts(rowid, document) VALUES (new.id, new.document);
+    END
+    """,
+]
+
+SQLITE_FTS_DROP = [
+    'DROP TRIGGER IF EXISTS products_search_fts_ai',
+    'DROP TRIGGER IF EXISTS products_search_fts_ad',
+    'DROP TRIGGER IF EXISTS products_search_fts_au',
+    'DROP TABLE IF EXISTS products_search_fts',
+]
+
+POSTGRES_GIN = [
+    "CREATE INDEX products_search_document_gin ON products_productsearchindex "
+    "USING GIN (to_tsvector('simple', document))",
+]
+
+POSTGRES_GIN_DROP = [
+    'DROP INDEX IF EXISTS products_search_document_gin',
+]
+
+
+def _run(schema_editor, statements):
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+def create_search_backend(apps, schema_editor):
+    # The SQLite triggers are lost if a later migration rebuilds the
+    # products_productsearchindex table; recreate them there if that happens.
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        _run(schema_editor, SQLITE_FTS)
+    elif vendor == 'postgresql':
+        _run(schema_editor, POSTGRES_GIN)
+
+
+def drop_search_backend(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        _run(schema_editor, SQLITE_FTS_DROP)
+    elif vendor == 'postgresql':
+        _run(schema_editor, POSTGRES_GIN_DROP)
+
+
+def populate_search_index(apps, schema_editor):
+    from products.search import tokenize
+
+    Product = apps.get_model('products', 'Product')
+    ProductSearchIndex = apps.get_model('products', 'ProductSearchIndex')
+    rows = []
+    for product in Product.objects.select_related('category').iterator():
+        parts = [
+            product.name,
+            product.subtitle,
+            product.brand,
+            product.category.name if product.category_id else '',
+            product.description,
+        ]
+        document = ' '.join(' '.join(tokenize(part)) for part in parts if part)
+        rows.append(ProductSearchIndex(product=product, document=document))
+    ProductSearchIndex.objects.bulk_create(rows, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0004_remove_product_sku_alter_product_id'),
+        ('taggit', '0006_rename_taggeditem_content_type_object_id_taggit_tagg_content_8fc721_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductSearchIndex',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('document', models.TextField(blank=True)),
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='search_index', to='products.product')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='TaggedProduct',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('content_object', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='products.product')),
+                ('tag', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='%(app_label)s_%(class)s_items', to='taggit.tag')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='tags',
+            field=taggit.managers.TaggableManager(help_text='A comma-separated list of tags.', through='products.TaggedProduct', to='taggit.Tag', verbose_name='Tags'),
+        ),
+        migrations.RunPython(create_search_backend, drop_search_backend),
+        migrations.RunPython(populate_search_index, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,8 @@
+import re
 import uuid
 from django.db import models
 from taggit.managers import TaggableManager
+from taggit.models import TaggedItemBase
 from accounts.models import CustomUser 
 from django.utils import timezone
 from django.utils.text import slugify
@@ -15,6 +17,7 @@ class Category(models.Model):
     description = models.TextField('الوصف', max_length=500, blank=True)
     icon = models.CharField('أيقونة', max_length=50, blank=True, help_text='Font Awesome icon class')
     created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True)
     
     def save(self, *args, **kwargs):
         if not self.slug:
@@ -30,8 +33,16 @@ class Category(models.Model):
         verbose_name_plural = 'Categories'
 
 
+class TaggedProduct(TaggedItemBase):
+    """
+    Tag through model with a real FK, taggit's default one expects integer ids.
+    """
+    content_object = models.ForeignKey('Product', on_delete=models.CASCADE)
+
+
 class Product(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    sku = models.CharField('SKU', max_length=64, unique=True, null=True, blank=True)  # Supplier reference, used by import_products
     name = models.CharField('name', max_length=120)
     category = models.ForeignKey(Category, verbose_name='الفئة', related_name='products', on_delete=models.SET_NULL, null=True, blank=True)
     price = models.FloatField('price')
@@ -39,16 +50,43 @@ class Product(models.Model):
     subtitle = models.TextField('subtitle', max_length=500)
     description = models.TextField('description', max_length=50000)
     created_at = models.DateTimeField(default=timezone.now)
+    # Keys the cached product cards and the Last-Modified of product pages;
+    # bulk_update / update() must set it themselves
+    updated_at = models.DateTimeField(auto_now=True)
     quantity = models.IntegerField('quantity')
-    tags = TaggableManager()
+    tags = TaggableManager(through=TaggedProduct)
     brand = models.CharField('العلامة التجارية', max_length=100, blank=True)  # Optional brand field
     is_featured = models.BooleanField('مميز', default=False)  # Featured products
     is_active = models.BooleanField('نشط', default=True)  # Active/inactive products
 
     slug = models.SlugField(blank=True, null=True, unique=True)
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Lets post_save handlers see whether the product was (de)activated
+        if 'is_active' in field_names:
+            instance._persisted_is_active = instance.is_active
+        # Lets orders/signals.py reprice the open carts when the price changes
+        if 'price' in field_names:
+            instance._persisted_price = instance.price
+        # Lets products/signals.py skip the related products refresh on a price or stock edit
+        if all(name in field_names for name in cls.RELATED_FIELDS):
+            instance._persisted_related = instance.related_state()
+        return instance
+
+    # The columns products/related.py scores on, besides the tags
+    RELATED_FIELDS = ('is_active', 'category_id', 'brand')
+
+    def related_state(self):
+        return tuple(getattr(self, name) for name in self.RELATED_FIELDS)
+
     def save(self, *args, **kwargs):
-        self.slug =slugify(self.name)
+        base = slugify(self.name)
+        # Keep the slugs given by the bulk importer: numbered for duplicate
+        # names (drill-2) or taken from the SKU when the name has no latin letters.
+        if not self.slug or (base and not re.fullmatch(rf'{re.escape(base)}(-\d+)?', self.slug)):
+            self.slug = base
         super(Product,self).save(*args, **kwargs)
     
     def __str__(self) :
@@ -60,6 +98,60 @@ class Product(models.Model):
         verbose_name_plural = 'Products'
 
 
+class ProductSearchIndex(models.Model):
+    """
+    Normalised search document for a product, see products/search.py.
+    """
+    product = models.OneToOneField(Product, related_name='search_index', on_delete=models.CASCADE)
+    document = models.TextField(blank=True)
+
+    def __str__(self):
+        return f'{self.product_id}'
+
+
+class RelatedProduct(models.Model):
+    """
+    Precomputed neighbours of a product for its detail page, best first.
+    Built by ``manage.py build_related_products`` and refreshed by
+    products/signals.py, see products/related.py.
+    """
+    product = models.ForeignKey(Product, related_name='related_links', on_delete=models.CASCADE)
+    related = models.ForeignKey(Product, related_name='+', on_delete=models.CASCADE)
+    score = models.FloatField()
+    rank = models.PositiveSmallIntegerField()
+
+    class Meta:
+        ordering = ['product', 'rank']
+        constraints = [
+            # Also the index behind the detail page lookup
+            models.UniqueConstraint(fields=['product', 'rank'], name='unique_related_rank'),
+        ]
+
+    def __str__(self):
+        return f'{self.product_id} -> {self.related_id} ({self.score:.2f})'
+
+
+class CoPurchase(models.Model):
+    """
+    Products most often bought in the same order as a product, best first.
+    Mined from ``OrderDetail`` by ``manage.py mine_copurchases``, see
+    products/copurchase.py.
+    """
+    product = models.ForeignKey(Product, related_name='copurchase_links', on_delete=models.CASCADE)
+    other = models.ForeignKey(Product, related_name='+', on_delete=models.CASCADE)
+    orders = models.PositiveIntegerField()
+    rank = models.PositiveSmallIntegerField()
+
+    class Meta:
+        ordering = ['product', 'rank']
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'rank'], name='unique_copurchase_rank'),
+        ]
+
+    def __str__(self):
+        return f'{self.product_id} + {self.other_id} ({self.orders})'
+
+
 class ProductImages(models.Model):
     product = models.ForeignKey(Product,verbose_name=('product'),related_name='product_image',on_delete=models.CASCADE)
     image = models.ImageField(('image'),upload_to='productimages')
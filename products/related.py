@@ -0,0 +1,236 @@
+"""
+Related products for the product detail page.
+
+Every active product gets its ``TOP_K`` best neighbours stored in
+``RelatedProduct``, so the page reads them with one indexed lookup.  A
+candidate is scored by:
+
+* the tags both products carry, each weighted by its inverse frequency so
+  a rare tag ("مثقاب-بطارية") says more than one on half the catalogue;
+* a shared category and a shared brand;
+* how often both were bought in the same order, as mined into
+  ``CoPurchase`` by products/copurchase.py.
+
+Candidates come from the shared tags and the co-purchases, topped up with
+products of the same category when that leaves fewer than ``TOP_K``.  Tags
+carried by more than ``MAX_TAG_PRODUCTS`` products are too common to tell
+anything and would make every product a candidate of every other one, so
+they are ignored.
+
+``build_related`` recomputes the whole table (``manage.py
+build_related_products``); ``refresh_related`` recomputes a few products
+when their tags, category, brand or activity change (not on price or stock
+edits), together with the products listing them and the ones that should
+list them now.  It only indexes their candidates, and an import refreshes
+all the products it wrote in one pass at the end.
+"""
+import heapq
+import math
+from collections import defaultdict
+
+from django.db import transaction
+
+from .models import CoPurchase, Product, RelatedProduct, TaggedProduct
+
+
+TOP_K = 8
+MAX_TAG_PRODUCTS = 2000
+CATEGORY_WEIGHT = 1.0
+BRAND_WEIGHT = 0.5
+COPURCHASE_WEIGHT = 2.0
+CATEGORY_FILL = 50
+CHUNK_SIZE = 1000
+# Above this many products to refresh the whole catalogue is indexed
+MAX_TARGETS = 5000
+
+
+class _Index:
+    """
+    The catalogue data needed to score ``targets`` (every product when None).
+
+    For a few targets only their candidates are loaded: the products
+    sharing one of their tags, their co-purchases and the category fill.
+    """
+
+    def __init__(self, targets=None):
+        if targets is not None and len(targets) > MAX_TARGETS:
+            targets = None  # Most of the catalogue anyway, one pass is cheaper
+        # Products are numbered and scored by position: hashing UUIDs is
+        # most of the cost of scoring a large catalogue.
+        self.ids = []
+        self.positions = {}
+        self.categories = []
+        self.brands = []
+        self.category_products = defaultdict(list)
+        active = Product.objects.filter(is_active=True)
+        tagged = TaggedProduct.objects.filter(content_object__is_active=True)
+        copurchases = _copurchase_counts(targets)
+
+        if targets is None:
+            self._load(active.order_by('pk').values_list('pk', 'category_id', 'brand').iterator(chunk_size=5000))
+            self.total = max(len(self.ids), 1)
+            for position, category_id in enumerate(self.categories):
+                if category_id is not None and len(self.category_products[category_id]) < CATEGORY_FILL:
+                    self.category_products[category_id].append(position)
+        else:
+            targets = list(targets)
+            self.total = max(active.count(), 1)
+            # Tags too common to score are not worth loading: at most one row past the limit is read
+            tag_rows = {}
+            for tag_id in set(TaggedProduct.objects.filter(content_object_id__in=targets).values_list('tag_id', flat=True)):
+                product_ids = list(
+                    tagged.filter(tag_id=tag_id).values_list('content_object_id', flat=True)[:MAX_TAG_PRODUCTS + 1]
+                )
+                if len(product_ids) <= MAX_TAG_PRODUCTS:
+                    tag_rows[tag_id] = product_ids
+            candidates = set(targets).union(*tag_rows.values())
+            for counts in copurchases.values():
+                candidates.update(counts)
+            fills = {}
+            for category_id in set(active.filter(pk__in=targets).exclude(category=None).values_list('category_id', flat=True)):
+                fills[category_id] = list(
+                    active.filter(category_id=category_id).order_by('pk').values_list('pk', flat=True)[:CATEGORY_FILL]
+                )
+                candidates.update(fills[category_id])
+            # Loaded in id order, like the full index, so ties rank the same
+            candidates = sorted(candidates)
+            for start in range(0, len(candidates), 5000):
+                self._load(
+                    active.filter(pk__in=candidates[start:start + 5000])
+                    .order_by('pk')
+                    .values_list('pk', 'category_id', 'brand')
+                )
+            for category_id, product_ids in fills.items():
+                self.category_products[category_id] = [self.positions[pk] for pk in product_ids]
+
+        self.tag_products = defaultdict(list)
+        if targets is None:
+            tag_rows = tagged.values_list('content_object_id', 'tag_id').iterator(chunk_size=5000)
+        else:
+            tag_rows = ((product_id, tag_id) for tag_id, product_ids in tag_rows.items() for product_id in product_ids)
+        for product_id, tag_id in tag_rows:
+            position = self.positions.get(product_id)
+            if position is not None:
+                self.tag_products[tag_id].append(position)
+        self.product_tags = defaultdict(list)
+        for tag_id, positions in self.tag_products.items():
+            if len(positions) <= MAX_TAG_PRODUCTS:
+                weight = math.log(1 + self.total / len(positions))
+                for position in positions:
+                    self.product_tags[position].append((tag_id, weight))
+
+        self.copurchases = defaultdict(dict)
+        for product_id, counts in copurchases.items():
+            position = self.positions.get(product_id)
+            if position is None:
+                continue
+            for other, count in counts.items():
+                if other in self.positions:
+                    self.copurchases[position][self.positions[other]] = count
+
+    def _load(self, rows):
+        for pk, category_id, brand in rows:
+            self.positions[pk] = len(self.ids)
+            self.ids.append(pk)
+            self.categories.append(category_id)
+            self.brands.append(brand.strip().lower())
+
+    def neighbours(self, product_id):
+        """
+        ``[(score, related_id)]`` of ``product_id``, best first, at most ``TOP_K``.
+        """
+        position = self.positions.get(product_id)
+        if position is None:
+            return []
+        category_id, brand = self.categories[position], self.brands[position]
+
+        scores = defaultdict(float)
+        for tag_id, weight in self.product_tags.get(position, ()):
+            for other in self.tag_products[tag_id]:
+                scores[other] += weight
+        for other, count in self.copurchases.get(position, {}).items():
+            scores[other] += COPURCHASE_WEIGHT * math.log1p(count)
+        if len(scores) <= TOP_K and category_id is not None:
+            for other in self.category_products[category_id]:
+                scores[other] += 0
+        scores.pop(position, None)
+
+        categories, brands = self.categories, self.brands
+        for other in scores:
+            if category_id is not None and categories[other] == category_id:
+                scores[other] += CATEGORY_WEIGHT
+            if brand and brands[other] == brand:
+                scores[other] += BRAND_WEIGHT
+        # Ties broken by position (i.e. by id) so rebuilds are stable
+        best = heapq.nsmallest(TOP_K, scores.items(), key=lambda item: (-item[1], item[0]))
+        return [(score, self.ids[other]) for other, score in best if score > 0]
+
+
+def _copurchase_counts(targets=None):
+    """
+    ``{product_id: {other_id: orders with both}}`` for ``targets`` (every product when None).
+
+    Read from the pairs mined by products/copurchase.py.
+    """
+    links = CoPurchase.objects.all()
+    if targets is not None:
+        links = links.filter(product_id__in=targets)
+    counts = defaultdict(dict)
+    for product_id, other_id, orders in links.values_list('product_id', 'other_id', 'orders').iterator(chunk_size=5000):
+        counts[product_id][other_id] = orders
+    return counts
+
+
+def _write(index, product_ids):
+    rows = []
+    for product_id in product_ids:
+        for rank, (score, other) in enumerate(index.neighbours(product_id), start=1):
+            rows.append(RelatedProduct(product_id=product_id, related_id=other, score=round(score, 4), rank=rank))
+    with transaction.atomic():
+        RelatedProduct.objects.filter(product_id__in=product_ids).delete()
+        RelatedProduct.objects.bulk_create(rows)
+    return rows
+
+
+def build_related(chunk_size=CHUNK_SIZE):
+    """
+    Recompute the neighbours of every product; returns the number of rows written.
+    """
+    index = _Index()
+    product_ids = list(Product.objects.values_list('pk', flat=True))
+    written = 0
+    for chunk in _chunked(product_ids, chunk_size):
+        written += len(_write(index, chunk))
+    return written
+
+
+def refresh_related(product_ids):
+    """
+    Recompute the neighbours of ``product_ids`` after they or their tags changed.
+
+    The products listing them are refreshed too (the changed product may
+    have dropped out, e.g. deactivated), then the new neighbours, which
+    may now rank the changed product among their own.
+    """
+    product_ids = set(product_ids)
+    if not product_ids:
+        return
+    targets = set(product_ids)
+    for chunk in _chunked(list(product_ids)):
+        targets.update(RelatedProduct.objects.filter(related_id__in=chunk).values_list('product_id', flat=True))
+    rows = _write_chunked(_Index(targets), list(targets))
+    neighbours = {row.related_id for row in rows if row.product_id in product_ids} - targets
+    if neighbours:
+        _write_chunked(_Index(neighbours), list(neighbours))
+
+
+def _chunked(items, size=CHUNK_SIZE):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _write_chunked(index, product_ids):
+    rows = []
+    for chunk in _chunked(product_ids):
+        rows.extend(_write(index, chunk))
+    return rows
@@ -0,0 +1,187 @@
+"""
+Full-text search over the product catalogue.
+
+Every product owns one ``ProductSearchIndex`` row holding a normalised text
+document (name, subtitle, brand, category, tags and description).  The
+document is matched by a backend specific inverted index:
+
+* PostgreSQL: a GIN index on ``to_tsvector('simple', document)``.
+* SQLite: an external-content FTS5 table kept in sync by triggers.
+
+Other backends fall back to a plain ``icontains`` on the document.
+"""
+import re
+
+from django.db import connection
+from django.db.models import Value
+from django.db.models.expressions import RawSQL
+
+from .models import Product, ProductSearchIndex, TaggedProduct
+
+
+FTS_TABLE = 'products_search_fts'
+
+# Harakat, superscript alef and tatweel carry no meaning for search.
+_DIACRITICS = re.compile('[\u0610-\u061a\u064b-\u065f\u0670\u06d6-\u06ed\u0640]')
+_LETTER_FOLDS = str.maketrans({
+    'أ': 'ا',
+    'إ': 'ا',
+    'آ': 'ا',
+    'ٱ': 'ا',
+    'ى': 'ي',
+    'ئ': 'ي',
+    'ؤ': 'و',
+    'ة': 'ه',
+})
+_TOKEN = re.compile(r'\w+')
+# Definite article prefixes, so "المثقاب" and "مثقاب" index to the same term.
+_ARTICLES = ('وال', 'بال', 'فال', 'كال', 'ال')
+
+
+def normalize_text(text):
+    """
+    Fold Arabic letter variants, strip diacritics and lowercase ``text``.
+    """
+    if not text:
+        return ''
+    text = _DIACRITICS.sub('', str(text))
+    return text.translate(_LETTER_FOLDS).lower()
+
+
+def _strip_article(token):
+    for article in _ARTICLES:
+        if token.startswith(article) and len(token) - len(article) >= 2:
+            return token[len(article):]
+    return token
+
+
+def tokenize(text):
+    return [_strip_article(token) for token in _TOKEN.findall(normalize_text(text))]
+
+
+def build_document(product, tag_names=None):
+    """
+    Build the normalised search document for ``product``.
+    """
+    if tag_names is None:
+        tag_names = product.tags.names()
+    parts = [
+        product.name,
+        product.subtitle,
+        product.brand,
+        product.category.name if product.category_id else '',
+        ' '.join(tag_names),
+        product.description,
+    ]
+    return ' '.join(' '.join(tokenize(part)) for part in parts if part)
+
+
+def index_product(product):
+    """
+    Create or refresh the search document of a single product.
+    """
+    ProductSearchIndex.objects.update_or_create(
+        product=product,
+        defaults={'document': build_document(product)},
+    )
+
+
+def index_products(product_ids=None, batch_size=500):
+    """
+    (Re)index many products in batches and return the number indexed.
+
+    When ``product_ids`` is None the whole catalogue is reindexed.
+    """
+    queryset = Product.objects.select_related('category').order_by('pk')
+    if product_ids is not None:
+        queryset = queryset.filter(pk__in=list(product_ids))
+
+    indexed = 0
+    batch = []
+    for product in queryset.iterator(chunk_size=batch_size):
+        batch.append(product)
+        if len(batch) >= batch_size:
+            indexed += _write_batch(batch)
+            batch = []
+    if batch:
+        indexed += _write_batch(batch)
+    return indexed
+
+
+def _write_batch(products):
+    existing = dict(
+        ProductSearchIndex.objects.filter(product__in=products).values_list('product_id', 'pk')
+    )
+    # One query for the tags of the whole batch; prefetch_related('tags')
+    # cannot match UUID keys on SQLite.
+    tags = {}
+    for product_id, tag_name in TaggedProduct.objects.filter(
+        content_object__in=products
+    ).values_list('content_object_id', 'tag__name'):
+        tags.setdefault(product_id, []).append(tag_name)
+
+    to_create, to_update = [], []
+    for product in products:
+        document = build_document(product, tag_names=tags.get(product.pk, []))
+        if product.pk in existing:
+            to_update.append(ProductSearchIndex(pk=existing[product.pk], product=product, document=document))
+        else:
+            to_create.append(ProductSearchIndex(product=product, document=document))
+    # bulk_update goes through UPDATE statements, so the FTS triggers still fire.
+    ProductSearchIndex.objects.bulk_create(to_create)
+    ProductSearchIndex.objects.bulk_update(to_update, ['document'])
+    return len(products)
+
+
+def _match_expression(tokens):
+    if connection.vendor == 'postgresql':
+        return ' & '.join(f'{token}:*' for token in tokens)
+    # FTS5: every token must appear, each one matched as a prefix.
+    return ' '.join('"{}"*'.format(token.replace('"', '')) for token in tokens)
+
+
+def search_products(queryset, query):
+    """
+    Restrict ``queryset`` to products matching ``query``.
+
+    The result is annotated with ``search_rank`` (higher is better).
+    """
+    tokens = tokenize(query)
+    if not tokens:
+        return queryset.annotate(search_rank=Value(0.0)).none()
+
+    match = _match_expression(tokens)
+    index_table = ProductSearchIndex._meta.db_table
+    product_table = Product._meta.db_table
+
+    if connection.vendor == 'sqlite':
+        matches = RawSQL(
+            f'SELECT i.product_id FROM {FTS_TABLE} f '
+            f'JOIN {index_table} i ON i.id = f.rowid '
+            f'WHERE {FTS_TABLE} MATCH %s',
+            (match,),
+        )
+        # bm25() is "lower is better"; negate it so every backend sorts DESC.
+        rank = RawSQL(
+            f'SELECT -bm25({FTS_TABLE}) FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s AND rowid = ('
+            f'SELECT id FROM {index_table} WHERE product_id = {product_table}.id)',
+            (match,),
+        )
+    elif connection.vendor == 'postgresql':
+        matches = RawSQL(
+            f'SELECT product_id FROM {index_table} '
+            f"WHERE to_tsvector('simple', document) @@ to_tsquery('simple', %s)",
+            (match,),
+        )
+        rank = RawSQL(
+            f"SELECT ts_rank(to_tsvector('simple', document), to_tsquery('simple', %s)) "
+            f'FROM {index_table} WHERE product_id = {product_table}.id',
+            (match,),
+        )
+    else:
+        for token in tokens:
+            queryset = queryset.filter(search_index__document__icontains=token)
+        return queryset.annotate(search_rank=Value(0.0))
+
+    return queryset.filter(pk__in=matches).annotate(search_rank=rank)
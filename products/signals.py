@@ -0,0 +1,115 @@
+from collections import namedtuple
+
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import Signal, receiver
+
+from utils.cache import PAGES_NAMESPACE, bump_version
+
+from .models import Category, Product, ProductImages
+from . import facets, images, related, search
+
+
+# Sent by products.importers for every chunk written with bulk_create /
+# bulk_update, which skip post_save. ``product_ids`` lists the products
+# written, ``active_delta`` how many more (or fewer) products are active.
+products_bulk_changed = Signal()
+
+# Sent by products.stock_feed and products.importers inside the transaction
+# that wrote prices / stock with bulk_update. ``changes`` lists a StockChange
+# per product whose price or quantity moved.
+product_stock_changed = Signal()
+
+StockChange = namedtuple(
+    'StockChange', 'line product_id sku name old_price new_price old_quantity new_quantity'
+)
+
+
+@receiver(post_save, sender=Product)
+def reindex_product(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    transaction.on_commit(lambda: search.index_products([instance.pk]))
+
+
+@receiver(m2m_changed, sender=Product.tags.through)
+def reindex_product_tags(sender, instance, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear') and isinstance(instance, Product):
+        transaction.on_commit(lambda: search.index_products([instance.pk]))
+        transaction.on_commit(lambda: bump_version(facets.CACHE_NAMESPACE))
+        transaction.on_commit(lambda: bump_version(PAGES_NAMESPACE))
+        transaction.on_commit(lambda: related.refresh_related([instance.pk]))
+
+
+@receiver(post_save, sender=Category)
+def reindex_category_products(sender, instance, created, raw=False, **kwargs):
+    if raw or created:
+        return
+    product_ids = list(instance.products.values_list('pk', flat=True))
+    if product_ids:
+        transaction.on_commit(lambda: search.index_products(product_ids))
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_catalog_cache(sender, raw=False, **kwargs):
+    if raw:
+        return
+    transaction.on_commit(lambda: bump_version(facets.CACHE_NAMESPACE))
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=ProductImages)
+@receiver(post_delete, sender=ProductImages)
+def invalidate_page_cache(sender, raw=False, **kwargs):
+    # Cached product cards are keyed by updated_at and need no bump
+    if raw:
+        return
+    transaction.on_commit(lambda: bump_version(PAGES_NAMESPACE))
+
+
+@receiver(products_bulk_changed)
+def reindex_bulk_products(sender, product_ids, **kwargs):
+    transaction.on_commit(lambda: search.index_products(product_ids))
+    transaction.on_commit(lambda: bump_version(facets.CACHE_NAMESPACE))
+    transaction.on_commit(lambda: bump_version(PAGES_NAMESPACE))
+    # Related products are refreshed once at the end of the import, see import_products
+
+
+@receiver(product_stock_changed)
+def invalidate_stock_facets(sender, changes, **kwargs):
+    transaction.on_commit(lambda: bump_version(PAGES_NAMESPACE))
+    # Facet counts only see the price range and the availability of a product
+    if any(
+        facets.price_range_key(change.old_price) != facets.price_range_key(change.new_price)
+        or (change.old_quantity > 0) != (change.new_quantity > 0)
+        for change in changes
+    ):
+        transaction.on_commit(lambda: bump_version(facets.CACHE_NAMESPACE))
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=ProductImages)
+def render_image_renditions(sender, instance, raw=False, **kwargs):
+    if raw or not instance.image:
+        return
+    name = instance.image.name
+    # Skipped (one stat) when the picture already has its renditions
+    transaction.on_commit(lambda: images.generate_renditions(name))
+
+
+@receiver(post_save, sender=Product)
+def refresh_related_products(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    state = instance.related_state()
+    # Price, stock or text edits do not move the neighbours
+    if not created and getattr(instance, '_persisted_related', None) == state:
+        return
+    instance._persisted_related = state
+    transaction.on_commit(lambda: related.refresh_related([instance.pk]))
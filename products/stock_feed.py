@@ -0,0 +1,119 @@
+"""
+Daily price / stock feed from suppliers.
+
+The feed (CSV, or XLSX / JSONL read by products.importers) has an
+identifier column, ``sku`` or the product ``id``, and a new ``price``
+and/or ``quantity``.  Products are read and locked in chunks, compared with
+the feed, and only the ones that actually change are written with
+``bulk_update``; everything happens in one transaction.  A dry run stops
+after the comparison and returns the same diff.
+
+Dependent caches are invalidated for the changed products only, through
+``product_stock_changed``: open carts holding a repriced product are
+repriced (orders/signals.py) and the catalogue facets are dropped only when
+a product changed price range or availability (products/signals.py).
+"""
+import uuid
+from dataclasses import dataclass, field
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .importers import CHUNK_SIZE, RowError, _chunks, _InvalidRow, _number, _string
+from .models import Product
+from .signals import StockChange, product_stock_changed
+
+
+@dataclass
+class FeedResult:
+    changes: list = field(default_factory=list)
+    unchanged: int = 0
+    errors: list = field(default_factory=list)
+
+
+def apply_stock_feed(rows, dry_run=False, chunk_size=CHUNK_SIZE):
+    """
+    Apply ``(line, row)`` pairs as produced by ``importers.read_rows``.
+
+    Returns a ``FeedResult``; with ``dry_run`` nothing is written.
+    """
+    result = FeedResult()
+    seen = set()
+    now = timezone.now()
+    with transaction.atomic():
+        for chunk in _chunks(rows, chunk_size):
+            changes = _diff_chunk(chunk, result, seen, lock=not dry_run)
+            if changes and not dry_run:
+                Product.objects.bulk_update(
+                    [
+                        Product(pk=change.product_id, price=change.new_price, quantity=change.new_quantity, updated_at=now)
+                        for change in changes
+                    ],
+                    ['price', 'quantity', 'updated_at'],
+                )
+            result.changes.extend(changes)
+        if result.changes and not dry_run:
+            product_stock_changed.send(sender=Product, changes=result.changes)
+    return result
+
+
+def _identifier(row):
+    sku = _string(row.get('sku'))
+    if sku:
+        return 'sku', sku
+    product_id = _string(row.get('id'))
+    if not product_id:
+        raise _InvalidRow('المعرف مطلوب (sku أو id)')
+    try:
+        return 'id', uuid.UUID(product_id)
+    except ValueError:
+        raise _InvalidRow(f'معرف غير صالح: {product_id}') from None
+
+
+def _diff_chunk(chunk, result, seen, lock):
+    parsed = []
+    for line, row in chunk:
+        if row is None:
+            result.errors.append(RowError(line, '', 'سطر غير صالح'))
+            continue
+        try:
+            key = _identifier(row)
+            price = row.get('price')
+            quantity = row.get('quantity')
+            price = _number(price, float, 'السعر') if price not in (None, '') else None
+            quantity = _number(quantity, int, 'الكمية') if quantity not in (None, '') else None
+        except _InvalidRow as exc:
+            result.errors.append(RowError(line, _string(row.get('sku')), str(exc)))
+            continue
+        if key in seen:
+            result.errors.append(RowError(line, str(key[1]), 'المنتج مكرر في الملف'))
+            continue
+        seen.add(key)
+        parsed.append((line, key, price, quantity))
+
+    if not parsed:
+        return []
+    skus = [value for _line, (kind, value), _price, _quantity in parsed if kind == 'sku']
+    ids = [value for _line, (kind, value), _price, _quantity in parsed if kind == 'id']
+    products = Product.objects.filter(Q(sku__in=skus) | Q(pk__in=ids)).order_by('pk')
+    if lock:
+        products = products.select_for_update()
+    by_key = {}
+    for pk, sku, name, price, quantity in products.values_list('pk', 'sku', 'name', 'price', 'quantity'):
+        by_key[('id', pk)] = by_key[('sku', sku)] = (pk, sku, name, price, quantity)
+
+    changes = []
+    for line, key, new_price, new_quantity in parsed:
+        product = by_key.get(key)
+        if product is None:
+            result.errors.append(RowError(line, str(key[1]), 'منتج غير موجود'))
+            continue
+        pk, sku, name, price, quantity = product
+        new_price = price if new_price is None else new_price
+        new_quantity = quantity if new_quantity is None else new_quantity
+        if new_price == price and new_quantity == quantity:
+            result.unchanged += 1
+            continue
+        changes.append(StockChange(line, pk, sku or '', name, price, new_price, quantity, new_quantity))
+    return changes
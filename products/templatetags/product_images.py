@@ -0,0 +1,82 @@
+from django import template
+from django.core.files.storage import default_storage
+from django.urls import reverse
+
+from products.images import ALLOWED_WIDTHS, FORMATS, RENDITIONS, SOURCE_DIRS, has_renditions, rendition_name
+
+
+register = template.Library()
+
+
+def _file(image):
+    """
+    ``(storage, name)`` of an ImageField value or a plain storage name.
+    """
+    return getattr(image, 'storage', default_storage), getattr(image, 'name', image) or ''
+
+
+def _on_demand_url(name, width, extension):
+    return reverse('products:product_image', kwargs={'width': width, 'extension': extension, 'name': name})
+
+
+@register.simple_tag
+def rendition_url(image, rendition='medium', extension='jpg'):
+    """
+    URL of one rendition of ``image``.
+
+    Stored renditions are served as plain media files; a picture that has
+    none yet goes through the on-demand resizer.
+    """
+    storage, name = _file(image)
+    if not name:
+        return ''
+    if has_renditions(name, storage):
+        return storage.url(rendition_name(name, rendition, extension))
+    if name.startswith(SOURCE_DIRS):
+        return _on_demand_url(name, RENDITIONS[rendition], extension)
+    return storage.url(name)
+
+
+@register.inclusion_tag('products/includes/picture.html')
+def product_picture(image, alt='', sizes='100vw', rendition='medium', css_class='', element_id='', loading='lazy'):
+    """
+    <picture> with WebP and JPEG ``srcset`` over every rendition of ``image``.
+
+    ``sizes`` tells the browser how wide the picture is laid out so it can
+    pick the smallest rendition that is sharp enough; ``rendition`` is the
+    fallback ``src``.
+    """
+    storage, name = _file(image)
+    context = {
+        'alt': alt,
+        'sizes': sizes,
+        'css_class': css_class,
+        'element_id': element_id,
+        'loading': loading,
+        'src': '',
+    }
+    if not name:
+        return context
+    if has_renditions(name, storage):
+        candidates = [
+            (width, {extension: storage.url(rendition_name(name, size, extension)) for extension in FORMATS})
+            for size, width in RENDITIONS.items()
+        ]
+    elif name.startswith(SOURCE_DIRS):
+        candidates = [
+            (width, {extension: _on_demand_url(name, width, extension) for extension in FORMATS})
+            for width in ALLOWED_WIDTHS
+        ]
+    else:
+        context['src'] = storage.url(name)
+        return context
+    srcsets = {
+        extension: ', '.join(f'{urls[extension]} {width}w' for width, urls in candidates)
+        for extension in FORMATS
+    }
+    context.update(
+        src=rendition_url(image, rendition),
+        webp_srcset=srcsets['webp'],
+        jpg_srcset=srcsets['jpg'],
+    )
+    return context
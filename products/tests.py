@@ -1,3 +1,524 @@
-from django.test import TestCase
+import io
+import shutil
+import tempfile
+from datetime import timedelta
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.core.files.base import ContentFile
+from django.core.files.storage import InMemoryStorage, default_storage
+from django.http import QueryDict
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from PIL import Image
+
+from accounts.models import CustomUser
+from orders.models import Cart, CartDetail, Order
+from utils.cache import PAGES_NAMESPACE, bump_version
+from utils.pagination import KeysetPaginator
+
+from . import images, related
+from .copurchase import bought_together, mine_copurchases
+from .facets import compute_facets, get_facets
+from .importers import _Importer, import_products, read_rows
+from .models import Category, CoPurchase, Product, RelatedProduct
+from .search import index_products, search_products, tokenize
+from .stock_feed import apply_stock_feed
+from .templatetags.product_images import rendition_url
+
+
+def make_product(sku, price=100.0, quantity=10, **fields):
+    # Arabic names slugify to nothing, the SKU keeps the slugs unique
+    fields.setdefault('slug', sku.lower())
+    fields.setdefault('image', 'product/placeholder.jpg')
+    return Product.objects.create(
+        sku=sku, name=fields.pop('name', sku), price=price, quantity=quantity, subtitle='', description='', **fields
+    )
+
+
+def csv_rows(text):
+    return read_rows(io.BytesIO(text.encode('utf-8')), 'csv')
+
+
+def use_temporary_media(test, **settings):
+    """
+    Point the default storage of ``test`` at a directory removed afterwards.
+    """
+    media_root = tempfile.mkdtemp()
+    test.addCleanup(shutil.rmtree, media_root)
+    storages = override_settings(
+        STORAGES={
+            'default': {
+                'BACKEND': 'django.core.files.storage.FileSystemStorage',
+                'OPTIONS': {'location': media_root},
+            },
+            'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+        },
+        **settings,
+    )
+    storages.enable()
+    test.addCleanup(storages.disable)
+
+
+def picture(size=(1600, 900), image_format='JPEG', color=(200, 30, 30), exif=None):
+    output = io.BytesIO()
+    Image.new('RGB', size, color).save(output, image_format, **({'exif': exif} if exif else {}))
+    return ContentFile(output.getvalue())
+
+
+class ImporterTests(TestCase):
+    def setUp(self):
+        use_temporary_media(self)
+        default_storage.save('product/saw.jpg', ContentFile(b'picture'))
+
+    def test_bad_rows_are_reported_and_skipped(self):
+        rows = csv_rows(
+            'sku,name,price,quantity,image\n'
+            'SAW-1,Saw,50,3,product/saw.jpg\n'
+            'NAN-1,Nan price,nan,1,product/saw.jpg\n'
+            'INF-1,Inf stock,10,inf,product/saw.jpg\n'
+            'BIG-1,Huge stock,10,1e400,product/saw.jpg\n'
+            'ESC-1,Escape,10,1,../secret.jpg\n'
+            'NON-1,,10,1,product/saw.jpg\n'
+        )
+        result = import_products(rows)
+
+        self.assertEqual(result.created, 1)
+        self.assertEqual(sorted(error.line for error in result.errors), [3, 4, 5, 6, 7])
+        self.assertEqual(list(Product.objects.values_list('sku', flat=True)), ['SAW-1'])
+
+    def test_text_columns_are_imported(self):
+        rows = csv_rows(
+            'sku,name,price,quantity,image,subtitle,description\n'
+            'SAW-1,Saw,50,3,product/saw.jpg,Cuts wood,A long description\n'
+        )
+        result = import_products(rows)
+
+        self.assertEqual((result.created, result.errors), (1, []))
+        saw = Product.objects.get(sku='SAW-1')
+        self.assertEqual((saw.subtitle, saw.description), ('Cuts wood', 'A long description'))
+
+    def test_upsert_only_writes_the_columns_of_the_feed(self):
+        saw = make_product('SAW-1', price=50.0, quantity=10, image='product/saw.jpg')
+        rows = csv_rows('sku,name,image\nSAW-1,Saw 2,/supplier/saw.jpg\n')
+        resolve_images = _Importer.resolve_images
+
+        def sell_while_importing(importer, pending):
+            # A checkout sells some stock after the chunk read the product
+            Product.objects.filter(pk=saw.pk).update(quantity=7)
+            return resolve_images(importer, pending)
+
+        with mock.patch.object(_Importer, 'resolve_images', sell_while_importing):
+            result = import_products(rows, mode='upsert')
+
+        self.assertEqual((result.updated, result.errors), (1, []))
+        saw.refresh_from_db()
+        self.assertEqual((saw.name, saw.quantity, saw.image.name), ('Saw 2', 7, 'product/saw.jpg'))
+
+    def test_upsert_price_changes_reprice_open_carts(self):
+        saw = make_product('SAW-1', price=50.0, quantity=10)
+        user = CustomUser.objects.create_user('buyer@example.com', 'secret')
+        cart = Cart.objects.create(user=user, status='Inprogress')
+        CartDetail.objects.create(cart=cart, product=saw, quantity=2, total=100.0)
+
+        import_products(csv_rows('sku,price\nSAW-1,45\n'), mode='upsert')
+        cart.refresh_from_db()
+        self.assertEqual(cart.subtotal, 90.0)
+
+    def test_local_images_stay_under_image_root(self):
+        image_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, image_root)
+        with open(f'{image_root}/drill.jpg', 'wb') as image:
+            image.write(b'picture')
+        rows = csv_rows(
+            'sku,name,price,quantity,image\n'
+            'DRL-1,Drill,100,5,drill.jpg\n'
+            'DRL-2,Drill,100,5,/etc/passwd\n'
+        )
+        result = import_products(rows, image_root=image_root)
+
+        self.assertEqual(result.created, 1)
+        self.assertEqual([error.line for error in result.errors], [3])
+        self.assertTrue(default_storage.exists(Product.objects.get(sku='DRL-1').image.name))
+
+
+class StockFeedTests(TestCase):
+    def setUp(self):
+        self.drill = make_product('DRL-1', price=100.0, quantity=10)
+        self.saw = make_product('SAW-1', price=50.0, quantity=3)
+
+    def test_non_finite_numbers_are_row_errors(self):
+        rows = [
+            (2, {'sku': 'DRL-1', 'price': 'nan'}),
+            (3, {'sku': 'SAW-1', 'quantity': 'inf'}),
+            (4, {'sku': 'SAW-1', 'price': '1e400'}),
+        ]
+        result = apply_stock_feed(rows)
+
+        self.assertEqual([error.line for error in result.errors], [2, 3, 4])
+        self.assertEqual(result.changes, [])
+        self.drill.refresh_from_db()
+        self.saw.refresh_from_db()
+        self.assertEqual((self.drill.price, self.saw.quantity, self.saw.price), (100.0, 3, 50.0))
+
+    def test_dry_run_reports_the_diff_without_writing(self):
+        rows = [
+            (2, {'sku': 'DRL-1', 'price': '120'}),
+            (3, {'sku': 'SAW-1', 'quantity': '3'}),
+            (4, {'sku': 'NOPE-1', 'quantity': '1'}),
+        ]
+        result = apply_stock_feed(rows, dry_run=True)
+
+        self.assertEqual([(change.sku, change.new_price) for change in result.changes], [('DRL-1', 120.0)])
+        self.assertEqual(result.unchanged, 1)
+        self.assertEqual([error.line for error in result.errors], [4])
+        self.drill.refresh_from_db()
+        self.assertEqual(self.drill.price, 100.0)
+
+    def test_apply_writes_the_changed_products_and_reprices_carts(self):
+        user = CustomUser.objects.create_user('buyer@example.com', 'secret')
+        cart = Cart.objects.create(user=user, status='Inprogress')
+        CartDetail.objects.create(cart=cart, product=self.drill, quantity=2, total=200.0)
+        rows = [
+            (2, {'sku': 'DRL-1', 'price': '120', 'quantity': '0'}),
+            (3, {'sku': 'SAW-1', 'price': '50'}),
+        ]
+        result = apply_stock_feed(rows)
+
+        self.assertEqual(len(result.changes), 1)
+        self.drill.refresh_from_db()
+        self.saw.refresh_from_db()
+        self.assertEqual((self.drill.price, self.drill.quantity), (120.0, 0))
+        self.assertEqual((self.saw.price, self.saw.quantity), (50.0, 3))
+        cart.refresh_from_db()
+        self.assertEqual(cart.subtotal, 240.0)
+
+
+class RenditionTests(TestCase):
+    def setUp(self):
+        self.storage = InMemoryStorage()
+
+    def test_every_rendition_is_written_once(self):
+        exif = Image.Exif()
+        exif[0x0110] = 'Camera model'
+        name = self.storage.save('product/saw.jpg', picture(exif=exif))
+
+        self.assertEqual(images.generate_renditions(name, self.storage), 6)
+        self.assertEqual(images.generate_renditions(name, self.storage), 0)
+        with self.storage.open(images.rendition_name(name, 'medium', 'webp')) as fileobj:
+            medium = Image.open(fileobj)
+            self.assertEqual((medium.format, medium.size), ('WEBP', (600, 338)))
+        with self.storage.open(images.rendition_name(name, 'large', 'jpg')) as fileobj:
+            self.assertFalse(Image.open(fileobj).getexif())
+
+    def test_same_name_with_another_extension_keeps_its_own_renditions(self):
+        jpg = self.storage.save('product/saw.jpg', picture(color=(255, 0, 0)))
+        png = self.storage.save('product/saw.png', picture(image_format='PNG', color=(0, 0, 255)))
+        images.generate_renditions(jpg, self.storage)
+        images.generate_renditions(png, self.storage)
+
+        with self.storage.open(images.rendition_name(png, 'thumb', 'jpg')) as fileobj:
+            red, _green, blue = Image.open(fileobj).convert('RGB').getpixel((10, 10))
+        self.assertGreater(blue, red)
+
+    def test_unreadable_pictures_are_skipped(self):
+        name = self.storage.save('product/broken.jpg', ContentFile(b'not a picture'))
+
+        self.assertEqual(images.generate_renditions(name, self.storage), 0)
+        self.assertFalse(images.has_renditions(name, self.storage))
+
+    def test_templates_use_stored_renditions_when_complete(self):
+        name = self.storage.save('product/saw.jpg', picture())
+        image = SimpleNamespace(storage=self.storage, name=name)
+        self.assertEqual(rendition_url(image, 'thumb', 'webp'), f'/products/images/200/webp/{name}')
+
+        images.generate_renditions(name, self.storage)
+        self.assertEqual(rendition_url(image, 'thumb', 'webp'), self.storage.url(f'{name}.thumb.webp'))
+
+
+class OnDemandImageTests(TestCase):
+    def setUp(self):
+        cache_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_root)
+        use_temporary_media(self, IMAGE_CACHE_ROOT=cache_root)
+        self.name = default_storage.save('product/saw.jpg', picture())
+
+    def get(self, width=400, extension='webp', name=None, **headers):
+        return self.client.get(f'/products/images/{width}/{extension}/{name or self.name}', headers=headers)
+
+    def test_resized_once_then_served_from_the_disk_cache(self):
+        response = self.get()
+        self.assertEqual(response['Content-Type'], 'image/webp')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertEqual(Image.open(io.BytesIO(b''.join(response.streaming_content))).size, (400, 225))
+
+        with mock.patch.object(images, 'encode') as encode:
+            self.assertEqual(self.get().status_code, 200)
+        encode.assert_not_called()
+        self.assertEqual(self.get(**{'If-None-Match': response['ETag']}).status_code, 304)
+
+    def test_copies_of_a_picture_share_the_cache(self):
+        with default_storage.open(self.name) as fileobj:
+            copy = default_storage.save('product/saw-copy.jpg', ContentFile(fileobj.read()))
+        self.get()
+
+        with mock.patch.object(images, 'encode') as encode:
+            self.assertEqual(self.get(name=copy).status_code, 200)
+        encode.assert_not_called()
+
+    def test_only_known_widths_and_product_pictures(self):
+        default_storage.save('other/saw.jpg', picture())
+
+        self.assertEqual(self.get(width=401).status_code, 404)
+        self.assertEqual(self.get(extension='gif').status_code, 404)
+        self.assertEqual(self.get(name='other/saw.jpg').status_code, 404)
+        self.assertEqual(self.get(name='product/../other/saw.jpg').status_code, 404)
+        self.assertEqual(self.get(name='product/missing.jpg').status_code, 404)
+
+    def test_warm_cache_writes_every_width(self):
+        self.assertEqual(images.warm_cache(self.name), len(images.ALLOWED_WIDTHS) * len(images.FORMATS))
+        self.assertEqual(images.warm_cache(self.name), 0)
+
+
+class RelatedProductTests(TestCase):
+    def setUp(self):
+        self.drill = make_product('DRL-1')
+        self.driver = make_product('DRV-1')
+        self.saw = make_product('SAW-1')
+        self.hose = make_product('HOS-1')
+        for product, tags in (
+            (self.drill, ['battery', 'tool']),
+            (self.driver, ['battery', 'tool']),
+            (self.saw, ['tool']),
+            (self.hose, ['garden']),
+        ):
+            product.tags.add(*tags)
+
+    def neighbours(self, product):
+        return list(RelatedProduct.objects.filter(product=product).values_list('related__sku', flat=True))
+
+    def test_rare_shared_tags_rank_first(self):
+        related.build_related()
+
+        self.assertEqual(self.neighbours(self.drill), ['DRV-1', 'SAW-1'])
+        self.assertEqual(self.neighbours(self.hose), [])
+
+    def test_only_neighbour_changes_refresh_the_table(self):
+        related.build_related()
+        drill = Product.objects.get(pk=self.drill.pk)
+        with mock.patch.object(related, 'refresh_related') as refresh, self.captureOnCommitCallbacks(execute=True):
+            drill.price, drill.quantity = 90.0, 3
+            drill.save()
+        refresh.assert_not_called()
+
+        saw = Product.objects.get(pk=self.saw.pk)
+        saw.is_active = False
+        with self.captureOnCommitCallbacks(execute=True):
+            saw.save()
+        self.assertEqual(self.neighbours(self.drill), ['DRV-1'])
+
+    def test_detail_page_falls_back_to_shared_tags(self):
+        response = self.client.get(f'/products/{self.drill.slug}')
+
+        self.assertEqual(sorted(product.sku for product in response.context['products']), ['DRV-1', 'SAW-1'])
+
+
+class CoPurchaseTests(TestCase):
+    def setUp(self):
+        self.drill, self.bits, self.battery, self.saw = (
+            make_product(sku) for sku in ('DRL-1', 'BIT-1', 'BAT-1', 'SAW-1')
+        )
+        for basket in (
+            [self.drill, self.bits, self.battery],
+            [self.drill, self.bits],
+            [self.drill, self.bits, self.battery],
+            [self.drill, self.saw],
+            [self.saw],
+        ):
+            order = Order.objects.create()
+            for product in basket:
+                order.order_detail.create(product=product, quantity=1, price=product.price, total=product.price)
+
+    def partners(self, product):
+        return list(CoPurchase.objects.filter(product=product).values_list('other__sku', 'orders'))
+
+    def test_pairs_below_the_support_are_dropped(self):
+        mine_copurchases()
+
+        self.assertEqual(self.partners(self.drill), [('BIT-1', 3), ('BAT-1', 2)])
+        self.assertEqual(self.partners(self.saw), [])
+
+    def test_spilled_runs_add_up(self):
+        mine_copurchases(max_pairs=1, chunk_size=2)
+
+        self.assertEqual(self.partners(self.drill), [('BIT-1', 3), ('BAT-1', 2)])
+        self.assertEqual(sorted(self.partners(self.battery)), [('BIT-1', 2), ('DRL-1', 2)])
+
+    def test_bought_together_skips_unavailable_products(self):
+        mine_copurchases()
+        Product.objects.filter(pk=self.bits.pk).update(quantity=0)
+
+        self.assertEqual(bought_together([self.drill.pk]), [self.battery])
+        self.assertEqual(bought_together([self.drill.pk, self.battery.pk]), [])
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        self.drill = make_product('DRL-1', name='مِثقاب كهربائي', brand='Makita')
+        self.saw = make_product('SAW-1', name='منشار خشب')
+        index_products()
+
+    def search(self, query):
+        return list(search_products(Product.objects.all(), query).values_list('sku', flat=True))
+
+    def test_tokens_are_normalised(self):
+        self.assertEqual(tokenize('المِثقاب أدوات'), ['مثقاب', 'ادوات'])
+
+    def test_matches_letter_variants_articles_and_prefixes(self):
+        self.assertEqual(self.search('المثقاب'), ['DRL-1'])
+        self.assertEqual(self.search('مثق'), ['DRL-1'])
+        self.assertEqual(self.search('makita'), ['DRL-1'])
+        self.assertEqual(self.search('منشار مثقاب'), [])
+
+    def test_list_view_searches_the_index(self):
+        response = self.client.get('/products/', {'search': 'منشار'})
+
+        self.assertEqual([product.sku for product in response.context['object_list']], ['SAW-1'])
+
+
+class FacetTests(TestCase):
+    def setUp(self):
+        self.tools = Category.objects.create(name='Tools')
+        self.garden = Category.objects.create(name='Garden')
+        make_product('DRL-1', price=500, quantity=0, brand='Makita', category=self.tools)
+        make_product('SAW-1', price=2000, brand='Bosch', category=self.tools)
+        make_product('HOS-1', price=20000, brand='Bosch', category=self.garden)
+
+    def test_counts_every_facet_in_one_pass(self):
+        facets = compute_facets(Product.objects.all())
+
+        self.assertEqual(facets['total'], 3)
+        self.assertEqual({c['name']: c['count'] for c in facets['categories']}, {'Tools': 2, 'Garden': 1})
+        self.assertEqual(facets['brands'], [{'name': 'Bosch', 'count': 2}, {'name': 'Makita', 'count': 1}])
+        self.assertEqual([r['count'] for r in facets['price_ranges']], [1, 1, 0, 1])
+        self.assertEqual(facets['availability'], {'in_stock': 2, 'out_of_stock': 1})
+
+    def test_selected_category_keeps_the_other_counts(self):
+        response = self.client.get('/products/', {'category': self.garden.pk, 'brand': 'bosch'})
+        facets = response.context['facets']
+
+        self.assertEqual(facets['total'], 1)
+        self.assertEqual({c['name']: c['count'] for c in facets['categories']}, {'Tools': 1, 'Garden': 1})
+
+    def test_product_changes_invalidate_the_cache(self):
+        params = QueryDict('')
+        self.assertEqual(get_facets(Product.objects.all(), params)['total'], 3)
+        with self.captureOnCommitCallbacks(execute=True):
+            make_product('AXE-1')
+
+        self.assertEqual(get_facets(Product.objects.all(), params)['total'], 4)
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        # Repeated prices: the id breaks the ties
+        for index, price in enumerate([30, 10, 20, 10, 30, 20, 10]):
+            make_product(f'P-{index}', price=price)
+        self.ordering = ('price', 'id')
+        self.expected = list(Product.objects.order_by(*self.ordering).values_list('sku', flat=True))
+
+    def test_walks_forward_and_back_without_gaps(self):
+        paginator = KeysetPaginator(Product.objects.all(), self.ordering, 3, count_mode='exact')
+        pages, cursor = [], None
+        while True:
+            page = paginator.page(cursor)
+            pages.append([product.sku for product in page])
+            if not page.has_next():
+                break
+            cursor = page.next_cursor
+
+        self.assertEqual(sum(pages, []), self.expected)
+        self.assertEqual(page.count, 7)
+        previous = paginator.page(page.previous_cursor)
+        self.assertEqual([product.sku for product in previous], pages[-2])
+
+    def test_bad_cursor_gives_the_first_page(self):
+        page = KeysetPaginator(Product.objects.all(), self.ordering, 3).page('not-a-cursor')
+
+        self.assertEqual([product.sku for product in page], self.expected[:3])
+        self.assertFalse(page.has_previous())
+        self.assertIsNone(page.count)
+
+    def test_list_view_follows_the_cursor(self):
+        for index in range(7, 15):
+            make_product(f'P-{index}', price=index)
+        expected = list(Product.objects.order_by(*self.ordering).values_list('sku', flat=True))
+        first = self.client.get('/products/', {'sort': 'price_asc'}).context['page_obj']
+        second = self.client.get('/products/', {'sort': 'price_asc', 'cursor': first.next_cursor}).context['page_obj']
+
+        self.assertEqual([product.sku for product in first] + [product.sku for product in second], expected)
+
+
+class PageCacheTests(TestCase):
+    def setUp(self):
+        self.drill = make_product('DRL-1', name='Drill')
+        self.client.get('/products/')
+        # A queryset write sends no signal: the cached page is still served
+        Product.objects.filter(pk=self.drill.pk).update(name='Cordless drill', updated_at=timezone.now())
+
+    def test_anonymous_visitors_get_the_cached_page_until_a_bump(self):
+        response = self.client.get('/products/')
+        self.assertContains(response, 'Drill')
+        self.assertNotContains(response, 'Cordless drill')
+        self.assertIn('csrftoken', response.cookies)
+
+        bump_version(PAGES_NAMESPACE)
+        self.assertContains(self.client.get('/products/'), 'Cordless drill')
+
+    def test_signed_in_users_and_other_queries_bypass_the_cache(self):
+        self.assertContains(self.client.get('/products/', {'sort': 'price_asc'}), 'Cordless drill')
+        self.client.force_login(CustomUser.objects.create_user('buyer@example.com', 'secret'))
+        self.assertContains(self.client.get('/products/'), 'Cordless drill')
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_per_process_caches_are_not_used_for_pages(self):
+        self.client.get('/products/')
+        Product.objects.filter(pk=self.drill.pk).update(name='Impact drill', updated_at=timezone.now())
+
+        self.assertContains(self.client.get('/products/'), 'Impact drill')
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        self.drill = make_product('DRL-1')
+        self.saw = make_product('SAW-1')
+
+    def test_unchanged_pages_revalidate_with_a_304(self):
+        for url in ('/products/', f'/products/{self.drill.slug}'):
+            response = self.client.get(url)
+            self.assertEqual(self.client.get(url, headers={'If-None-Match': response['ETag']}).status_code, 304)
+            self.assertEqual(
+                self.client.get(url, headers={'If-Modified-Since': response['Last-Modified']}).status_code, 304
+            )
+
+    def test_deactivating_a_product_moves_the_list_validators(self):
+        Product.objects.update(updated_at=timezone.now() - timedelta(hours=1))
+        # Not served from the page cache: the view computes the validators
+        with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}):
+            first = self.client.get('/products/')
+            Product.objects.filter(pk=self.saw.pk).update(is_active=False)
+            bump_version(PAGES_NAMESPACE)
+            response = self.client.get('/products/', headers={'If-Modified-Since': first['Last-Modified']})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], first['ETag'])
+
+    def test_inactive_products_send_no_validators(self):
+        Product.objects.filter(pk=self.drill.pk).update(is_active=False)
+
+        self.assertFalse(self.client.get(f'/products/{self.drill.slug}').has_header('Last-Modified'))
+
+    def test_signed_in_users_get_no_validators(self):
+        self.client.force_login(CustomUser.objects.create_user('buyer@example.com', 'secret'))
+
+        self.assertFalse(self.client.get('/products/').has_header('ETag'))
@@ -1,5 +1,5 @@
 from django.urls import path
-from .views import ProductDetail, ProductListView
+from .views import ProductDetail, ProductListView, product_image
 
 
 app_name='products'
@@ -7,6 +7,7 @@ app_name='products'
 urlpatterns=[
 
     path('', ProductListView.as_view(),name='product_list'),
+    path('images/<int:width>/<str:extension>/<path:name>', product_image, name='product_image'),
     path('<slug:slug>', ProductDetail.as_view(),name='product_detail'),
     
   
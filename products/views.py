@@ -1,34 +1,78 @@
+from datetime import datetime, timezone as dt_timezone
+
+from django.db.models import Max
+from django.http import FileResponse, Http404, HttpResponseNotModified
+from django.utils.cache import get_conditional_response
+from django.utils.decorators import method_decorator
+from django.utils.http import http_date, parse_etags
+from django.views.decorators.http import require_safe
 from django.views.generic import ListView,DetailView
-from .models import Product,ProductImages
+from . import images
+from .models import Category,Product,ProductImages,RelatedProduct
+from .copurchase import bought_together
+from .related import TOP_K
+from .search import search_products
+from .facets import filter_price_range, get_facets
+from utils.cache import PAGES_NAMESPACE, cache_anonymous_page, changed_at, get_version
+from utils.pagination import KeysetPaginator
+
+
+
 
-from django.db.models import Q
+class ConditionalGetMixin:
+    """
+    ETag / Last-Modified on the pages of anonymous visitors, so browsers and
+    proxies revalidate with a 304 instead of downloading the page again.
 
+    ``get_last_modified()`` returns the newest change shown on the page.  A
+    page also shows other products (related ones, facet counts), so the ETag
+    adds the version of the page cache, bumped on every catalogue change;
+    clients send If-None-Match first and it takes precedence.
+    Signed-in users get no validators: their navbar shows the cart.
+    """
 
+    def get_last_modified(self):
+        """
+        Newest change shown on the page, an aware datetime; None sends no validators.
+        """
+        return None
 
+    def get(self, request, *args, **kwargs):
+        if request.user.is_authenticated:
+            return super().get(request, *args, **kwargs)
+        last_modified = self.get_last_modified()
+        if last_modified is None:
+            return super().get(request, *args, **kwargs)
+        timestamp = int(last_modified.timestamp())
+        etag = f'W/"{get_version(PAGES_NAMESPACE)}-{timestamp}"'
+        response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+        if response is None:
+            response = super().get(request, *args, **kwargs)
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(timestamp)
+        return response
 
-class ProductListView(ListView):
+
+@method_decorator(cache_anonymous_page(), name='dispatch')
+class ProductListView(ConditionalGetMixin, ListView):
     model = Product
     template_name = 'product_list.html'
     context_object_name = 'object_list'
     paginate_by = 12  # عدد المنتجات في كل صفحة
 
     def get_queryset(self):
+        # Built once per request: get_last_modified() and ListView.get() both use it
+        if not hasattr(self, '_queryset'):
+            self._queryset = self._filtered_queryset()
+        return self._queryset
+
+    def _filtered_queryset(self):
         queryset = Product.objects.filter(is_active=True)  # Only show active products
         
-        # Search in name, subtitle, and description
-        search_query = self.request.GET.get('search', '')
+        # Full-text search over name, subtitle, description, brand and tags
+        search_query = self.request.GET.get('search', '').strip()
         if search_query:
-            queryset = queryset.filter(
-                Q(name__icontains=search_query) | 
-                Q(subtitle__icontains=search_query) |
-                Q(description__icontains=search_query) |
-                Q(tags__name__icontains=search_query)  # Search in tags too
-            )
-        
-        # Filter by category
-        category_id = self.request.GET.get('category', '')
-        if category_id:
-            queryset = queryset.filter(category_id=category_id)
+            queryset = search_products(queryset, search_query)
         
         # Filter by brand
         brand = self.request.GET.get('brand', '')
@@ -38,14 +82,7 @@ class ProductListView(ListView):
         # Filter by price range
         price_range = self.request.GET.get('price_range', '')
         if price_range:
-            if price_range == '0-1000':
-                queryset = queryset.filter(price__lt=1000)
-            elif price_range == '1000-5000':
-                queryset = queryset.filter(price__gte=1000, price__lt=5000)
-            elif price_range == '5000-10000':
-                queryset = queryset.filter(price__gte=5000, price__lt=10000)
-            elif price_range == '10000-plus':
-                queryset = queryset.filter(price__gte=10000)
+            queryset = filter_price_range(queryset, price_range)
         
         # Filter by availability
         availability = self.request.GET.get('availability', '')
@@ -54,32 +91,64 @@ class ProductListView(ListView):
         elif availability == 'out_of_stock':
             queryset = queryset.filter(quantity=0)
         
-        # Sorting
+        # Filter by category - last, the sidebar counts every category under the other filters
+        self.category_facet_queryset = queryset
+        category_id = self.request.GET.get('category', '')
+        if category_id:
+            queryset = queryset.filter(category_id=category_id)
+        
+        # Sorting - every ordering ends with the pk so it can be paginated by keyset
         sort_by = self.request.GET.get('sort', '')
         if sort_by == 'price_asc':
-            queryset = queryset.order_by('price')
+            self.keyset_ordering = ('price', 'id')
         elif sort_by == 'price_desc':
-            queryset = queryset.order_by('-price')
+            self.keyset_ordering = ('-price', '-id')
         elif sort_by == 'name_asc':
-            queryset = queryset.order_by('name')
+            self.keyset_ordering = ('name', 'id')
         elif sort_by == 'name_desc':
-            queryset = queryset.order_by('-name')
+            self.keyset_ordering = ('-name', '-id')
         elif sort_by == 'newest':
-            queryset = queryset.order_by('-created_at')
+            self.keyset_ordering = ('-created_at', '-id')
+        elif search_query:
+            self.keyset_ordering = None  # Relevance is not a column, use regular pages
+            queryset = queryset.order_by('-search_rank', '-created_at')  # Most relevant first
         else:
-            queryset = queryset.order_by('-created_at')  # Default sorting
+            self.keyset_ordering = ('-created_at', '-id')  # Default sorting
         
-        return queryset.distinct()
+        if self.keyset_ordering:
+            queryset = queryset.order_by(*self.keyset_ordering)
+        
+        return queryset
+
+    def get_last_modified(self):
+        # Over the whole result set: the facet counts depend on all of it.
+        # Searches take the newest active product instead of matching twice.
+        queryset = self.get_queryset()
+        if self.request.GET.get('search', '').strip():
+            queryset = Product.objects.filter(is_active=True)
+        dates = [
+            queryset.aggregate(last=Max('updated_at'))['last'],
+            Category.objects.aggregate(last=Max('updated_at'))['last'],
+        ]
+        # A product deactivated or deleted drops out of the list without a newer updated_at
+        catalogue_changed = changed_at(PAGES_NAMESPACE)
+        if catalogue_changed is not None:
+            dates.append(datetime.fromtimestamp(catalogue_changed, tz=dt_timezone.utc))
+        return max((date for date in dates if date), default=None)
+    
+    def paginate_queryset(self, queryset, page_size):
+        if not self.keyset_ordering:
+            return super().paginate_queryset(queryset, page_size)
+        # Cursor pagination: no OFFSET scan and no COUNT(*), the facets carry the total
+        paginator = KeysetPaginator(queryset, self.keyset_ordering, page_size)
+        page = paginator.page(self.request.GET.get('cursor'))
+        return (paginator, page, page.object_list, page.has_other_pages())
     
     def get_context_data(self, **kwargs):
-        from .models import Category
         context = super().get_context_data(**kwargs)
         
-        # Add all categories for filter
-        context['categories'] = Category.objects.all()
-        
-        # Add all unique brands for filter
-        context['brands'] = Product.objects.filter(is_active=True).values_list('brand', flat=True).distinct().exclude(brand='')
+        # Category, brand, price and availability counts for the current results
+        context['facets'] = get_facets(self.object_list, self.request.GET, self.category_facet_queryset)
         
         # Keep search query and filters
         context['search_query'] = self.request.GET.get('search', '')
@@ -88,11 +157,73 @@ class ProductListView(ListView):
 
 
 
-class ProductDetail(DetailView):
+@method_decorator(cache_anonymous_page(), name='dispatch')
+class ProductDetail(ConditionalGetMixin, DetailView):
     model=Product
+
+    def get_last_modified(self):
+        # Neighbour changes are left to the versioned ETag
+        dates = (
+            self.get_queryset()
+            .filter(slug=self.kwargs['slug'], is_active=True)
+            .values_list('updated_at', 'category__updated_at')
+            .first()
+        )
+        # Unknown slug (DetailView answers with a 404) or inactive product: no validators
+        return max((date for date in dates if date), default=None) if dates else None
+
     def get_context_data(self, **kwargs) :
         context = super().get_context_data(**kwargs)
-        context["images"] = ProductImages.objects.filter(product=self.get_object())
-        context["products"] = Product.objects.filter(tags__in=self.get_object().tags.all()).distinct()[:10]
+        # self.object is set by DetailView.get(), no need to fetch the product again
+        context["images"] = ProductImages.objects.filter(product=self.object)
+        # Neighbours precomputed by products/related.py, one indexed lookup
+        context["products"] = [
+            link.related
+            for link in RelatedProduct.objects.filter(product=self.object, related__is_active=True)
+            .select_related('related')
+            .order_by('rank')
+        ]
+        if not context["products"]:
+            # Not built yet (new product, build_related_products not run): shared tags
+            context["products"] = list(
+                Product.objects.filter(is_active=True, tags__in=self.object.tags.all())
+                .exclude(pk=self.object.pk)
+                .distinct()[:TOP_K]
+            )
+        context["bought_together"] = bought_together([self.object.pk], limit=3)
         return context
     
+
+
+IMAGE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+
+@require_safe
+def product_image(request, width, extension, name):
+    """
+    Product picture resized to ``width`` on first request, then from the disk cache.
+
+    Uploads never overwrite an existing name, so the response is cached
+    for a year; the ETag lets clients that lost it revalidate with a 304.
+    """
+    if width not in images.ALLOWED_WIDTHS or extension not in images.FORMATS:
+        raise Http404
+    if not name.startswith(images.SOURCE_DIRS) or '..' in name.split('/'):
+        raise Http404
+    try:
+        digest = images.source_digest(name)
+    except OSError:
+        raise Http404
+
+    etag = f'"{digest[:32]}-{width}{extension}"'
+    if etag in parse_etags(request.headers.get('If-None-Match', '')):
+        response = HttpResponseNotModified()
+    else:
+        path = images.cached_rendition(name, digest, width, extension)
+        if path is None:
+            raise Http404
+        response = FileResponse(open(path, 'rb'), content_type=images.CONTENT_TYPES[extension])
+    response['ETag'] = etag
+    response['Cache-Control'] = IMAGE_CACHE_CONTROL
+    return response
+
@@ -99,6 +99,29 @@ DATABASES = {
 }
 
 
+# Cache
+# Shared by every gunicorn worker and management command: the versioned
+# namespaces of utils/cache.py (facets, shop config, cart summaries, pages)
+# are only invalidated across processes through it.  REDIS_URL selects
+# Redis (needs the redis package), otherwise the database cache is used
+# (python manage.py createcachetable).
+
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'django_cache',
+            'OPTIONS': {'MAX_ENTRIES': 50000},
+        }
+    }
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -145,6 +168,8 @@ WHITENOISE_ALLOW_ALL_ORIGINS = True
 # Media files
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'mediafiles'
+# Resized product pictures served by products.views.product_image (manage.py warm_image_cache)
+IMAGE_CACHE_ROOT = os.environ.get('IMAGE_CACHE_ROOT', BASE_DIR / 'image_cache')
 
 
 # Default primary key field type
@@ -164,7 +189,10 @@ LOGIN_REDIRECT_URL = '/'
 LOGOUT_REDIRECT_URL = '/'
 
 # Email Configuration
-EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+# Emails are queued in accounts.OutboundEmail and sent by `manage.py send_queued_emails`.
+# Set EMAIL_BACKEND to the console or file backend locally / in tests.
+EMAIL_BACKEND = os.environ.get('EMAIL_BACKEND', 'django.core.mail.backends.smtp.EmailBackend')
+EMAIL_FILE_PATH = os.environ.get('EMAIL_FILE_PATH', BASE_DIR / 'sent_emails')
 EMAIL_HOST = 'smtp.gmail.com'
 EMAIL_PORT = 587
 EMAIL_USE_TLS = True
@@ -172,6 +200,9 @@ EMAIL_HOST_USER = os.environ.get('EMAIL_HOST_USER', 'ahmedalgohary1170@gmail.com
 EMAIL_HOST_PASSWORD = os.environ.get('EMAIL_HOST_PASSWORD', 'ypid mhkj dsxv xoaj')
 DEFAULT_FROM_EMAIL = 'متجر الوسام للأدوات الكهربائية <ahmedalgohary1170@gmail.com>'
 
+# Receives order status changes as JSON (manage.py dispatch_order_notifications)
+ORDER_WEBHOOK_URL = os.environ.get('ORDER_WEBHOOK_URL', '')
+
 # For development, you can use console backend to print emails to console
 # EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 
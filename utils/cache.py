@@ -0,0 +1,126 @@
+import hashlib
+import time
+from functools import wraps
+from urllib.parse import urlencode
+
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.middleware.csrf import get_token
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+
+
+# Whole pages served to anonymous visitors, bumped by products/signals.py
+# and orders/stock.py whenever something shown in the catalogue changes.
+PAGES_NAMESPACE = 'pages'
+PAGE_TIMEOUT = 60 * 15
+
+
+def _version_key(namespace):
+    return f'cache-version:{namespace}'
+
+
+def _changed_key(namespace):
+    return f'cache-changed:{namespace}'
+
+
+def get_version(namespace):
+    """
+    Current version of a cache namespace.
+
+    A fresh namespace starts at the current timestamp rather than 1, so
+    entries written before the version key was evicted are never reused.
+    """
+    key = _version_key(namespace)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, int(time.time()), None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(namespace):
+    """
+    Invalidate every key of ``namespace`` in O(1).
+    """
+    key = _version_key(namespace)
+    cache.set(_changed_key(namespace), time.time(), None)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        cache.set(key, int(time.time()), None)
+        return cache.get(key)
+
+
+def changed_at(namespace):
+    """
+    Timestamp of the last ``bump_version(namespace)``, None before the first one.
+
+    Covers what leaves no ``updated_at`` behind, such as a deleted product.
+    """
+    return cache.get(_changed_key(namespace))
+
+
+def make_key(namespace, *parts):
+    """
+    Build a versioned cache key, long or user supplied parts are hashed.
+    """
+    raw = ':'.join(str(part) for part in parts)
+    digest = hashlib.md5(raw.encode('utf-8')).hexdigest()
+    return f'{namespace}:{get_version(namespace)}:{digest}'
+
+
+def is_shared_cache():
+    """
+    False for the per-process ``LocMemCache``: a version bumped by one
+    worker would not reach the others, which would keep serving stale pages.
+    """
+    return not isinstance(caches['default'], LocMemCache)
+
+
+def _page_key(request):
+    # ?b=2&a=1, ?a=1&b=2 and ?a=1&b=2&c= are the same page
+    query = sorted(
+        (name, value) for name, values in request.GET.lists() for value in values if value
+    )
+    return make_key(PAGES_NAMESPACE, request.path, urlencode(query))
+
+
+def cache_anonymous_page(timeout=PAGE_TIMEOUT):
+    """
+    Serve the GET requests of anonymous visitors from the cache.
+
+    Signed-in users always get a fresh page (cart, name in the navbar).
+    Pages are only cached on a cache shared by every worker (the database
+    or Redis, see CACHES in settings), never in per-process memory.
+    The cached HTML must not hold a CSRF token: scripts read it from the
+    cookie instead (``csrfToken()`` in base.html), which is set here on hits
+    as well as misses.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD') or request.user.is_authenticated or not is_shared_cache():
+                return view(request, *args, **kwargs)
+            get_token(request)
+            key = _page_key(request)
+            response = cache.get(key)
+            if response is not None:
+                # Revalidating a cached page (If-None-Match / If-Modified-Since) costs no query either
+                return get_conditional_response(
+                    request,
+                    etag=response.get('ETag'),
+                    last_modified=parse_http_date_safe(response.get('Last-Modified', '')),
+                    response=response,
+                )
+            response = view(request, *args, **kwargs)
+            if response.status_code != 200 or response.streaming or response.cookies:
+                return response
+            if hasattr(response, 'add_post_render_callback'):
+                # TemplateResponse: cached once rendered
+                response.add_post_render_callback(lambda rendered: cache.set(key, rendered, timeout))
+            else:
+                cache.set(key, response, timeout)
+            return response
+        return wrapper
+    return decorator
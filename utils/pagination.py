@@ -0,0 +1,183 @@
+"""
+Keyset (cursor) pagination.
+
+Instead of ``OFFSET n`` every page is fetched with a ``WHERE`` on the sort
+key of the last row seen, so page 1000 costs the same as page 1.  The sort
+key must be unique, which is why every ordering ends with the primary key.
+"""
+import base64
+import json
+
+from django.db import connections
+from django.db.models import Q
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+class KeysetPage:
+    def __init__(self, object_list, paginator, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+    @property
+    def count(self):
+        return self.paginator.count
+
+    @property
+    def count_is_estimate(self):
+        return self.paginator.count_is_estimate
+
+
+class KeysetPaginator:
+    """
+    Paginate ``queryset`` on ``ordering``, e.g. ``('-created_at', '-id')``.
+
+    ``count_mode`` controls the total shown next to the list:
+
+    * ``'none'``: no count query at all.
+    * ``'exact'``: a regular ``COUNT(*)``.
+    * ``'approximate'``: the planner estimate on PostgreSQL, elsewhere a
+      count capped at ``approximate_limit`` rows.
+    """
+
+    def __init__(self, queryset, ordering, per_page, count_mode='none', approximate_limit=1000):
+        if count_mode not in ('none', 'exact', 'approximate'):
+            raise ValueError(f'Unknown count mode: {count_mode}')
+        self.queryset = queryset
+        self.ordering = tuple(ordering)
+        self.per_page = per_page
+        self.count_mode = count_mode
+        self.approximate_limit = approximate_limit
+        self.count_is_estimate = False
+        self._count = None
+        opts = queryset.model._meta
+        self._fields = [
+            opts.pk if name.lstrip('-') == 'pk' else opts.get_field(name.lstrip('-'))
+            for name in self.ordering
+        ]
+
+    # ---------- cursors ----------
+
+    def _row_key(self, obj):
+        return [getattr(obj, field.attname) for field in self._fields]
+
+    def encode_cursor(self, values, direction):
+        payload = {'d': direction, 'v': [_serialize(value) for value in values]}
+        raw = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+        return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+    def decode_cursor(self, cursor):
+        try:
+            raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+            payload = json.loads(raw)
+            direction = payload['d']
+            values = [field.to_python(value) for field, value in zip(self._fields, payload['v'])]
+        except Exception as exc:
+            raise InvalidCursor(str(exc)) from exc
+        if direction not in ('next', 'prev') or len(values) != len(self._fields):
+            raise InvalidCursor('Malformed cursor')
+        return values, direction
+
+    # ---------- queries ----------
+
+    def _after(self, values, reverse=False):
+        """
+        Rows strictly after ``values`` in the (possibly reversed) ordering.
+        """
+        condition = Q()
+        for index, name in enumerate(self.ordering):
+            field = name.lstrip('-')
+            descending = name.startswith('-') != reverse
+            step = Q(**{f'{field}__{"lt" if descending else "gt"}': values[index]})
+            for previous in range(index):
+                step &= Q(**{self.ordering[previous].lstrip('-'): values[previous]})
+            condition |= step
+        return condition
+
+    def page(self, cursor=None):
+        """
+        Return the page after (or before) ``cursor``; a bad cursor yields page 1.
+        """
+        values, direction = None, 'next'
+        if cursor:
+            try:
+                values, direction = self.decode_cursor(cursor)
+            except InvalidCursor:
+                values, direction = None, 'next'
+
+        if direction == 'prev':
+            reversed_ordering = [name[1:] if name.startswith('-') else f'-{name}' for name in self.ordering]
+            queryset = self.queryset.filter(self._after(values, reverse=True)).order_by(*reversed_ordering)
+            rows = list(queryset[:self.per_page + 1])
+            has_more_before = len(rows) > self.per_page
+            rows = rows[:self.per_page][::-1]
+            has_more_after = True
+        else:
+            queryset = self.queryset
+            if values is not None:
+                queryset = queryset.filter(self._after(values))
+            rows = list(queryset.order_by(*self.ordering)[:self.per_page + 1])
+            has_more_after = len(rows) > self.per_page
+            rows = rows[:self.per_page]
+            has_more_before = values is not None
+
+        next_cursor = previous_cursor = None
+        if rows and has_more_after:
+            next_cursor = self.encode_cursor(self._row_key(rows[-1]), 'next')
+        if rows and has_more_before:
+            previous_cursor = self.encode_cursor(self._row_key(rows[0]), 'prev')
+        return KeysetPage(rows, self, next_cursor, previous_cursor)
+
+    @property
+    def count(self):
+        if self.count_mode == 'none':
+            return None
+        if self._count is None:
+            if self.count_mode == 'exact':
+                self._count = self.queryset.count()
+            else:
+                self._count = self._approximate_count()
+        return self._count
+
+    def _approximate_count(self):
+        queryset = self.queryset.order_by()
+        connection = connections[queryset.db]
+        if connection.vendor == 'postgresql':
+            sql, params = queryset.query.sql_with_params()
+            with connection.cursor() as cursor:
+                cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+                plan = cursor.fetchone()[0]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            self.count_is_estimate = True
+            return int(plan[0]['Plan']['Plan Rows'])
+        count = queryset[:self.approximate_limit + 1].count()
+        self.count_is_estimate = count > self.approximate_limit
+        return min(count, self.approximate_limit)
+
+
+def _serialize(value):
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    if isinstance(value, (int, float, str)) or value is None:
+        return value
+    return str(value)